@@ -0,0 +1,204 @@
+"""
+Validación por lotes de programas.
+
+Recibe archivos, directorios (se recorren buscando el patrón indicado) o
+globs, reparte el análisis léxico y sintáctico entre varios procesos y
+escribe un resultado JSON por línea (JSON Lines) a medida que terminan:
+
+    {"path": "Ejemplos/Ejemplo_1.txt", "valid": true, "tokens": 57,
+     "errors": [], "error": null, "ms": 0.4}
+
+errors son los errores de sintaxis; error es el carácter inválido, el
+error que detuvo el parser o el que impidió leer el archivo. El resumen se
+escribe en stderr. Devuelve 0 si todos los programas son válidos.
+
+Con --semantic, los programas sin errores de sintaxis pasan además por el
+análisis semántico (ver semantics.py): sus errores quedan en semantic y el
+programa sólo es válido si no hay ninguno.
+
+Con --cache los resultados se guardan por hash del contenido (ver
+cache.py) y los archivos que no cambiaron no se vuelven a analizar.
+
+Uso: python batch.py [-j PROCESOS] [--pattern *.txt] [--cache [RUTA]] [--max-errors N]
+                     [--semantic] rutas...
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cache import DEFAULT_CACHE_PATH, ValidationCache, result_variant
+from main import DEFAULT_MAX_ERRORS, InvalidCharacterError, Lexer, Parser, TokenBuffer
+from semantics import check as check_semantics
+
+# Archivos por tarea: agrupar reduce la comunicación entre procesos con
+# programas pequeños
+FILES_PER_TASK = 16
+
+# Archivos desde este tamaño se tokenizan mapeados en memoria sin leerlos
+# enteros (Lexer.tokenize_file), salvo con caché, que necesita el texto
+MMAP_THRESHOLD = 64 << 20
+
+# Lexer, Parser y caché de cada proceso: se crean una vez y se reutilizan
+_lexer: Optional[Lexer] = None
+_parser: Optional[Parser] = None
+_cache: Optional[ValidationCache] = None
+_semantic = False
+
+
+def _init_worker(cache_path: Optional[str] = None, max_errors: Optional[int] = DEFAULT_MAX_ERRORS,
+                 semantic: bool = False):
+    global _lexer, _parser, _cache, _semantic
+    _lexer = Lexer()
+    _parser = Parser(max_errors=max_errors)
+    _semantic = semantic
+    _cache = ValidationCache(path=cache_path, variant=result_variant(max_errors, semantic)) if cache_path else None
+
+
+def validate_source(source: str, lexer: Lexer, parser: Parser,
+                    cache: Optional[ValidationCache] = None, semantic: bool = False,
+                    build_tree: bool = False) -> Dict:
+    """
+    Resultado de analizar un programa (sin la ruta). Con build_tree, y sin
+    caché, el árbol queda en parser.tree
+    """
+    if cache is not None:
+        result = cache.get(source)
+        if result is not None:
+            return result
+
+    try:
+        tokens = lexer.tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        result = {'valid': False, 'tokens': 0, 'errors': [], 'error': str(e)}
+    else:
+        result = _validate_tokens(tokens, parser, semantic, build_tree)
+
+    if cache is not None:
+        cache.put(source, result)
+    return result
+
+
+def _validate_tokens(tokens: TokenBuffer, parser: Parser, semantic: bool = False,
+                     build_tree: bool = False) -> Dict:
+    valid = parser.validate(tokens, build_tree=semantic or build_tree)
+    fatal = str(parser.fatal_error) if parser.fatal_error is not None else None
+    result = {'valid': valid, 'tokens': len(tokens), 'errors': parser.errors, 'error': fatal}
+    if semantic and valid:
+        result['semantic'] = [str(diagnostic) for diagnostic in check_semantics(parser.tree, tokens)]
+        result['valid'] = not result['semantic']
+    return result
+
+
+def validate_file(path: str, lexer: Lexer, parser: Parser,
+                  cache: Optional[ValidationCache] = None, semantic: bool = False) -> Dict:
+    start = time.perf_counter()
+    try:
+        if cache is None and os.path.getsize(path) >= MMAP_THRESHOLD:
+            with lexer.tokenize_file(path) as tokens:
+                result = _validate_tokens(tokens, parser, semantic)
+        else:
+            with open(path, encoding='utf-8') as source_file:
+                source = source_file.read()
+            result = validate_source(source, lexer, parser, cache, semantic)
+    except (OSError, UnicodeDecodeError, InvalidCharacterError) as e:
+        result = {'valid': False, 'tokens': 0, 'errors': [], 'error': str(e)}
+    result = {'path': path, **result}
+    result['ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def _validate_files(paths: List[str]) -> List[Dict]:
+    """Tarea de un proceso del pool"""
+    return [validate_file(path, _lexer, _parser, _cache, _semantic) for path in paths]
+
+
+def expand_paths(arguments: Iterable[str], pattern: str) -> Iterator[str]:
+    """Archivos de los argumentos: directorios recorridos, globs expandidos"""
+    for argument in arguments:
+        if os.path.isdir(argument):
+            for directory, subdirectories, files in os.walk(argument):
+                subdirectories.sort()
+                for name in sorted(files):
+                    if fnmatch(name, pattern):
+                        yield os.path.join(directory, name)
+        elif glob.has_magic(argument):
+            yield from sorted(glob.iglob(argument, recursive=True))
+        else:
+            yield argument
+
+
+def _groups(paths: Iterable[str], size: int) -> Iterator[List[str]]:
+    group = []
+    for path in paths:
+        group.append(path)
+        if len(group) == size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def validate_paths(paths: Iterable[str], jobs: int, cache_path: Optional[str] = None,
+                   max_errors: Optional[int] = DEFAULT_MAX_ERRORS, semantic: bool = False) -> Iterator[Dict]:
+    """
+    Valida los archivos y entrega los resultados en el orden en que
+    terminan. Mantiene pocas tareas en vuelo para no leer por adelantado
+    todo el corpus.
+    """
+    if jobs <= 1:
+        _init_worker(cache_path, max_errors, semantic)
+        for path in paths:
+            yield validate_file(path, _lexer, _parser, _cache, _semantic)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(cache_path, max_errors, semantic)) as executor:
+        pending = set()
+        for group in _groups(paths, FILES_PER_TASK):
+            pending.add(executor.submit(_validate_files, group))
+            if len(pending) >= jobs * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Valida programas en paralelo y escribe JSON Lines")
+    arguments.add_argument('paths', nargs='+', help="archivos, directorios o globs")
+    arguments.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                           help="procesos (por defecto, uno por núcleo)")
+    arguments.add_argument('--pattern', default='*.txt', help="archivos a buscar en los directorios")
+    arguments.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, metavar='RUTA',
+                           help=f"guardar los resultados en una base SQLite (por defecto {DEFAULT_CACHE_PATH})")
+    arguments.add_argument('--max-errors', type=int, default=DEFAULT_MAX_ERRORS, metavar='N',
+                           help=f"errores a registrar por archivo (por defecto {DEFAULT_MAX_ERRORS}, 0 sin límite)")
+    arguments.add_argument('--semantic', action='store_true',
+                           help="hacer también el análisis semántico de los programas sin errores de sintaxis")
+    options = arguments.parse_args(argv[1:])
+
+    start = time.perf_counter()
+    total = valid = 0
+    paths = expand_paths(options.paths, options.pattern)
+    max_errors = options.max_errors or None
+    for result in validate_paths(paths, options.jobs, options.cache, max_errors, options.semantic):
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+        total += 1
+        valid += result['valid']
+
+    elapsed = time.perf_counter() - start
+    print(f"{total} archivos, {valid} válidos, {total - valid} inválidos en {elapsed:.2f} s",
+          file=sys.stderr)
+    return 0 if valid == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,173 @@
+"""
+Benchmark del lexer y del parser sobre programas generados.
+
+Compara el lexer de alternancia de expresiones regulares con el escáner de
+una pasada, el ciclo del parser dirigido por la tabla de cadenas
+(diccionario de diccionarios) con el ciclo sobre la tabla codificada con
+enteros, y ese ciclo con el parser generado (parsergen.py), midiendo
+tokens por segundo. También compara guardar y volver a cargar los tokens
+con pickle y con el formato binario de tokenstream.py.
+
+Uso: python benchmark.py [sentencias] [repeticiones]
+"""
+import argparse
+import pickle
+import sys
+import time
+from typing import List
+
+from main import END_OF_INPUT, Diagnostic, Lexer, Parser, SyntaxError, Token
+from parsergen import GeneratedParser
+from tokenstream import dump_tokens, load_tokens
+
+
+def generate_program(statements: int) -> str:
+    """Genera un programa válido con la cantidad de sentencias indicada"""
+    body = [
+        "DECVARinter\n    x: INTer,\n    y: FLOATer\nEndDecinter\n",
+        "x = 5 + 3 * 2:3\n",
+        "Siinter(x > 0) {\n    Mostrinter(x):3\n    x = x - 1:3\n} Sinointer {\n    Mostrinter(\"no\"):3\n}\n",
+        "Mientinter(x < 10 ANDter NOTter y == 2) {\n    x = x + 1:3\n}\n",
+        "ARRAYinter numbers[10]: INTer:3\n",
+        "numbers[x] = (x + 1) * 2:3\n",
+        "Methodinter Suma(INTer a, INTer b) {\n    Returninter a + b:3\n}\n",
+        "## comentario\n",
+        "LEERinter(x):3\n",
+    ]
+    parts = ["= ^ .\n"]
+    for index in range(statements):
+        parts.append(body[index % len(body)])
+    parts.append(". ^ =\n")
+    return ''.join(parts)
+
+
+class RegexLexer(Lexer):
+    """Lexer anterior: prueba la alternancia de todos los patrones en cada posición"""
+    def tokenize(self, code: str) -> List[Token]:
+        tokens = []
+        line = 1
+        pos = 0
+
+        while pos < len(code):
+            match = self.regex.match(code, pos)
+            if match is None:
+                raise ValueError(f"Invalid character at line {line}: {code[pos]}")
+
+            token_type = match.lastgroup
+            token_value = match.group()
+
+            if token_type != 'WHITESPACE':
+                tokens.append(Token(token_type, token_value, line))
+
+            if token_value.count('\n') > 0:
+                line += token_value.count('\n')
+
+            pos = match.end()
+
+        return tokens
+
+
+class StringTableParser(Parser):
+    """Ciclo anterior: pila de nombres y búsquedas en el diccionario de la tabla"""
+    def _parse_non_terminal(self, non_terminal: str):
+        stack = [non_terminal]
+        parse_table = self.parse_table
+
+        while stack:
+            symbol = stack.pop()
+
+            if symbol not in parse_table:  # Terminal
+                self._match(symbol)
+                continue
+
+            if self.current_token is None:
+                raise SyntaxError(f"Unexpected end of input while processing {symbol}", -1)
+
+            token_type = self.current_token.type
+            production = parse_table[symbol].get(token_type)
+            if production is None:
+                symbol_id = self.encoded_table.symbol_ids[symbol]
+                self._report(Diagnostic.UNEXPECTED_TOKEN, symbol_id, self.current)
+                if not self._synchronize(symbol_id):
+                    raise SyntaxError("Could not synchronize after error", -1)
+                continue
+
+            for production_symbol in reversed(production):
+                if production_symbol != 'ε':
+                    stack.append(production_symbol)
+
+    def _match(self, expected: str):
+        if self.current_token is None:
+            raise SyntaxError(f"Unexpected end of input, expected {expected}", -1)
+        if self.current_token.type != expected:
+            self._report(Diagnostic.MISMATCH, self.encoded_table.symbol_ids[expected], self.current)
+        self.current += 1
+        self.current_kind = next(self._kinds, END_OF_INPUT)
+
+
+def best_time(function, repeat: int) -> float:
+    """Mejor tiempo de varias corridas"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(title: str, candidates, token_count: int, repeat: int):
+    """Imprime tokens por segundo de cada candidato y la aceleración del último"""
+    print(title)
+    times = []
+    for name, function in candidates:
+        elapsed = best_time(function, repeat)
+        times.append(elapsed)
+        print(f"{name:>18}: {elapsed:8.3f} s  {token_count / elapsed:12,.0f} tokens/s")
+    print(f"Aceleración: {times[0] / times[-1]:.2f}x\n")
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Compara el lexer, el parser y la serialización de tokens")
+    arguments.add_argument('statements', nargs='?', type=int, default=100000,
+                           help="sentencias del programa generado (por defecto 100000)")
+    arguments.add_argument('repeat', nargs='?', type=int, default=3,
+                           help="repeticiones de cada medición; se toma la mejor (por defecto 3)")
+    options = arguments.parse_args(argv[1:])
+    statements, repeat = options.statements, options.repeat
+
+    source = generate_program(statements)
+    tokens = Lexer().tokenize(source)
+    print(f"{statements} sentencias, {len(source) / 1e6:.1f} MB, {len(tokens)} tokens\n")
+
+    regex_lexer, lexer = RegexLexer(), Lexer()
+    compare("Lexer", [("alternancia regex", lambda: regex_lexer.tokenize(source)),
+                      ("escáner de 1 pasada", lambda: lexer.tokenize(source))], len(tokens), repeat)
+
+    string_parser, parser = StringTableParser(), Parser()
+    if not parser.parse(tokens):
+        raise RuntimeError("El programa generado no es válido")
+    compare("Parser", [("tabla de cadenas", lambda: string_parser.parse(tokens)),
+                       ("tabla de enteros", lambda: parser.parse(tokens))], len(tokens), repeat)
+
+    buffer = lexer.tokenize_buffer(source)
+    generated = GeneratedParser()
+    if not generated.validate(buffer):
+        raise RuntimeError("El parser generado rechaza el programa")
+    compare("Parser sobre TokenBuffer", [("tabla de enteros", lambda: parser.validate(buffer)),
+                                         ("parser generado", lambda: generated.validate(buffer))],
+            len(buffer), repeat)
+
+    pickled = pickle.dumps(tokens, pickle.HIGHEST_PROTOCOL)
+    packed = dump_tokens(buffer)
+    print(f"Tokens serializados: pickle {len(pickled) / 1e6:.1f} MB, formato binario {len(packed) / 1e6:.1f} MB\n")
+    compare("Guardar tokens", [("pickle", lambda: pickle.dumps(tokens, pickle.HIGHEST_PROTOCOL)),
+                               ("formato binario", lambda: dump_tokens(buffer))], len(buffer), repeat)
+    compare("Cargar tokens y validar", [("pickle", lambda: parser.validate(pickle.loads(pickled))),
+                                        ("volver a tokenizar", lambda: parser.validate(lexer.tokenize_buffer(source))),
+                                        ("formato binario", lambda: parser.validate(load_tokens(packed)))],
+            len(buffer), repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,226 @@
+"""
+Suite de benchmarks del lexer y del parser.
+
+Genera un programa de cada forma de programs.py (y, salvo que se pida lo
+contrario, una copia con errores) y mide por separado:
+
+    lex         Lexer.tokenize sobre el código
+    parse       Parser.validate sobre los tokens (parse sin imprimir errores)
+    end_to_end  las dos cosas a partir del código
+
+De cada fase informa el mejor tiempo de varias corridas, los tokens por
+segundo y el pico de memoria (con tracemalloc, en una corrida aparte
+porque lo hace todo más lento). Con --save los resultados se guardan en
+JSON junto con el commit, y con --compare se comparan con un archivo
+guardado antes: devuelve 1 si alguna fase empeoró más que la tolerancia.
+
+Uso: python benchsuite.py [--size TOKENS] [--shapes wide,nested,...] [--repeat N]
+                          [--save RUTA] [--compare RUTA] [--tolerance 0.1]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+from main import Lexer, Parser
+from programs import SHAPES, corrupt, generate
+
+# Cambia cuando cambia la estructura de los archivos de resultados
+BASELINE_FORMAT = 1
+
+PHASES = ('lex', 'parse', 'end_to_end')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _git_revision() -> Optional[str]:
+    """Commit actual (con -dirty si hay cambios sin confirmar), o None fuera de git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if changes else '')
+
+
+def measure(function: Callable[[], object], repeat: int, memory: bool = True) -> Dict:
+    """Mejor tiempo y mediana de repeat corridas y, con memory, el pico de memoria"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    result = {'seconds': min(times), 'median_seconds': statistics.median(times)}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_case(source: str, lexer: Lexer, parser: Parser, repeat: int, memory: bool = True) -> Dict:
+    """Mide las tres fases sobre un programa"""
+    tokens = lexer.tokenize(source)
+    valid = parser.validate(tokens)
+    case = {
+        'bytes': len(source.encode('utf-8')),
+        'tokens': len(tokens),
+        'valid': valid,
+        'errors': len(parser.diagnostics),
+    }
+    phases = {
+        'lex': lambda: lexer.tokenize(source),
+        'parse': lambda: parser.validate(tokens),
+        'end_to_end': lambda: parser.validate(lexer.tokenize(source)),
+    }
+    for name in PHASES:
+        result = measure(phases[name], repeat, memory)
+        result['tokens_per_second'] = len(tokens) / result['seconds']
+        case[name] = result
+    return case
+
+
+def run_suite(shapes: Sequence[str], size: int, repeat: int = 3, seed: int = 0,
+              invalid_rate: float = 0.01, memory: bool = True) -> Dict:
+    """
+    Resultados de todas las formas: un caso por forma y, si invalid_rate
+    no es 0, otro con el mismo programa corrompido (forma-invalid)
+    """
+    lexer = Lexer()
+    # Sin límite de errores: el programa con errores se analiza completo
+    parser = Parser(max_errors=None)
+    cases = {}
+    for shape in shapes:
+        source = generate(shape, size, seed)
+        cases[shape] = run_case(source, lexer, parser, repeat, memory)
+        if not cases[shape]['valid']:
+            raise RuntimeError(f"El programa generado ({shape}) no es válido")
+        if invalid_rate:
+            cases[f"{shape}-invalid"] = run_case(corrupt(source, invalid_rate, seed), lexer, parser,
+                                                 repeat, memory)
+
+    return {
+        'format': BASELINE_FORMAT,
+        'commit': _git_revision(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size': size,
+        'repeat': repeat,
+        'seed': seed,
+        'invalid_rate': invalid_rate,
+        'cases': cases,
+    }
+
+
+def format_results(results: Dict) -> str:
+    lines = [f"commit {results['commit'] or '?'}, Python {results['python']}, "
+             f"{results['size']:,} tokens por programa, mejor de {results['repeat']}"]
+    for name, case in results['cases'].items():
+        verdict = 'válido' if case['valid'] else f"{case['errors']} errores"
+        lines.append(f"\n{name} ({case['tokens']:,} tokens, {case['bytes'] / 1e6:.1f} MB, {verdict})")
+        for phase in PHASES:
+            result = case[phase]
+            line = (f"{phase:>12}: {result['seconds']:8.3f} s  "
+                    f"{result['tokens_per_second']:12,.0f} tokens/s")
+            if 'peak_bytes' in result:
+                line += f"  {result['peak_bytes'] / 1e6:8.1f} MB"
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List[str]:
+    """
+    Compara los resultados con una línea de base: imprime la variación de
+    cada fase y devuelve las regresiones (throughput que cae o pico de
+    memoria que crece más que la tolerancia)
+    """
+    if baseline.get('format') != BASELINE_FORMAT:
+        raise ValueError(f"Unsupported baseline format: {baseline.get('format')}")
+    if (baseline['size'], baseline['seed']) != (current['size'], current['seed']):
+        print(f"Aviso: la línea de base usa size={baseline['size']} seed={baseline['seed']}")
+
+    print(f"\nComparación con {baseline['commit'] or '?'} ({baseline['created']})")
+    regressions = []
+    for name, case in current['cases'].items():
+        old_case = baseline['cases'].get(name)
+        if old_case is None:
+            print(f"{name}: no está en la línea de base")
+            continue
+        print(name)
+        for phase in PHASES:
+            old, new = old_case[phase], case[phase]
+            speed = new['tokens_per_second'] / old['tokens_per_second']
+            line = (f"{phase:>12}: {old['tokens_per_second']:12,.0f} -> {new['tokens_per_second']:12,.0f} "
+                    f"tokens/s ({speed - 1:+6.1%})")
+            problems = []
+            if speed < 1 / (1 + tolerance):
+                problems.append(f"{name} {phase}: {1 / speed - 1:.1%} más lento")
+            if 'peak_bytes' in old and 'peak_bytes' in new:
+                growth = new['peak_bytes'] / max(old['peak_bytes'], 1)
+                line += f"  memoria {growth - 1:+6.1%}"
+                if growth > 1 + tolerance:
+                    problems.append(f"{name} {phase}: {growth - 1:.1%} más memoria")
+            if problems:
+                line += "  REGRESIÓN"
+            print(line)
+            regressions.extend(problems)
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Mide el lexer y el parser sobre programas generados")
+    arguments.add_argument('--size', type=int, default=200000, help="tokens por programa")
+    arguments.add_argument('--shapes', default=','.join(SHAPES),
+                           help=f"formas de programa separadas por comas ({', '.join(SHAPES)})")
+    arguments.add_argument('--repeat', type=int, default=3, help="corridas por fase (se toma la mejor)")
+    arguments.add_argument('--seed', type=int, default=0, help="semilla de los programas generados")
+    arguments.add_argument('--invalid-rate', type=float, default=0.01,
+                           help="proporción de tokens alterados en las copias con errores (0: no medirlas)")
+    arguments.add_argument('--no-memory', action='store_true', help="no medir el pico de memoria")
+    arguments.add_argument('--save', metavar='RUTA', help="guardar los resultados en JSON")
+    arguments.add_argument('--compare', metavar='RUTA', help="comparar con resultados guardados")
+    arguments.add_argument('--tolerance', type=float, default=0.1,
+                           help="variación aceptada al comparar (por defecto 0.1, un 10%%)")
+    options = arguments.parse_args(argv[1:])
+
+    shapes = [shape for shape in options.shapes.split(',') if shape]
+    unknown = [shape for shape in shapes if shape not in SHAPES]
+    if unknown:
+        arguments.error(f"formas desconocidas: {', '.join(unknown)}")
+
+    results = run_suite(shapes, options.size, options.repeat, options.seed,
+                        options.invalid_rate, not options.no_memory)
+    print(format_results(results))
+
+    if options.save:
+        with open(options.save, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {options.save}")
+
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, results, options.tolerance)
+        if regressions:
+            print("\nRegresiones:\n" + '\n'.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,179 @@
+"""
+Caché de resultados de validación.
+
+La clave es un hash del código junto con la versión de la gramática (el
+hash de Gramatica.ebnf y de los patrones del lexer, ver grammar.py) y la
+del formato de los resultados, así que editar la gramática invalida las
+entradas anteriores. Cada entrada guarda el veredicto, la lista de errores
+y, opcionalmente, los tokens (las columnas de un TokenBuffer).
+
+Hay dos niveles: un LRU en memoria acotado por tamaño y, si se indica una
+ruta, una base SQLite que sobrevive entre ejecuciones y que pueden
+compartir varios procesos.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from grammar import CACHE_DIR, load_grammar
+from main import DEFAULT_MAX_ERRORS, TokenBuffer
+
+# Cambia cuando cambia el formato de los resultados o de los mensajes
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'validation-cache.sqlite3')
+
+# Columnas de un TokenBuffer: tipos, inicios y fines
+TokenColumns = Tuple[bytes, bytes, bytes]
+
+
+def result_variant(max_errors: Optional[int] = DEFAULT_MAX_ERRORS, semantic: bool = False) -> str:
+    """
+    Variante de la caché para resultados obtenidos con estas opciones: los
+    de otro límite de errores (None: sin límite) o con análisis semántico
+    no se mezclan con los de las opciones por defecto
+    """
+    options = []
+    if max_errors != DEFAULT_MAX_ERRORS:
+        options.append(f"max_errors={max_errors}")
+    if semantic:
+        options.append('semantic')
+    return ','.join(options)
+
+
+class ValidationCache:
+    def __init__(self, max_bytes: int = 64 << 20, path: Optional[str] = None,
+                 max_disk_entries: int = 100000, variant: str = ''):
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self._entries: 'OrderedDict[bytes, Tuple[Dict, Optional[TokenColumns], int]]' = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        # Lecturas de disco cuyo uso todavía no se anotó en la base (clave -> instante)
+        self._used: Dict[bytes, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+        # variant separa resultados obtenidos con otras opciones (p. ej. otro límite de errores)
+        version = f"{CACHE_VERSION}:{load_grammar().grammar_hash}:{variant}:".encode()
+        self._hasher = hashlib.blake2b(version, digest_size=16)
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "key BLOB PRIMARY KEY, result TEXT NOT NULL, "
+                             "kinds BLOB, starts BLOB, ends BLOB, used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self._db.commit()
+
+    def key(self, source: str) -> bytes:
+        hasher = self._hasher.copy()
+        hasher.update(source.encode('utf-8', 'surrogatepass'))
+        return hasher.digest()
+
+    def get(self, source: str) -> Optional[Dict]:
+        """Resultado guardado para el código, o None"""
+        entry = self._lookup(self.key(source))
+        return entry[0] if entry is not None else None
+
+    def get_tokens(self, source: str) -> Optional[TokenBuffer]:
+        """Tokens guardados para el código (sin volver a tokenizar), o None"""
+        entry = self._lookup(self.key(source))
+        if entry is None or entry[1] is None:
+            return None
+        buffer = TokenBuffer(source)
+        kinds, starts, ends = entry[1]
+        buffer.kinds.frombytes(kinds)
+        buffer.starts.frombytes(starts)
+        buffer.ends.frombytes(ends)
+        return buffer
+
+    def put(self, source: str, result: Dict, tokens: Optional[TokenBuffer] = None):
+        """Guarda el resultado (y los tokens, si se pasan) del código"""
+        key = self.key(source)
+        columns = None
+        if tokens is not None:
+            columns = (tokens.kinds.tobytes(), tokens.starts.tobytes(), tokens.ends.tobytes())
+        self._remember(key, result, columns)
+
+        if self._db is not None:
+            self._flush_used()
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, json.dumps(result, ensure_ascii=False),
+                              *(columns or (None, None, None)), time.time()))
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._prune()
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._flush_used()
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def _lookup(self, key: bytes) -> Optional[Tuple[Dict, Optional[TokenColumns], int]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self._db is not None:
+            row = self._db.execute("SELECT result, kinds, starts, ends FROM results WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is not None:
+                # El uso se anota en lote (ver _flush_used), no con una escritura por acierto
+                self._used[key] = time.time()
+                if len(self._used) >= 256:
+                    self._flush_used()
+                    self._db.commit()
+                self.hits += 1
+                columns = (row[1], row[2], row[3]) if row[1] is not None else None
+                return self._remember(key, json.loads(row[0]), columns)
+
+        self.misses += 1
+        return None
+
+    def _remember(self, key: bytes, result: Dict, columns: Optional[TokenColumns]):
+        """Agrega la entrada al LRU en memoria y descarta las más viejas si no cabe"""
+        size = len(json.dumps(result, ensure_ascii=False)) + sum(map(len, columns or ()))
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+
+        entry = (result, columns, size)
+        self._entries[key] = entry
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+        return entry
+
+    def _flush_used(self):
+        """Escribe en la base los usos pendientes; el commit queda para quien llama"""
+        if self._used:
+            self._db.executemany("UPDATE results SET used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._used.items()])
+            self._used.clear()
+
+    def _prune(self):
+        """Deja en disco sólo las max_disk_entries usadas más recientemente"""
+        self._flush_used()
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute("DELETE FROM results WHERE key IN "
+                             "(SELECT key FROM results ORDER BY used LIMIT ?)",
+                             (count - self.max_disk_entries,))
@@ -0,0 +1,591 @@
+"""
+Compilación de programas a funciones de Python.
+
+Un programa válido (sintáctica y semánticamente, ver semantics.py) se
+traduce a código fuente de Python, que se compila una vez con compile a
+objetos de código: el programa y cada método son funciones, los bloques
+son bloques de Python (Mientinter y Forinter son while) y cada expresión
+es una expresión de Python. Ejecutarlo no recorre el árbol de análisis.
+
+Las variables viven en marcos: listas con un lugar por cada declaración,
+asignado al compilar (así una variable que oculta a otra no la pisa). El
+marco del programa es g y el del método en ejecución es s; en el código
+del programa, s es g. Los arrays de INTer, FLOATer y BOOLEANter son
+array.array; los demás, listas.
+
+Python limita el anidamiento de bloques y de expresiones que puede
+compilar, y un programa puede anidar miles de Siinter. Por eso, cuando un
+bloque supera MAX_BLOCK_DEPTH niveles, la sentencia pasa a una función
+aparte que devuelve una señal si hace BREAKinter, CONTINUEinter o
+Returninter de un bucle o método que la contiene. Del mismo modo, los
+subárboles de una expresión de más de MAX_EXPRESSION_DEPTH niveles se
+calculan antes, en variables temporales. La traducción recorre el árbol
+con una pila explícita, sin recursión.
+
+Semántica de ejecución (la misma que interpreter.py): la división de dos
+INTer trunca hacia cero, ANDter y ORter evalúan siempre los dos operandos,
+un INTer asignado a un FLOATer se convierte, y
+Mostrinter y LEERinter usan una entrada y salida intercambiable y con
+búfer (ver runtime.py).
+
+MethodCall no es alcanzable en la gramática, así que un programa no puede
+llamar a sus métodos; CompiledProgram.call los ejecuta desde Python,
+verificando la cantidad de argumentos.
+
+Uso: python compiler.py programa.txt [--source]
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from expressions import BINARY_POWERS, PREFIX_POWER
+from main import InvalidCharacterError, Lexer, Parser
+from runtime import (DEFAULT_VALUES, ProgramError, ProgramIO, divide, format_value, index_error,
+                     new_array, read_value)
+from semantics import BOOLEAN, FLOAT, INTEGER, STRING, SemanticChecker, Symbol
+
+# Niveles de bloques dentro de una función generada (Python admite 20 bucles anidados)
+MAX_BLOCK_DEPTH = 8
+
+# Niveles de una expresión generada (el compilador de Python es recursivo)
+MAX_EXPRESSION_DEPTH = 48
+
+# Lugar del marco del programa donde está la entrada y salida
+IO_SLOT = 0
+
+# ANDter y ORter evalúan los dos operandos (no cortocircuitan)
+LOGICAL_OPERATORS = {'ANDter': '&', 'ORter': '|'}
+COMPARISON_POWER = BINARY_POWERS['==']
+ATOM_POWER = max(BINARY_POWERS.values()) + 1
+
+
+class CompileError(Exception):
+    def __init__(self, message: str, diagnostics: Sequence = ()):
+        self.diagnostics = list(diagnostics)  # Errores de sintaxis o semánticos que lo impidieron
+        super().__init__(message)
+
+
+class _Return:
+    """Señal de Returninter desde una función aparte"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+_BREAK = object()
+_CONTINUE = object()
+
+# Nombres que usa el código generado
+_RUNTIME = {
+    '_BREAK': _BREAK,
+    '_CONTINUE': _CONTINUE,
+    '_Return': _Return,
+    '_divide': divide,
+    '_format_value': format_value,
+    '_read_value': read_value,
+    '_new_array': new_array,
+    '_index_error': index_error,
+}
+
+
+class _Function:
+    __slots__ = ('name', 'lines', 'hoisted')
+
+    def __init__(self, name: str, hoisted: bool):
+        self.name = name
+        self.lines = [f"def {name}(s, g):"]
+        self.hoisted = hoisted  # Sentencia llevada aparte: devuelve señales
+
+
+class _Method:
+    __slots__ = ('name', 'function', 'parameters', 'frame_size')
+
+    def __init__(self, name: str, function: str):
+        self.name = name
+        self.function = function
+        self.parameters: List[Tuple[str, int]] = []  # (tipo, lugar en el marco)
+        self.frame_size = 0
+
+
+class _Context:
+    """Dónde se escribe una sentencia"""
+    __slots__ = ('function', 'depth', 'loop', 'loop_here', 'method')
+
+    def __init__(self, function: _Function, depth: int, loop: Optional[int], loop_here: bool,
+                 method: Optional[_Method]):
+        self.function = function
+        self.depth = depth  # Sangría
+        # Bucle que contiene la sentencia: None, -1 si es Mientinter o el
+        # nodo de la actualización si es Forinter
+        self.loop = loop
+        self.loop_here = loop_here  # El bucle está en esta misma función
+        self.method = method
+
+    def inner(self, loop: Optional[int] = None) -> '_Context':
+        if loop is None:
+            return _Context(self.function, self.depth + 1, self.loop, self.loop_here, self.method)
+        return _Context(self.function, self.depth + 1, loop, True, self.method)
+
+    def emit(self, line: str):
+        self.function.lines.append('    ' * self.depth + line)
+
+
+# Tareas de la traducción
+_STATEMENT, _BLOCK, _END_BLOCK, _LINES = range(4)
+
+
+class CompiledProgram:
+    """Programa compilado; se puede ejecutar muchas veces"""
+
+    def __init__(self, source: str, namespace: Dict, frame_size: int, methods: Dict[str, _Method]):
+        self.source = source  # Código Python generado
+        self.frame_size = frame_size
+        self._main = namespace['_program']
+        self._methods = {name: (namespace[method.function], method) for name, method in methods.items()}
+        self.frame: Optional[List] = None  # Marco del programa en la última ejecución
+
+    @property
+    def methods(self) -> Dict[str, int]:
+        """Métodos del programa y su cantidad de parámetros"""
+        return {name: len(method.parameters) for name, (_, method) in self._methods.items()}
+
+    def run(self, io=None):
+        io = io if io is not None else ProgramIO()
+        frame = [None] * self.frame_size
+        frame[IO_SLOT] = io
+        self.frame = frame
+        try:
+            _execute(self._main, frame, frame)
+        finally:
+            io.flush()
+
+    def call(self, name: str, *arguments, io=None):
+        """
+        Ejecuta un método con los argumentos dados y devuelve lo que
+        devuelve Returninter (None si termina sin Returninter). Las variables
+        del programa son las de la última ejecución de run.
+        """
+        if name not in self._methods:
+            raise ProgramError(f"Unknown method {name}")
+        function, method = self._methods[name]
+        if len(arguments) != len(method.parameters):
+            raise ProgramError(f"{name} expects {len(method.parameters)} arguments, got {len(arguments)}")
+        program = self.frame if self.frame is not None else [None] * self.frame_size
+        io = io if io is not None else program[IO_SLOT] or ProgramIO()
+        program[IO_SLOT] = io
+        frame = [None] * method.frame_size
+        for (type, slot), argument in zip(method.parameters, arguments):
+            frame[slot] = float(argument) if type == FLOAT else argument
+        try:
+            return _execute(function, frame, program)
+        finally:
+            io.flush()
+
+
+def _execute(function, frame: List, program: List):
+    try:
+        return function(frame, program)
+    except ZeroDivisionError:
+        raise ProgramError("Division by zero") from None
+    except OverflowError as e:
+        raise ProgramError(f"Value out of range: {e}") from None
+    except RecursionError:
+        raise ProgramError("Program nests too deeply to run") from None
+
+
+class _Compiler:
+    def __init__(self, tree, tokens: Sequence, checker: SemanticChecker):
+        self.tree = tree
+        self.tokens = tokens
+        self._type = checker._type
+        self._value = checker._value
+        self.resolutions = checker.resolutions
+        self.expressions = checker.expressions
+        self.functions: List[_Function] = []
+        self.places: Dict[Symbol, str] = {}  # Lugar de cada variable: g[n] o s[n]
+        self.frame_size = IO_SLOT + 1
+        self.methods: Dict[str, _Method] = {}
+        self.temporaries = 0
+        self.handlers = {
+            'VarDec': self._var_dec,
+            'Array_Dec': self._array_dec,
+            'ExpressionStatement': self._expression_statement,
+            'Print': self._print,
+            'Input': self._input,
+            'Break': self._break,
+            'Continue': self._continue,
+            'Return': self._return,
+            'Comment': lambda index, context: [],
+        }
+        self.structured = {
+            'Conditions': self._conditions,
+            'Loops': self._loops,
+            'Method': self._method,
+        }
+
+    def compile(self) -> CompiledProgram:
+        tree = self.tree
+        main = self._function('_program', hoisted=False)
+        code = next((child for child in tree.children(0) if tree.name(child) == 'CODE'), None)
+
+        tasks: List[Tuple[int, object, _Context]] = []
+        if code is not None:
+            tasks.append((_BLOCK, code, _Context(main, 1, None, False, None)))
+        while tasks:
+            task, argument, context = tasks.pop()
+            if task == _STATEMENT:
+                self._statement(argument, context, tasks)
+            elif task == _BLOCK:
+                # Si el bloque no deja líneas hace falta un pass
+                tasks.append((_END_BLOCK, len(context.function.lines), context))
+                statements = [child + 1 for child in tree.children(argument)]
+                tasks.extend((_STATEMENT, statement, context) for statement in reversed(statements))
+            elif task == _END_BLOCK:
+                if len(context.function.lines) == argument:
+                    context.emit('pass')
+            else:
+                for line in argument:
+                    context.emit(line)
+        if len(main.lines) == 1:
+            main.lines.append('    pass')
+
+        source = '\n'.join(line for function in self.functions for line in function.lines) + '\n'
+        namespace = dict(_RUNTIME)
+        try:
+            exec(compile(source, '<programa>', 'exec'), namespace)
+        except (RecursionError, MemoryError, SyntaxError) as e:
+            raise CompileError(f"Generated code could not be compiled: {e}") from None
+        return CompiledProgram(source, namespace, self.frame_size, self.methods)
+
+    def _function(self, name: str, hoisted: bool) -> _Function:
+        function = _Function(name, hoisted)
+        self.functions.append(function)
+        return function
+
+    def _location(self, position: int) -> str:
+        return self.tokens[position].location()
+
+    def _declare(self, position: int, context: _Context) -> str:
+        """Lugar para la variable declarada en el token position"""
+        symbol = self.resolutions[position]
+        if context.method is not None:
+            place = f"s[{context.method.frame_size}]"
+            context.method.frame_size += 1
+        else:
+            place = f"g[{self.frame_size}]"
+            self.frame_size += 1
+        self.places[symbol] = place
+        return place
+
+    # Sentencias
+
+    def _statement(self, index: int, context: _Context, tasks: List):
+        """index es el hijo de un nodo Statement"""
+        name = self.tree.name(index)
+        handler = self.handlers.get(name)
+        if handler is not None:
+            lines = handler(index, context)
+            for line in lines:
+                context.emit(line)
+        elif name != 'Method' and context.depth >= max(MAX_BLOCK_DEPTH, 2):
+            self._hoist(index, context, tasks)
+        else:
+            self.structured[name](index, context, tasks)
+
+    def _hoist(self, index: int, context: _Context, tasks: List):
+        """Lleva la sentencia a una función aparte y escribe la llamada"""
+        function = self._function(f"_c{len(self.functions)}", hoisted=True)
+        handlers = []
+        if context.loop is not None and context.loop_here:
+            handlers += ['if _r is _BREAK:', '    break', 'if _r is _CONTINUE:']
+            handlers += ['    ' + line for line in self._continue(index, context)]
+        if context.function.hoisted:
+            handlers.append('return _r')
+        elif context.method is not None:
+            handlers.append('return _r.value')
+        if handlers:
+            context.emit(f"_r = {function.name}(s, g)")
+            context.emit('if _r is not None:')
+            for line in handlers:
+                context.emit('    ' + line)
+        else:
+            context.emit(f"{function.name}(s, g)")
+        tasks.append((_STATEMENT, index, _Context(function, 1, context.loop, False, context.method)))
+
+    def _var_dec(self, index: int, context: _Context) -> List[str]:
+        # DECVARinter ID : TYPE , ID : TYPE ... EndDecinter
+        lines = []
+        position = self.tree.first_tokens[index] + 1
+        end = self.tree.token_ends[index]
+        while position + 2 < end:
+            default = DEFAULT_VALUES[self._value(position + 2)]
+            lines.append(f"{self._declare(position, context)} = {default!r}")
+            position += 4
+        return lines
+
+    def _array_dec(self, index: int, context: _Context) -> List[str]:
+        # ARRAYinter ID [ tamaño ] : TYPE :3
+        first = self.tree.first_tokens[index]
+        size = first + 3
+        if self._type(size) == 'ID':
+            size_source = self.places[self.resolutions[size]]
+        else:
+            size_source = repr(int(self._value(size)))
+        name = self._value(first + 1)
+        place = self._declare(first + 1, context)
+        return [f"{place} = _new_array({self._value(first + 6)!r}, {size_source}, {name!r}, "
+                f"{self._location(first + 1)!r})"]
+
+    def _expression_statement(self, index: int, context: _Context) -> List[str]:
+        # ID = Expresion :3  |  ID [ Expresion ] = Expresion :3
+        tree = self.tree
+        target = tree.first_tokens[index]
+        symbol = self.resolutions[target]
+        place = self.places[symbol]
+        expressions = [child for child in tree.children(index + 1) if tree.name(child) == 'Expresion']
+        lines: List[str] = []
+        value, value_type = self._expression(expressions[-1], lines)
+        if symbol.type == FLOAT and value_type == INTEGER and symbol.kind == Symbol.VARIABLE:
+            value = f"float({value})"
+        if len(expressions) == 1:
+            return lines + [f"{place} = {value}"]
+        offset, _ = self._expression(expressions[0], lines)
+        return lines + [
+            f"_a = {place}",
+            f"_i = {offset}",
+            f"if not 0 <= _i < len(_a):",
+            f"    _index_error(_i, {symbol.name!r}, len(_a), {self._location(target)!r})",
+            f"_a[_i] = {value}",
+        ]
+
+    def _print(self, index: int, context: _Context) -> List[str]:
+        # Print → Mostrinter ( Printable ) :3, Printable → Expresion
+        lines: List[str] = []
+        value, value_type = self._expression(index + 2, lines)
+        if value_type in (INTEGER, FLOAT):
+            value = f"str({value})"
+        elif value_type == BOOLEAN:
+            value = f"('TRUEter' if {value} else 'FALSEter')"
+        elif value_type != STRING:
+            value = f"_format_value({value})"
+        return lines + [f"g[{IO_SLOT}].write_line({value})"]
+
+    def _input(self, index: int, context: _Context) -> List[str]:
+        # LEERinter ( ID ) :3
+        position = self.tree.first_tokens[index] + 2
+        symbol = self.resolutions[position]
+        return [f"{self.places[symbol]} = _read_value(g[{IO_SLOT}], {symbol.type!r}, {symbol.name!r}, "
+                f"{self._location(position)!r})"]
+
+    def _break(self, index: int, context: _Context) -> List[str]:
+        return ['break' if context.loop_here else 'return _BREAK']
+
+    def _continue(self, index: int, context: _Context) -> List[str]:
+        if not context.loop_here:
+            return ['return _CONTINUE']
+        if context.loop < 0:
+            return ['continue']
+        # En un Forinter, CONTINUEinter hace la actualización
+        return self._expression_statement(context.loop, context) + ['continue']
+
+    def _return(self, index: int, context: _Context) -> List[str]:
+        lines: List[str] = []
+        value, _ = self._expression(index + 1, lines)
+        if context.function.hoisted:
+            return lines + [f"return _Return({value})"]
+        return lines + [f"return {value}"]
+
+    def _conditions(self, index: int, context: _Context, tasks: List):
+        # Siinter ( Condition ) Block OptionalElse
+        tree = self.tree
+        condition, block, *rest = tree.children(index)
+        lines: List[str] = []
+        value, _ = self._expression(condition + 1, lines)
+        for line in lines:
+            context.emit(line)
+        context.emit(f"if {value}:")
+        if rest:  # OptionalElse → Sinointer Block
+            tasks.append(self._block_task(rest[0] + 1, context.inner()))
+            tasks.append((_LINES, ['else:'], context))
+        tasks.append(self._block_task(block, context.inner()))
+
+    def _loops(self, index: int, context: _Context, tasks: List):
+        # Mientinter ( Condition ) Block
+        # Forinter ( ForInit ; Condition ; ExpressionStatement ) Block
+        tree = self.tree
+        children = list(tree.children(index))
+        if len(children) == 2:
+            condition, block = children
+            update = -1
+        else:
+            initial, condition, update, block = children
+            # ForInit → VarDec | ExpressionStatement
+            for line in self.handlers[tree.name(initial + 1)](initial + 1, context):
+                context.emit(line)
+        lines: List[str] = []
+        value, _ = self._expression(condition + 1, lines)
+        body = context.inner(loop=update)
+        if lines:
+            # La condición necesita variables temporales: se evalúa al
+            # principio de cada vuelta
+            context.emit('while True:')
+            for line in lines:
+                body.emit(line)
+            body.emit(f"if not ({value}):")
+            body.emit('    break')
+        else:
+            context.emit(f"while {value}:")
+        if update >= 0:
+            tasks.append((_LINES, self._expression_statement(update, body), body))
+        tasks.append(self._block_task(block, body))
+
+    def _method(self, index: int, context: _Context, tasks: List):
+        # Methodinter ID ( TYPE ID , TYPE ID ... ) Block
+        first = self.tree.first_tokens[index]
+        if context.method is not None:
+            raise CompileError(f"Nested methods are not supported: {self._value(first + 1)} "
+                               f"at {self._location(first + 1)}")
+        name = self._value(first + 1)
+        function = self._function(f"_m{len(self.functions)}", hoisted=False)
+        method = _Method(name, function.name)
+        self.methods[name] = method
+        body = _Context(function, 1, None, False, method)
+        position = first + 3
+        while self._type(position) == 'TYPE':
+            self._declare(position + 1, body)
+            method.parameters.append((self._value(position), method.frame_size - 1))
+            position += 3 if self._type(position + 2) == 'COMMA' else 2
+        *_, block = self.tree.children(index)
+        tasks.append(self._block_task(block, body))
+
+    def _has_code(self, block: int) -> bool:
+        return self.tree.subtree_ends[block] > block + 1
+
+    def _block_task(self, block: int, context: _Context) -> Tuple:
+        """Block → { CODE }: la tarea del CODE, o un pass si el bloque está vacío"""
+        if self._has_code(block):
+            return _BLOCK, block + 1, context
+        return _LINES, ['pass'], context
+
+    # Expresiones
+
+    def _expression(self, index: int, lines: List[str]) -> Tuple[str, Optional[str]]:
+        """
+        Código Python y tipo de un nodo Expresion. Los subárboles muy
+        profundos se calculan antes en variables temporales: sus
+        asignaciones se agregan a lines.
+        """
+        if index not in self.expressions:
+            # El análisis semántico no pudo armar su árbol (y debió reportarlo)
+            position = self.tree.first_tokens[index]
+            raise CompileError(f"Expression at line {self.tokens[position].line} could not be compiled")
+        expression, types = self.expressions[index]
+        token_indexes, lefts, rights = expression.token_indexes, expression.lefts, expression.rights
+        sources: List[str] = []
+        powers: List[int] = []
+        depths: List[int] = []
+        for node in range(len(expression)):
+            position = token_indexes[node]
+            left, right = lefts[node], rights[node]
+            if right < 0:
+                source, power, depth = self._atom(position), ATOM_POWER, 1
+            elif left < 0:  # NOTter
+                operand = sources[right] if powers[right] >= PREFIX_POWER else f"({sources[right]})"
+                source, power, depth = f"not {operand}", PREFIX_POWER, depths[right] + 1
+            else:
+                operator = self._value(position)
+                power = BINARY_POWERS[operator]
+                depth = max(depths[left], depths[right]) + 1
+                if operator == '/' and types[left] == INTEGER and types[right] == INTEGER:
+                    source, power = f"_divide({sources[left]}, {sources[right]})", ATOM_POWER
+                elif operator in LOGICAL_OPERATORS:
+                    # & y | ligan más que las comparaciones y que not en
+                    # Python: los operandos compuestos van entre paréntesis
+                    operands = [sources[operand] if powers[operand] == ATOM_POWER else f"({sources[operand]})"
+                                for operand in (left, right)]
+                    source = f"{operands[0]} {LOGICAL_OPERATORS[operator]} {operands[1]}"
+                else:
+                    # Asocian a izquierda; las comparaciones de Python se
+                    # encadenan, así que una comparación a la izquierda de
+                    # otra va entre paréntesis
+                    left_source = sources[left]
+                    if powers[left] < power or (power == COMPARISON_POWER and powers[left] == power):
+                        left_source = f"({left_source})"
+                    right_source = sources[right] if powers[right] > power else f"({sources[right]})"
+                    source = f"{left_source} {operator} {right_source}"
+            if depth >= MAX_EXPRESSION_DEPTH:
+                self.temporaries += 1
+                lines.append(f"_t{self.temporaries} = {source}")
+                source, power, depth = f"_t{self.temporaries}", ATOM_POWER, 1
+            sources.append(source)
+            powers.append(power)
+            depths.append(depth)
+        return sources[-1], types[-1]
+
+    def _atom(self, position: int) -> str:
+        token_type = self._type(position)
+        value = self._value(position)
+        if token_type == 'ID':
+            return self.places[self.resolutions[position]]
+        if token_type == 'NUMBER':
+            return repr(float(value)) if '.' in value else repr(int(value))
+        if token_type == 'STRING':
+            return repr(value[1:-1])
+        return repr(value == 'TRUEter')
+
+
+
+def compile_program(tree, tokens: Sequence) -> CompiledProgram:
+    """
+    Compila un programa a partir de su árbol de análisis
+    (Parser.validate(tokens, build_tree=True)) y de sus tokens. Si tiene
+    errores semánticos lanza CompileError con los diagnósticos.
+    """
+    checker = SemanticChecker(tree, tokens, record=True)
+    diagnostics = checker.check()
+    if diagnostics:
+        raise CompileError(f"{len(diagnostics)} semantic errors", diagnostics)
+    return _Compiler(tree, tokens, checker).compile()
+
+
+def compile_source(source: str, parser: Optional[Parser] = None) -> CompiledProgram:
+    """Analiza y compila el código de un programa"""
+    try:
+        tokens = Lexer().tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        raise CompileError(str(e)) from None
+    parser = parser if parser is not None else Parser()
+    if not parser.validate(tokens, build_tree=True):
+        raise CompileError(f"{len(parser.diagnostics)} syntax errors", parser.diagnostics)
+    return compile_program(parser.tree, tokens)
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Compila y ejecuta un programa")
+    arguments.add_argument('path', help="archivo del programa")
+    arguments.add_argument('--source', action='store_true', help="mostrar el código Python generado sin ejecutarlo")
+    options = arguments.parse_args(argv[1:])
+
+    with open(options.path, encoding='utf-8') as source_file:
+        source = source_file.read()
+    try:
+        program = compile_source(source)
+    except CompileError as e:
+        print(f"No se pudo compilar: {e}", file=sys.stderr)
+        for diagnostic in e.diagnostics:
+            print(diagnostic, file=sys.stderr)
+        return 1
+    if options.source:
+        sys.stdout.write(program.source)
+        return 0
+    try:
+        program.run()
+    except ProgramError as e:
+        print(f"Error de ejecución: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
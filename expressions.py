@@ -0,0 +1,180 @@
+"""
+Árbol de expresiones con precedencia.
+
+La gramática describe las expresiones como una cadena plana
+(Expresion → Factor ExprTail), que basta para validarlas pero no dice qué
+operador se aplica primero. parse_expression arma, a partir de los tokens
+de una expresión, un árbol con la precedencia y asociatividad usuales, de
+menor a mayor:
+
+    ORter
+    ANDter
+    NOTter (prefijo)
+    ==  !=  >  <  >=  <=
+    +  -
+    *  /
+
+Todos los operadores binarios asocian a izquierda. Como en Python, NOTter
+liga menos que las comparaciones: NOTter y == 2 es NOTter (y == 2).
+
+Los prefijos son los de la gramática (Factor → OP_LOG Factor): sólo un
+OP_LOG puede ir en posición de operando. La gramática también acepta
+NOTter entre dos operandos (ExprTail → OP_LOG Factor ExprTail), pero no
+tiene significado como operador binario: parse_expression lo rechaza con
+un ExpressionError en la posición del NOTter.
+
+El algoritmo es el de precedencia por desplazamiento y reducción
+(shunting-yard), con pilas explícitas: no hay recursión, así que una
+expresión de decenas de miles de términos o de paréntesis anidados no
+agota la pila de Python. Los nodos se guardan en arreglos paralelos en
+postorden (la raíz es el último).
+"""
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Poder de ligadura de cada operador binario
+BINARY_POWERS = {
+    'ORter': 1,
+    'ANDter': 2,
+    '==': 4, '!=': 4, '>': 4, '<': 4, '>=': 4, '<=': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6,
+}
+
+# Poder de ligadura de los operadores prefijos (OP_LOG en posición de operando)
+PREFIX_POWER = 3
+
+OPERATOR_TYPES = {'OP_ARIT', 'OP_REL', 'OP_LOG'}
+PREFIX_TYPES = {'OP_LOG'}  # Factor → OP_LOG Factor
+ATOM_TYPES = {'ID', 'NUMBER', 'STRING', 'BOOLEAN'}
+
+
+class ExpressionError(ValueError):
+    def __init__(self, message: str, position: int):
+        self.message = message
+        self.position = position
+        super().__init__(f"Malformed expression at token {position}: {message}")
+
+
+class ExpressionTree:
+    def __init__(self, tokens: Sequence):
+        self.tokens = tokens
+        self.token_indexes = array('I')  # Token del operador o del operando
+        self.lefts = array('i')  # Operando izquierdo, o -1 (átomos y prefijos)
+        self.rights = array('i')  # Operando derecho, o -1 (átomos)
+
+    def __len__(self) -> int:
+        return len(self.token_indexes)
+
+    @property
+    def root(self) -> int:
+        return len(self.token_indexes) - 1
+
+    def kind(self, node: int) -> str:
+        """'atom', 'prefix' o 'binary'"""
+        if self.rights[node] < 0:
+            return 'atom'
+        return 'prefix' if self.lefts[node] < 0 else 'binary'
+
+    def value(self, node: int) -> str:
+        """Operador, o valor del operando"""
+        return self.tokens[self.token_indexes[node]].value
+
+    def operands(self, node: int) -> Tuple[int, ...]:
+        left, right = self.lefts[node], self.rights[node]
+        if right < 0:
+            return ()
+        return (right,) if left < 0 else (left, right)
+
+    def postorder(self) -> Iterator[int]:
+        """Los nodos ya están en postorden: cada operando antes que su operador"""
+        return iter(range(len(self.token_indexes)))
+
+    def format(self, node: Optional[int] = None) -> str:
+        """La expresión con cada operación entre paréntesis"""
+        pieces: List[str] = []
+        stack: List = [self.root if node is None else node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                pieces.append(item)
+                continue
+            left, right = self.lefts[item], self.rights[item]
+            if right < 0:
+                pieces.append(self.value(item))
+            elif left < 0:
+                stack.extend((')', right, f"({self.value(item)} "))
+            else:
+                stack.extend((')', right, f" {self.value(item)} ", left, '('))
+        return ''.join(pieces)
+
+    def _add(self, token_index: int, left: int, right: int) -> int:
+        self.token_indexes.append(token_index)
+        self.lefts.append(left)
+        self.rights.append(right)
+        return len(self.token_indexes) - 1
+
+
+def parse_expression(tokens: Sequence, start: int = 0, end: Optional[int] = None) -> ExpressionTree:
+    """
+    Árbol de la expresión formada por tokens[start:end] (una lista de Token
+    o un TokenBuffer). Lanza ExpressionError si los tokens no forman una
+    expresión completa.
+    """
+    if end is None:
+        end = len(tokens)
+    tree = ExpressionTree(tokens)
+    add = tree._add
+    operands: List[int] = []
+    # Operadores pendientes: (poder, token, es prefijo); los paréntesis tienen poder 0
+    operators: List[Tuple[int, int, bool]] = []
+
+    def reduce():
+        _, token_index, prefix = operators.pop()
+        right = operands.pop()
+        left = -1 if prefix else operands.pop()
+        operands.append(add(token_index, left, right))
+
+    expect_operand = True
+    for position in range(start, end):
+        token = tokens[position]
+        token_type = token.type
+
+        if expect_operand:
+            if token_type in PREFIX_TYPES:
+                operators.append((PREFIX_POWER, position, True))
+            elif token_type == 'LPAREN':
+                operators.append((0, position, False))
+            elif token_type in ATOM_TYPES:
+                operands.append(add(position, -1, -1))
+                expect_operand = False
+            else:
+                raise ExpressionError(f"expected an operand, got {token_type}", position)
+            continue
+
+        if token_type == 'RPAREN':
+            while operators and operators[-1][0]:
+                reduce()
+            if not operators:
+                raise ExpressionError("unbalanced ')'", position)
+            operators.pop()
+            continue
+
+        power = BINARY_POWERS.get(token.value) if token_type in OPERATOR_TYPES else None
+        if power is None:
+            if token_type in OPERATOR_TYPES:
+                raise ExpressionError(f"{token.value} is not a binary operator", position)
+            raise ExpressionError(f"expected an operator, got {token_type}", position)
+        # Asociatividad a izquierda: se reduce lo que liga igual o más
+        while operators and operators[-1][0] >= power:
+            reduce()
+        operators.append((power, position, False))
+        expect_operand = True
+
+    if expect_operand:
+        raise ExpressionError("expected an operand", end)
+    while operators:
+        if not operators[-1][0]:
+            raise ExpressionError("unbalanced '('", operators[-1][1])
+        reduce()
+    return tree
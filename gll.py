@@ -0,0 +1,500 @@
+"""
+Parser GLL (LL generalizado) para cualquier gramática del EBNF.
+
+Parser es LL(1): ante un conflicto de la tabla se queda con la primera
+alternativa, así que reglas como LogicalExpr (que empieza con Expresion y
+comparte con ella los operadores lógicos) no se pueden usar. GLLParser
+acepta cualquier gramática libre de contexto, también ambigua o con
+recursión por la izquierda, siguiendo el algoritmo de Scott y Johnstone:
+
+- Un descriptor (posición en una producción, nodo de la pila, token, nodo
+  del bosque) es una rama del análisis; el conjunto de descriptores ya
+  vistos evita repetir trabajo.
+- La pila es un grafo (GSS): las llamadas a un mismo no terminal en el
+  mismo token comparten el nodo, y sus retornos se reparten a todos los
+  que llamaron, también a los que llegan después.
+- El resultado es un bosque de análisis compartido y empaquetado (SPPF):
+  los nodos (símbolo, inicio, fin) se comparten y cada forma de derivarlos
+  es un hijo empaquetado, binarizado con nodos intermedios para que el
+  tamaño del bosque sea a lo sumo cúbico.
+
+Las alternativas se filtran con el token actual (FIRST, y FOLLOW si son
+anulables). Además, los no terminales desde los que sólo se alcanzan
+reglas sin conflictos LL(1) se analizan con un ciclo determinista que
+elige la producción con una tabla, como Parser, y arma sus nodos del
+bosque sin pasar por la pila ni por descriptores: con Gramatica.ebnf todo
+el programa va por ese camino y el análisis es lineal, y sólo las partes
+ambiguas de una gramática pagan el costo del análisis generalizado.
+
+A diferencia de Parser, el programa tiene que ocupar todos los tokens, y
+no hay recuperación de errores: si no hay análisis se informa el token más
+lejano al que se llegó y qué se esperaba ahí.
+
+Uso: python gll.py programa.txt [--grammar RUTA] [--start SIMBOLO] [--no-fast-path]
+"""
+import argparse
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from grammar import (END_MARKER, EPSILON, GRAMMAR_PATH, compute_first, compute_follow, first_of_sequence,
+                     parse_grammar, reachable_non_terminals)
+from main import InvalidCharacterError, Lexer, Token, TokenBuffer
+
+# Nodo del bosque: (etiqueta, inicio, fin). La etiqueta es el nombre del
+# no terminal o del terminal, EPSILON, o el número de la posición en una
+# producción para los nodos intermedios
+Node = Tuple[object, int, int]
+
+# Nodo de la pila: (posición de retorno, token); ROOT es el fondo
+GSSNode = Tuple[int, int]
+ROOT: GSSNode = (-1, 0)
+
+
+class GLLGrammar:
+    """
+    Gramática preparada para GLLParser: producciones numeradas, posiciones
+    (producción, punto) numeradas, conjuntos de selección de cada
+    alternativa y los no terminales que se pueden analizar en forma
+    determinista
+    """
+    def __init__(self, productions: Dict[str, List[List[str]]], start: str):
+        if start not in productions:
+            raise ValueError(f"Unknown start symbol: {start}")
+        self.start = start
+        reachable = reachable_non_terminals(productions, start)
+        productions = {name: productions[name] for name in reachable}
+        first = compute_first(productions)
+        follow = compute_follow(productions, first, start)
+
+        self.heads: List[str] = []
+        self.bodies: List[Tuple[str, ...]] = []
+        self.selects: List[FrozenSet[str]] = []  # Tokens con los que se elige cada producción
+        self.alternatives: Dict[str, List[int]] = {}
+        for name, alternatives in productions.items():
+            for body in alternatives:
+                body = tuple(symbol for symbol in body if symbol != EPSILON)
+                lookahead = first_of_sequence(list(body), first)
+                if EPSILON in lookahead:
+                    lookahead = (lookahead - {EPSILON}) | follow[name]
+                self.alternatives.setdefault(name, []).append(len(self.bodies))
+                self.heads.append(name)
+                self.bodies.append(body)
+                self.selects.append(frozenset(lookahead))
+
+        # Posiciones: la de (producción p, punto d) es starts[p] + d
+        self.starts: List[int] = []
+        self.slot_productions: List[int] = []
+        for production, body in enumerate(self.bodies):
+            self.starts.append(len(self.slot_productions))
+            self.slot_productions.extend([production] * (len(body) + 1))
+
+        self.nullable = {name for name in productions if EPSILON in first[name]}
+        self.conflicts = self._conflicts()
+        self.deterministic = self._deterministic(productions)
+        # Tabla LL(1) de los no terminales deterministas
+        self.table: Dict[str, Dict[str, int]] = {
+            name: {kind: production for production in self.alternatives[name] for kind in self.selects[production]}
+            for name in self.deterministic
+        }
+
+    @classmethod
+    def load(cls, path: str = GRAMMAR_PATH, start: Optional[str] = None) -> 'GLLGrammar':
+        with open(path, encoding='utf-8') as grammar_file:
+            productions = parse_grammar(grammar_file.read())
+        return cls(productions, start or 'Programa')
+
+    def _conflicts(self) -> Set[str]:
+        """No terminales con alternativas que se eligen con un mismo token"""
+        conflicts = set()
+        for name, alternatives in self.alternatives.items():
+            seen: Set[str] = set()
+            for production in alternatives:
+                if seen & self.selects[production]:
+                    conflicts.add(name)
+                seen |= self.selects[production]
+        return conflicts
+
+    def _deterministic(self, productions: Dict[str, List[List[str]]]) -> Set[str]:
+        """No terminales desde los que no se alcanza ningún conflicto"""
+        deterministic = set()
+        for name in productions:
+            closure = reachable_non_terminals(productions, name)
+            if not any(used in self.conflicts for used in closure):
+                deterministic.add(name)
+        return deterministic
+
+    def is_terminal(self, symbol: str) -> bool:
+        return symbol not in self.alternatives
+
+    def slot_name(self, slot: int) -> str:
+        """Posición en una producción, como "X → a · B c" """
+        production = self.slot_productions[slot]
+        dot = slot - self.starts[production]
+        body = list(self.bodies[production])
+        return f"{self.heads[production]} → {' '.join(body[:dot] + ['·'] + body[dot:])}"
+
+
+class ParseForest:
+    """
+    Bosque de análisis compartido (SPPF). packed tiene, para cada nodo con
+    hijos, sus formas de derivarlo: (posición, corte) → (izquierdo, derecho),
+    con izquierdo None si la forma tiene un solo hijo
+    """
+    def __init__(self, grammar: GLLGrammar, root: Node,
+                 packed: Dict[Node, Dict[Tuple[int, int], Tuple[Optional[Node], Node]]]):
+        self.grammar = grammar
+        self.root = root
+        self.packed = packed
+
+    def label(self, node: Node) -> str:
+        label = node[0]
+        return self.grammar.slot_name(label) if isinstance(label, int) else label
+
+    def ambiguities(self) -> List[Tuple[str, int, int, int]]:
+        """(símbolo o posición, primer token, fin, formas) de los nodos con más de una derivación"""
+        found = []
+        for node in self._reachable():
+            forms = self.packed.get(node, ())
+            if len(forms) > 1:
+                found.append((self.label(node), node[1], node[2], len(forms)))
+        return sorted(found, key=lambda item: (item[1], -item[2], item[0]))
+
+    @property
+    def is_ambiguous(self) -> bool:
+        return any(len(self.packed.get(node, ())) > 1 for node in self._reachable())
+
+    def _reachable(self) -> List[Node]:
+        order, seen = [self.root], {self.root}
+        for node in order:
+            for left, right in self.packed.get(node, {}).values():
+                for child in (left, right):
+                    if child is not None and child not in seen:
+                        seen.add(child)
+                        order.append(child)
+        return order
+
+    def tree_count(self) -> float:
+        """Cantidad de árboles del bosque (infinito si la gramática tiene ciclos A ⇒+ A)"""
+        counts: Dict[Node, float] = {}
+        visiting: Set[Node] = set()
+        stack: List[Tuple[Node, bool]] = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in counts:
+                continue
+            forms = self.packed.get(node)
+            if not forms:
+                counts[node] = 1
+                continue
+            if expanded:
+                visiting.discard(node)
+                total = 0
+                for left, right in forms.values():
+                    total += (counts[left] if left is not None else 1) * counts[right]
+                counts[node] = total
+                continue
+            if node in visiting:
+                return float('inf')  # El nodo se deriva a sí mismo
+            visiting.add(node)
+            stack.append((node, True))
+            for left, right in forms.values():
+                for child in (left, right):
+                    if child is not None and child not in counts:
+                        if child in visiting:
+                            return float('inf')
+                        stack.append((child, False))
+        return counts[self.root]
+
+
+class GLLParser:
+    """
+    Parser GLL sobre una GLLGrammar (por defecto Gramatica.ebnf desde
+    Programa). Con fast_path=False todo pasa por el análisis generalizado,
+    también las reglas LL(1)
+    """
+    def __init__(self, grammar: Optional[GLLGrammar] = None, fast_path: bool = True):
+        self.grammar = grammar or GLLGrammar.load()
+        self.fast_path = fast_path
+        self.forest: Optional[ParseForest] = None  # Bosque del último análisis aceptado
+        self.error: Optional[str] = None  # Por qué no hubo análisis
+        self.stats: Dict[str, int] = {}
+
+    def parse(self, tokens: Iterable[Token]) -> bool:
+        """Analiza los tokens; True si toda la entrada se deriva del símbolo inicial"""
+        if isinstance(tokens, TokenBuffer):
+            self.types = [tokens.type(index) for index in range(len(tokens))]
+        else:
+            tokens = list(tokens)
+            self.types = [token.type for token in tokens]
+        self.tokens = tokens
+        self.length = len(self.types)
+        self.types.append(END_MARKER)
+
+        self.packed: Dict[Node, Dict[Tuple[int, int], Tuple[Optional[Node], Node]]] = {}
+        self.edges: Dict[GSSNode, Dict[Tuple[GSSNode, Optional[Node]], None]] = {}
+        self.popped: Dict[GSSNode, Dict[Node, None]] = {}
+        self.seen: Set[Tuple[int, GSSNode, int, Optional[Node]]] = set()
+        self.pending: List[Tuple[int, GSSNode, int, Optional[Node]]] = []
+        self.memo: Dict[Tuple[str, int], Optional[Tuple[int, Node]]] = {}
+        self.furthest, self.expected = -1, set()
+        self.stats = {'descriptors': 0, 'deterministic_calls': 0, 'deterministic_tokens': 0}
+        self.forest, self.error = None, None
+
+        grammar = self.grammar
+        start = grammar.start
+        root = (start, 0, self.length)
+        if self.fast_path and start in grammar.deterministic:
+            result = self._deterministic(start, 0)
+            accepted = result is not None and result[0] == self.length
+            if result is not None and not accepted:
+                self._fail(result[0], (END_MARKER,))
+        else:
+            for production in grammar.alternatives[start]:
+                if self.types[0] in grammar.selects[production]:
+                    self._add(grammar.starts[production], ROOT, 0, None)
+            self._run()
+            accepted = root in self.packed
+
+        self.stats.update(gss_nodes=len(self.edges), gss_edges=sum(map(len, self.edges.values())),
+                          sppf_nodes=len(self.packed))
+        if accepted:
+            self.forest = ParseForest(grammar, root, self.packed)
+        else:
+            self.error = self._describe_error()
+        del self.edges, self.popped, self.seen, self.pending, self.memo
+        return accepted
+
+    def _describe_error(self) -> str:
+        position = self.furthest
+        expected = ', '.join(sorted(self.expected - {END_MARKER} | ({'fin de la entrada'}
+                                                                      if END_MARKER in self.expected else set())))
+        if position < 0:
+            return "No parse"
+        if position >= self.length:
+            return f"Unexpected end of input, expected {expected}"
+        token = self.tokens[position]
+        return f"Error en {token.location()}: Unexpected token {token.type}, expected {expected}"
+
+    def _fail(self, position: int, expected: Iterable[str]):
+        """Anota el token más lejano donde falló una rama y qué se esperaba"""
+        if position > self.furthest:
+            self.furthest, self.expected = position, set(expected)
+        elif position == self.furthest:
+            self.expected.update(expected)
+
+    def _add(self, slot: int, node: GSSNode, position: int, forest_node: Optional[Node]):
+        descriptor = (slot, node, position, forest_node)
+        if descriptor not in self.seen:
+            self.seen.add(descriptor)
+            self.pending.append(descriptor)
+
+    def _node_p(self, slot: int, left: Optional[Node], right: Node) -> Node:
+        """
+        Nodo del bosque para haber avanzado hasta slot, con left lo
+        reconocido antes (o None) y right el último símbolo (getNodeP)
+        """
+        grammar = self.grammar
+        production = grammar.slot_productions[slot]
+        dot = slot - grammar.starts[production]
+        body = grammar.bodies[production]
+        if dot == 1 and dot < len(body):
+            first = body[0]
+            if grammar.is_terminal(first) or first not in grammar.nullable:
+                return right
+        label = grammar.heads[production] if dot == len(body) else slot
+        start = left[1] if left is not None else right[1]
+        node = (label, start, right[2])
+        forms = self.packed.get(node)
+        if forms is None:
+            forms = self.packed[node] = {}
+        key = (slot, right[1])
+        if key not in forms:
+            forms[key] = (left, right)
+        return node
+
+    def _create(self, slot: int, caller: GSSNode, position: int, forest_node: Optional[Node]) -> GSSNode:
+        """Nodo de la pila para llamar a un no terminal, que vuelve a slot"""
+        node = (slot, position)
+        edges = self.edges.get(node)
+        if edges is None:
+            edges = self.edges[node] = {}
+        edge = (caller, forest_node)
+        if edge not in edges:
+            edges[edge] = None
+            # Retornos que ya ocurrieron se entregan también a este llamador
+            for returned in self.popped.get(node, ()):
+                self._add(slot, caller, returned[2], self._node_p(slot, forest_node, returned))
+        return node
+
+    def _pop(self, node: GSSNode, position: int, forest_node: Node):
+        """Retorno de un no terminal reconocido hasta position"""
+        if node == ROOT:
+            if position < self.length:
+                # El símbolo inicial terminó antes que la entrada: sobran tokens
+                self._fail(position, (END_MARKER,))
+            return
+        popped = self.popped.get(node)
+        if popped is None:
+            popped = self.popped[node] = {}
+        if forest_node in popped:
+            return
+        popped[forest_node] = None
+        slot = node[0]
+        for caller, left in list(self.edges[node]):
+            self._add(slot, caller, position, self._node_p(slot, left, forest_node))
+
+    def _run(self):
+        grammar = self.grammar
+        starts = grammar.starts
+        slot_productions = grammar.slot_productions
+        bodies = grammar.bodies
+        alternatives = grammar.alternatives
+        selects = grammar.selects
+        deterministic = grammar.deterministic if self.fast_path else ()
+        types = self.types
+        pending = self.pending
+        node_p = self._node_p
+        processed = 0
+
+        while pending:
+            slot, caller, position, node = pending.pop()
+            processed += 1
+            production = slot_productions[slot]
+            body = bodies[production]
+            dot = slot - starts[production]
+
+            while True:
+                if dot == len(body):
+                    if not body:
+                        node = node_p(slot, None, (EPSILON, position, position))
+                    self._pop(caller, position, node)
+                    break
+                symbol = body[dot]
+                if symbol not in alternatives:  # Terminal
+                    if types[position] != symbol:
+                        self._fail(position, (symbol,))
+                        break
+                    node = node_p(slot + 1, node, (symbol, position, position + 1))
+                    position += 1
+                elif symbol in deterministic:
+                    result = self._deterministic(symbol, position)
+                    if result is None:
+                        break
+                    position, child = result
+                    node = node_p(slot + 1, node, child)
+                else:
+                    kind = types[position]
+                    chosen = [alternative for alternative in alternatives[symbol] if kind in selects[alternative]]
+                    if not chosen:
+                        self._fail(position, set().union(*(selects[alternative] for alternative in alternatives[symbol])))
+                        break
+                    called = self._create(slot + 1, caller, position, node)
+                    for alternative in chosen:
+                        self._add(starts[alternative], called, position, None)
+                    break
+                slot += 1
+                dot += 1
+
+        self.stats['descriptors'] += processed
+
+    def _deterministic(self, name: str, position: int) -> Optional[Tuple[int, Node]]:
+        """
+        Analiza un no terminal sin conflictos con un ciclo LL(1) (pila de
+        producciones en curso) y arma sus nodos del bosque. Devuelve el fin
+        y el nodo, o None si no hay derivación; el resultado se recuerda
+        por (no terminal, token)
+        """
+        key = (name, position)
+        if key in self.memo:
+            return self.memo[key]
+        grammar = self.grammar
+        table = grammar.table
+        starts = grammar.starts
+        bodies = grammar.bodies
+        types = self.types
+        node_p = self._node_p
+        start = position
+        self.stats['deterministic_calls'] += 1
+
+        production = table[name].get(types[position])
+        if production is None:
+            self._fail(position, table[name])
+            self.memo[key] = None
+            return None
+        # Producción, punto y nodo de lo reconocido de cada no terminal en curso
+        frames: List[List] = [[production, 0, None]]
+        result = None
+        while frames:
+            frame = frames[-1]
+            production, dot, node = frame
+            body = bodies[production]
+            if dot == len(body):
+                if not body:
+                    node = node_p(starts[production], None, (EPSILON, position, position))
+                frames.pop()
+                if not frames:
+                    result = (position, node)
+                    break
+                parent = frames[-1]
+                parent[1] += 1
+                parent[2] = node_p(starts[parent[0]] + parent[1], parent[2], node)
+                continue
+            symbol = body[dot]
+            if symbol in table:
+                production = table[symbol].get(types[position])
+                if production is None:
+                    self._fail(position, table[symbol])
+                    break
+                frames.append([production, 0, None])
+            else:
+                if types[position] != symbol:
+                    self._fail(position, (symbol,))
+                    break
+                frame[1] = dot + 1
+                frame[2] = node_p(starts[production] + dot + 1, node, (symbol, position, position + 1))
+                position += 1
+
+        if result is not None:
+            self.stats['deterministic_tokens'] += result[0] - start
+        self.memo[key] = result
+        return result
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Analiza un programa con el parser GLL")
+    arguments.add_argument('path', help="programa a analizar")
+    arguments.add_argument('--grammar', default=GRAMMAR_PATH, metavar='RUTA', help="gramática EBNF")
+    arguments.add_argument('--start', help="símbolo inicial (por defecto Programa)")
+    arguments.add_argument('--no-fast-path', action='store_true',
+                           help="analizar todo en forma generalizada, también las reglas LL(1)")
+    options = arguments.parse_args(argv[1:])
+
+    grammar = GLLGrammar.load(options.grammar, options.start)
+    if grammar.conflicts:
+        print(f"No terminales con conflictos LL(1): {', '.join(sorted(grammar.conflicts))}")
+    with open(options.path, encoding='utf-8') as source_file:
+        source = source_file.read()
+    try:
+        tokens = Lexer().tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    parser = GLLParser(grammar, fast_path=not options.no_fast_path)
+    accepted = parser.parse(tokens)
+    print(', '.join(f"{name}: {value:,}" for name, value in parser.stats.items()))
+    if not accepted:
+        print(parser.error)
+        return 1
+    forest = parser.forest
+    ambiguities = forest.ambiguities()
+    count = forest.tree_count()
+    print(f"Válido: {'ambiguo' if ambiguities else 'un solo árbol'}"
+          f"{f' ({count:,} árboles)' if ambiguities and count != float('inf') else ''}")
+    for label, start, end, forms in ambiguities:
+        print(f"  {label} [{start}, {end}): {forms} formas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
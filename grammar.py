@@ -0,0 +1,439 @@
+"""
+Compilador de la gramática.
+
+Lee Gramatica.ebnf, calcula los conjuntos FIRST y FOLLOW por punto fijo,
+detecta conflictos LL(1) y genera la tabla de análisis predictivo que usa
+Parser. La tabla compilada se guarda en __pycache__ con una clave derivada
+del hash de la gramática, de modo que sólo se recompila cuando la gramática
+(o el lexer que define sus terminales) cambia.
+"""
+import hashlib
+import os
+import pickle
+import re
+import sys
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from main import TOKEN_KINDS, Lexer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GRAMMAR_PATH = os.path.join(BASE_DIR, 'Gramatica.ebnf')
+CACHE_DIR = os.path.join(BASE_DIR, '__pycache__')
+
+START_SYMBOL = 'Programa'
+EPSILON = 'ε'
+END_MARKER = '$'
+
+# Se incrementa cuando cambia el formato del artefacto compilado
+COMPILER_VERSION = 2
+
+_RULE_ARROW = '→'
+_SYMBOL_REGEX = re.compile(r'"(?:[^"\\]|\\.)*"|\'[^\']*\'|ε|[A-Za-z_][A-Za-z0-9_]*|\||\S')
+
+Production = List[str]
+ParseTable = Dict[str, Dict[str, Production]]
+
+
+class GrammarError(Exception):
+    def __init__(self, message: str, line: int):
+        self.message = message
+        self.line = line
+        super().__init__(f"Grammar Error at line {line}: {message}")
+
+
+class Conflict:
+    """Dos producciones de un no terminal que compiten por el mismo terminal"""
+    def __init__(self, non_terminal: str, terminal: str, chosen: Production, rejected: Production):
+        self.non_terminal = non_terminal
+        self.terminal = terminal
+        self.chosen = chosen
+        self.rejected = rejected
+
+    def __str__(self):
+        return (f"Conflicto LL(1) en {self.non_terminal} con {self.terminal}: "
+                f"{' '.join(self.chosen)} / {' '.join(self.rejected)}")
+
+
+class EncodedTable:
+    """
+    Tabla LL(1) codificada con enteros para el ciclo principal del parser.
+    Los terminales usan el identificador de TOKEN_KINDS (0..terminal_count-1)
+    y los no terminales los siguientes. La celda de (no terminal, terminal)
+    está en table[no_terminal * terminal_count + terminal] y contiene el
+    índice de la producción o -1. Cada producción se guarda ya invertida y
+    sin ε, lista para apilarse.
+    """
+    def __init__(self, symbol_names: Tuple[str, ...], terminal_count: int,
+                 productions: Tuple[Tuple[int, ...], ...], table: array):
+        self.symbol_names = symbol_names
+        self.symbol_ids = {name: symbol for symbol, name in enumerate(symbol_names)}
+        self.terminal_count = terminal_count
+        self.productions = productions
+        self.table = table
+
+    def reentries(self) -> List[int]:
+        """
+        Para cada símbolo, el no terminal anulable que lo precede en todas
+        las producciones donde aparece, o -1. Si el símbolo no coincide con
+        el token, ese no terminal se acaba de expandir a ε (como la lista
+        CODE antes de FINISH o de "}") y el análisis puede volver a entrar
+        en él para recuperarse.
+        """
+        terminal_count = self.terminal_count
+        nullable = set()
+        for symbol in range(terminal_count, len(self.symbol_names)):
+            cells = self.table[symbol * terminal_count:(symbol + 1) * terminal_count]
+            if any(production >= 0 and not self.productions[production] for production in cells):
+                nullable.add(symbol)
+
+        # Las producciones están invertidas: cada símbolo va seguido del que lo precede
+        preceding: Dict[int, Set[int]] = {}
+        leading = set()
+        for body in self.productions:
+            if body:
+                leading.add(body[-1])
+            for symbol, previous in zip(body, body[1:]):
+                preceding.setdefault(symbol, set()).add(previous)
+
+        reentries = [-1] * len(self.symbol_names)
+        for symbol, previous in preceding.items():
+            if symbol not in leading and len(previous) == 1 and previous <= nullable:
+                reentries[symbol] = next(iter(previous))
+        return reentries
+
+
+def encode_table(table: ParseTable, token_kinds: Dict[str, int]) -> EncodedTable:
+    """Interna los símbolos de la tabla en enteros y la aplana en un array"""
+    terminal_count = max(token_kinds.values()) + 1
+    names = [''] * terminal_count
+    for name, kind in token_kinds.items():
+        names[kind] = name
+    names.extend(table)
+    symbol_ids = {name: symbol for symbol, name in enumerate(names)}
+
+    productions: List[Tuple[int, ...]] = []
+    production_ids: Dict[Tuple[int, ...], int] = {}
+    cells = array('h', [-1]) * (len(names) * terminal_count)
+    for non_terminal, row in table.items():
+        base = symbol_ids[non_terminal] * terminal_count
+        for terminal, production in row.items():
+            if terminal not in token_kinds:
+                raise GrammarError(f"Terminal {terminal} is not a token type of the lexer", 0)
+            encoded = tuple(symbol_ids[symbol] for symbol in reversed(production) if symbol != EPSILON)
+            if encoded not in production_ids:
+                production_ids[encoded] = len(productions)
+                productions.append(encoded)
+            cells[base + token_kinds[terminal]] = production_ids[encoded]
+
+    return EncodedTable(tuple(names), terminal_count, tuple(productions), cells)
+
+
+class CompiledGrammar:
+    """Resultado de compilar la gramática: producciones, FIRST, FOLLOW y tabla"""
+    def __init__(self, grammar_hash: str, start: str, productions: Dict[str, List[Production]],
+                 terminals: Set[str], first: Dict[str, Set[str]], follow: Dict[str, Set[str]],
+                 table: ParseTable, encoded: EncodedTable, conflicts: List[Conflict],
+                 unreachable: List[str]):
+        self.grammar_hash = grammar_hash
+        self.start = start
+        self.productions = productions
+        self.terminals = terminals
+        self.first = first
+        self.follow = follow
+        self.table = table
+        self.encoded = encoded
+        self.conflicts = conflicts
+        self.unreachable = unreachable
+
+
+def _read_rules(text: str) -> List[Tuple[str, str, int]]:
+    """Agrupa las líneas del EBNF en reglas (lado izquierdo, cuerpo, línea)"""
+    rules: List[Tuple[str, str, int]] = []
+    for line_number, raw_line in enumerate(text.splitlines(), 1):
+        line = raw_line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if _RULE_ARROW in line:
+            head, body = line.split(_RULE_ARROW, 1)
+            head = head.strip()
+            if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', head):
+                raise GrammarError(f"Invalid rule name '{head}'", line_number)
+            rules.append((head, body.strip(), line_number))
+        elif rules:
+            # Continuación de la regla anterior (alternativas en varias líneas)
+            head, body, start_line = rules[-1]
+            rules[-1] = (head, f"{body} {line}", start_line)
+        else:
+            raise GrammarError(f"Text outside of a rule: '{line}'", line_number)
+
+    return rules
+
+
+def _literal_token_type(literal: str, lexer: Lexer, line: int) -> str:
+    """Traduce un literal de la gramática al tipo de token que produce el lexer"""
+    try:
+        tokens = lexer.tokenize(literal)
+    except ValueError:
+        tokens = []
+    if len(tokens) != 1 or tokens[0].value != literal:
+        raise GrammarError(f"Literal \"{literal}\" is not a single token of the lexer", line)
+    return tokens[0].type
+
+
+def parse_grammar(text: str, lexer: Optional[Lexer] = None) -> Dict[str, List[Production]]:
+    """
+    Convierte el texto EBNF en producciones sobre tipos de token.
+    Las reglas léxicas (las que definen un tipo de token del lexer, o las que
+    usan repeticiones y clases de caracteres) se ignoran: sus símbolos son
+    terminales para el análisis sintáctico.
+    """
+    lexer = lexer or Lexer()
+    token_types = {name for name, _ in lexer.token_patterns if name != 'WHITESPACE'}
+
+    syntactic: List[Tuple[str, List[str], int]] = []
+    for head, body, line in _read_rules(text):
+        if head in token_types:
+            continue
+        symbols = _SYMBOL_REGEX.findall(body)
+        if any(not (s == '|' or s == EPSILON or s[0] in '"\'' or s[0].isalpha() or s[0] == '_')
+               for s in symbols):
+            continue
+        syntactic.append((head, symbols, line))
+
+    non_terminals = {head for head, _, _ in syntactic}
+    productions: Dict[str, List[Production]] = {}
+    for head, symbols, line in syntactic:
+        alternatives: List[Production] = [[]]
+        for symbol in symbols:
+            if symbol == '|':
+                alternatives.append([])
+            elif symbol == EPSILON:
+                continue
+            elif symbol[0] in '"\'':
+                alternatives[-1].append(_literal_token_type(symbol[1:-1], lexer, line))
+            elif symbol in non_terminals or symbol in token_types:
+                alternatives[-1].append(symbol)
+            else:
+                raise GrammarError(f"Undefined symbol '{symbol}' in rule {head}", line)
+
+        for alternative in alternatives:
+            productions.setdefault(head, []).append(alternative or [EPSILON])
+
+    if START_SYMBOL not in productions:
+        raise GrammarError(f"Start symbol {START_SYMBOL} is not defined", 0)
+    return productions
+
+
+def reachable_non_terminals(productions: Dict[str, List[Production]], start: str) -> List[str]:
+    """No terminales alcanzables desde el símbolo inicial, en orden de descubrimiento"""
+    order = [start]
+    seen = {start}
+    for non_terminal in order:
+        for production in productions[non_terminal]:
+            for symbol in production:
+                if symbol in productions and symbol not in seen:
+                    seen.add(symbol)
+                    order.append(symbol)
+    return order
+
+
+def first_of_sequence(symbols: Production, first: Dict[str, Set[str]]) -> Set[str]:
+    """FIRST de una secuencia de símbolos; incluye ε si toda la secuencia es anulable"""
+    result: Set[str] = set()
+    for symbol in symbols:
+        if symbol == EPSILON:
+            continue
+        if symbol not in first:  # Terminal
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {EPSILON}
+        if EPSILON not in first[symbol]:
+            return result
+    result.add(EPSILON)
+    return result
+
+
+def compute_first(productions: Dict[str, List[Production]]) -> Dict[str, Set[str]]:
+    """Calcula FIRST de cada no terminal iterando hasta alcanzar un punto fijo"""
+    first: Dict[str, Set[str]] = {non_terminal: set() for non_terminal in productions}
+    changed = True
+    while changed:
+        changed = False
+        for non_terminal, alternatives in productions.items():
+            for production in alternatives:
+                new_symbols = first_of_sequence(production, first) - first[non_terminal]
+                if new_symbols:
+                    first[non_terminal] |= new_symbols
+                    changed = True
+    return first
+
+
+def compute_follow(productions: Dict[str, List[Production]], first: Dict[str, Set[str]],
+                   start: str) -> Dict[str, Set[str]]:
+    """Calcula FOLLOW de cada no terminal iterando hasta alcanzar un punto fijo"""
+    follow: Dict[str, Set[str]] = {non_terminal: set() for non_terminal in productions}
+    follow[start].add(END_MARKER)
+    changed = True
+    while changed:
+        changed = False
+        for non_terminal, alternatives in productions.items():
+            for production in alternatives:
+                for index, symbol in enumerate(production):
+                    if symbol not in productions:
+                        continue
+                    rest = first_of_sequence(production[index + 1:], first)
+                    new_symbols = rest - {EPSILON}
+                    if EPSILON in rest:
+                        new_symbols |= follow[non_terminal]
+                    new_symbols -= follow[symbol]
+                    if new_symbols:
+                        follow[symbol] |= new_symbols
+                        changed = True
+    return follow
+
+
+def build_table(productions: Dict[str, List[Production]], first: Dict[str, Set[str]],
+                follow: Dict[str, Set[str]]) -> Tuple[ParseTable, List[Conflict]]:
+    """
+    Construye la tabla LL(1). Ante un conflicto se conserva la alternativa
+    que aparece primero en la gramática y el conflicto se reporta.
+    """
+    table: ParseTable = {}
+    conflicts: List[Conflict] = []
+    for non_terminal, alternatives in productions.items():
+        row: Dict[str, Production] = {}
+        for production in alternatives:
+            lookahead = first_of_sequence(production, first)
+            if EPSILON in lookahead:
+                lookahead = (lookahead - {EPSILON}) | follow[non_terminal]
+            for terminal in sorted(lookahead - {END_MARKER}):
+                if terminal in row:
+                    if row[terminal] != production:
+                        conflicts.append(Conflict(non_terminal, terminal, row[terminal], production))
+                    continue
+                row[terminal] = production
+        table[non_terminal] = row
+    return table, conflicts
+
+
+def grammar_hash(text: str, lexer: Optional[Lexer] = None) -> str:
+    """Clave del artefacto: gramática, patrones del lexer y versión del compilador"""
+    lexer = lexer or Lexer()
+    digest = hashlib.sha256()
+    digest.update(f"v{COMPILER_VERSION}\n".encode())
+    digest.update(repr(lexer.token_patterns).encode('utf-8'))
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compile_grammar(text: str, lexer: Optional[Lexer] = None) -> CompiledGrammar:
+    """Compila el texto EBNF a una tabla de análisis predictivo"""
+    lexer = lexer or Lexer()
+    all_productions = parse_grammar(text, lexer)
+
+    reachable = reachable_non_terminals(all_productions, START_SYMBOL)
+    productions = {non_terminal: all_productions[non_terminal] for non_terminal in reachable}
+    unreachable = [non_terminal for non_terminal in all_productions if non_terminal not in productions]
+
+    first = compute_first(productions)
+    follow = compute_follow(productions, first, START_SYMBOL)
+    table, conflicts = build_table(productions, first, follow)
+    terminals = {symbol for alternatives in productions.values() for production in alternatives
+                 for symbol in production if symbol not in productions and symbol != EPSILON}
+
+    return CompiledGrammar(grammar_hash(text, lexer), START_SYMBOL, productions, terminals,
+                           first, follow, table, encode_table(table, TOKEN_KINDS), conflicts, unreachable)
+
+
+def _artifact_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"Gramatica.{key[:16]}.table.pickle")
+
+
+def _load_artifact(key: str) -> Optional[CompiledGrammar]:
+    try:
+        with open(_artifact_path(key), 'rb') as artifact:
+            compiled = pickle.load(artifact)
+    except (OSError, pickle.PickleError, EOFError, AttributeError):
+        return None
+    if not isinstance(compiled, CompiledGrammar) or compiled.grammar_hash != key:
+        return None
+    return compiled
+
+
+def _store_artifact(compiled: CompiledGrammar):
+    path = _artifact_path(compiled.grammar_hash)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temporary, 'wb') as artifact:
+            pickle.dump(compiled, artifact, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except OSError:
+        # Sin permisos de escritura la tabla simplemente no se guarda
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+# Gramáticas ya cargadas en este proceso, por (ruta, mtime, tamaño)
+_loaded: Dict[Tuple[str, int, int], CompiledGrammar] = {}
+
+
+def load_grammar(path: str = GRAMMAR_PATH) -> CompiledGrammar:
+    """
+    Devuelve la gramática compilada. Usa, en orden: la copia en memoria del
+    proceso, el artefacto en disco con el mismo hash, o una compilación nueva
+    que se guarda para la próxima vez.
+    """
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    compiled = _loaded.get(memo_key)
+    if compiled is not None:
+        return compiled
+
+    with open(path, encoding='utf-8') as grammar_file:
+        text = grammar_file.read()
+
+    lexer = Lexer()
+    key = grammar_hash(text, lexer)
+    compiled = _load_artifact(key)
+    if compiled is None:
+        compiled = compile_grammar(text, lexer)
+        _store_artifact(compiled)
+
+    _loaded[memo_key] = compiled
+    return compiled
+
+
+def _format_set(symbols: Set[str]) -> str:
+    return '{' + ', '.join(sorted(symbols)) + '}'
+
+
+def main(argv: List[str]) -> int:
+    """Muestra FIRST, FOLLOW, la tabla y los conflictos de la gramática"""
+    path = argv[1] if len(argv) > 1 else GRAMMAR_PATH
+    with open(path, encoding='utf-8') as grammar_file:
+        compiled = compile_grammar(grammar_file.read())
+
+    for non_terminal, symbols in compiled.first.items():
+        print(f"FIRST(<{non_terminal}>) = {_format_set(symbols)}")
+    print()
+    for non_terminal, symbols in compiled.follow.items():
+        print(f"FOLLOW(<{non_terminal}>) = {_format_set(symbols)}")
+    print()
+    for non_terminal, row in compiled.table.items():
+        for terminal, production in row.items():
+            print(f"M[{non_terminal}, {terminal}] = {' '.join(production)}")
+
+    if compiled.unreachable:
+        print(f"\nNo terminales inalcanzables: {', '.join(compiled.unreachable)}")
+    for conflict in compiled.conflicts:
+        print(conflict)
+    return 1 if compiled.conflicts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
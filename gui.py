@@ -1,8 +1,170 @@
+import queue
+import threading
 import tkinter as tk
+from collections import deque
 from tkinter import ttk, scrolledtext
-from main import Lexer, Parser
+from cache import DEFAULT_CACHE_PATH, ValidationCache, result_variant
+from incremental import Analysis, IncrementalAnalyzer
+from main import TOKEN_KINDS
+
+# Etiqueta de Tk de cada tipo de token resaltado (los demás quedan sin color)
+HIGHLIGHT_TYPES = {
+    'keyword': ('START_PROG', 'END_PROG', 'DECVAR', 'ENDDEC', 'METHOD', 'IF', 'ELSE', 'WHILE', 'FOR',
+                'ARRAY', 'PRINT', 'READ', 'BREAK', 'CONTINUE', 'RETURN'),
+    'type': ('TYPE',),
+    'string': ('STRING',),
+    'number': ('NUMBER', 'BOOLEAN'),
+    'comment': ('COMMENT',),
+    'operator': ('OP_REL', 'OP_LOG', 'OP_ARIT', 'ASSIGN', 'END_STMT'),
+}
+KIND_TAGS = {TOKEN_KINDS[token_type]: tag for tag, types in HIGHLIGHT_TYPES.items() for token_type in types}
+
+# Estilo de cada etiqueta; 'error' subraya los errores de sintaxis y caracteres inválidos
+TAG_STYLES = {
+    'keyword': {'foreground': '#0000c0'},
+    'type': {'foreground': '#008080'},
+    'string': {'foreground': '#a31515'},
+    'number': {'foreground': '#098658'},
+    'comment': {'foreground': '#808080'},
+    'operator': {'foreground': '#795e26'},
+    'error': {'underline': True, 'background': '#ffe0e0'},
+}
+
+class AnalysisWorker:
+    """
+    Hilo que mantiene el analizador incremental fuera del ciclo de eventos
+    de Tk. La interfaz le pasa las ediciones y pide análisis; los resultados
+    vuelven por la cola results, que la interfaz lee con root.after porque
+    Tk sólo puede usarse desde el hilo principal.
+
+    Cada pedido tiene un número de generación: uno nuevo del mismo tipo
+    cancela los anteriores que aún no terminaron.
+
+    Los resultados de 'report' se guardan en la caché de validación (la
+    misma que usa batch.py). Cuando se reemplaza todo el texto (deshacer,
+    pegar sobre todo) y el código ya está en la caché, el resumen se publica
+    de inmediato, antes de terminar el análisis completo.
+
+    Un pedido 'highlight' devuelve los rangos a resaltar de las líneas de
+    viewport, con la cantidad de ediciones que ya se aplicaron: la
+    interfaz descarta los que llegan antes de que se aplique la última.
+    """
+    # Líneas del listado de tokens que se insertan juntas en el área de resultados
+    REPORT_CHUNK = 5000
+
+    def __init__(self):
+        self.results = queue.Queue()
+        self._edits = deque()
+        self._jobs = queue.Queue()
+        self._latest = {'status': 0, 'report': 0, 'highlight': 0}
+        self._applied = 0  # Ediciones aplicadas al analizador
+        self.viewport = (0, 0)  # Líneas (desde 0) que se resaltan con 'highlight'
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def replace(self, start, end, text):
+        self._edits.append((start, end, text))
+
+    def set_text(self, text):
+        self._edits.append((None, None, text))
+
+    def request(self, kind):
+        """Pide un análisis 'status' (resumen), 'report' (con tokens) o 'highlight'"""
+        generation = self._latest[kind] + 1
+        self._latest[kind] = generation
+        self._jobs.put((kind, generation))
+        return generation
+
+    def is_current(self, kind, generation):
+        return self._latest[kind] == generation
+
+    def _run(self):
+        analyzer = IncrementalAnalyzer()
+        # El análisis incremental no tiene límite de errores: sus resultados
+        # no son los de batch.py con el límite por defecto
+        cache = ValidationCache(path=DEFAULT_CACHE_PATH, variant=result_variant(max_errors=None))
+        while True:
+            kind, generation = self._jobs.get()
+            try:
+                self._apply_edits(analyzer, cache)
+                if not self.is_current(kind, generation):
+                    continue  # Cancelado por un pedido más nuevo
+                if kind == 'highlight':
+                    self.results.put((kind, generation, self._highlight(analyzer), self._applied))
+                    continue
+                analysis = analyzer.result()
+                chunks = []
+                if kind == 'report':
+                    cache.put(analyzer.text, self._cache_entry(analysis, analyzer.token_count))
+                    chunks = self._format_tokens(analyzer, generation)
+                if chunks is not None:
+                    self.results.put((kind, generation, analysis, chunks))
+            except Exception as e:
+                self.results.put(('error', generation, e, None))
+
+    def _apply_edits(self, analyzer, cache):
+        while self._edits:
+            start, end, text = self._edits.popleft()
+            self._applied += 1
+            if start is None:
+                cached = cache.get(text)
+                if cached is not None:
+                    analysis = Analysis(None, cached['errors'], cached['error'])
+                    self.results.put(('status', self._latest['status'], analysis, []))
+                analyzer.set_text(text)
+            else:
+                analyzer.replace(start, end, text)
+
+    def _highlight(self, analyzer):
+        """Índices de Tk de los rangos de cada etiqueta en las líneas de viewport"""
+        tokens, errors = analyzer.spans(*self.viewport)
+        lines = analyzer.lines
+        ranges = {tag: [] for tag in TAG_STYLES}
+        for line, column, length, kind in tokens:
+            tag = KIND_TAGS.get(kind)
+            if tag is not None:
+                ranges[tag].extend(self._range(lines, line, column, length))
+        for line, column, length in errors:
+            ranges['error'].extend(self._range(lines, line, column, length))
+        return ranges
+
+    @staticmethod
+    def _range(lines, line, column, length):
+        start = f"{line + 1}.{column}"
+        if column + length <= len(lines[line]):
+            return start, f"{line + 1}.{column + length}"
+        # Una cadena que sigue en las líneas siguientes
+        return start, f"{start} + {length} chars"
+
+    @staticmethod
+    def _cache_entry(analysis, token_count):
+        """Resultado en el formato de batch.validate_source"""
+        if analysis.lexer_error:
+            return {'valid': False, 'tokens': 0, 'errors': [], 'error': analysis.lexer_error}
+        return {'valid': analysis.valid, 'tokens': token_count,
+                'errors': analysis.errors, 'error': analysis.fatal}
+
+    def _format_tokens(self, analyzer, generation):
+        """Listado de tokens en bloques de texto; None si se canceló"""
+        chunks = []
+        lines = []
+        for token in analyzer.tokens():
+            lines.append(str(token))
+            if len(lines) == self.REPORT_CHUNK:
+                if not self.is_current('report', generation):
+                    return None
+                chunks.append("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            chunks.append("\n".join(lines) + "\n")
+        return chunks
 
 class GLLGUI:
+    # Espera desde la última tecla antes de analizar, y período de lectura de resultados (ms)
+    DEBOUNCE_MS = 150
+    POLL_MS = 30
+    # Líneas que se resaltan arriba y abajo de las visibles
+    HIGHLIGHT_MARGIN = 100
+
     def __init__(self, root):
         self.root = root
         self.root.title("GLL Grammar Tester")
@@ -19,6 +181,9 @@ class GLLGUI:
         # Área de texto para el código
         self.code_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=70, height=20)
         self.code_text.grid(row=0, column=0, columnspan=2, pady=5)
+        for tag, style in TAG_STYLES.items():
+            self.code_text.tag_configure(tag, **style)
+        self.code_text.tag_raise('error')
         
         # Frame para los botones de tokens
         tokens_frame = ttk.LabelFrame(main_frame, text="Tokens Comunes", padding="5")
@@ -35,6 +200,25 @@ class GLLGUI:
         self.result_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=70, height=10)
         self.result_text.grid(row=3, column=0, columnspan=2, pady=5)
         
+        # Estado del análisis, actualizado con cada edición
+        self.status_label = ttk.Label(main_frame, text="")
+        self.status_label.grid(row=4, column=0, columnspan=2, sticky=tk.W)
+        
+        # Analizador incremental en un hilo aparte, sincronizado con el texto
+        self.worker = AnalysisWorker()
+        self._status_job = None  # Análisis pendiente (debounce)
+        self._render_job = None  # Inserción pendiente del listado de tokens
+        # Resaltado sólo de las líneas visibles (más un margen): se vuelve a
+        # pedir al desplazarse fuera de las ya resaltadas y con cada edición
+        self._edit_count = 0  # Ediciones enviadas al hilo de análisis
+        self._highlighted = None  # (primera línea, última línea, ediciones) del último pedido
+        self._highlight_job = None
+        self._set_scrollbar = self.code_text.vbar.set
+        self.code_text.configure(yscrollcommand=self._on_scroll)
+        self._install_edit_hook()
+        self._schedule_status()
+        self.root.after(self.POLL_MS, self._poll_results)
+        
         # Configurar el grid
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
@@ -117,36 +301,171 @@ class GLLGUI:
     def insert_token(self, token):
         self.code_text.insert(tk.INSERT, token + " ")
 
+    def _install_edit_hook(self):
+        """
+        Reemplaza el comando Tcl del área de código por uno que, además de
+        ejecutar insert/delete/replace, informa la edición al analizador
+        incremental. Así también se ven las ediciones hechas con el teclado.
+        """
+        widget = str(self.code_text)
+        self._original_command = widget + "_original"
+        self.root.tk.call("rename", widget, self._original_command)
+        self.root.tk.createcommand(widget, self._on_text_command)
+
+    def _on_text_command(self, command, *args):
+        call = self.root.tk.call
+        original = self._original_command
+        edit = None
+        if command == "insert":
+            start = call(original, "index", args[0])
+            edit = (start, start, "".join(args[1::2]))
+        elif command == "delete" and len(args) > 2:
+            edit = ()  # Varios rangos: se vuelve a leer todo el texto
+        elif command in ("delete", "replace"):
+            start = call(original, "index", args[0])
+            end = call(original, "index", args[1] if len(args) > 1 else f"{args[0]} +1c")
+            edit = (start, end, "".join(args[2::2]))
+
+        result = call(original, command, *args)
+
+        if edit == ():
+            self.worker.set_text(call(original, "get", "1.0", "end-1c"))
+            self._text_changed()
+        elif edit is not None:
+            start, end, text = edit
+            self.worker.replace(self._position(start), self._position(end), text)
+            self._text_changed()
+        elif command == "edit" and args and args[0] in ("undo", "redo"):
+            # Deshacer modifica el texto sin pasar por insert/delete
+            self.worker.set_text(call(original, "get", "1.0", "end-1c"))
+            self._text_changed()
+        return result
+
+    def _text_changed(self):
+        self._edit_count += 1
+        self._schedule_status()
+        self._schedule_highlight()
+
+    @staticmethod
+    def _position(index):
+        """Convierte un índice 'línea.columna' de Tk en (línea, columna) desde 0"""
+        line, column = str(index).split(".")
+        return int(line) - 1, int(column)
+
+    def _schedule_status(self):
+        """Pide el análisis cuando el usuario deja de escribir por DEBOUNCE_MS"""
+        if self._status_job is not None:
+            self.root.after_cancel(self._status_job)
+        self._status_job = self.root.after(self.DEBOUNCE_MS, self._request_status)
+
+    def _request_status(self):
+        self._status_job = None
+        self.worker.request('status')
+
+    def _on_scroll(self, first, last):
+        self._set_scrollbar(first, last)
+        self._schedule_highlight()
+
+    def _schedule_highlight(self):
+        """Pide el resaltado una vez que Tk terminó de procesar los eventos pendientes"""
+        if self._highlight_job is None:
+            self._highlight_job = self.root.after_idle(self._request_highlight)
+
+    def _request_highlight(self):
+        self._highlight_job = None
+        first = int(self.code_text.index("@0,0").split(".")[0]) - 1
+        last = int(self.code_text.index(f"@0,{self.code_text.winfo_height()}").split(".")[0]) - 1
+        if self._highlighted is not None:
+            start, end, edits = self._highlighted
+            if edits == self._edit_count and start <= first and last <= end:
+                return  # Las líneas visibles ya están resaltadas
+        start, end = max(0, first - self.HIGHLIGHT_MARGIN), last + self.HIGHLIGHT_MARGIN
+        self._highlighted = (start, end, self._edit_count)
+        self.worker.viewport = (start, end)
+        self.worker.request('highlight')
+
+    def apply_highlight(self, ranges):
+        """Reemplaza las etiquetas de resaltado por las de las líneas pedidas"""
+        for tag, indices in ranges.items():
+            self.code_text.tag_remove(tag, "1.0", tk.END)
+            if indices:
+                self.code_text.tag_add(tag, *indices)
+
+    def _poll_results(self):
+        """Muestra los resultados que terminó el hilo de análisis"""
+        try:
+            while True:
+                kind, generation, analysis, chunks = self.worker.results.get_nowait()
+                if kind == 'error':
+                    self.status_label.config(text=f"Error: {str(analysis)}")
+                elif not self.worker.is_current(kind, generation):
+                    continue
+                elif kind == 'highlight':
+                    # chunks es la cantidad de ediciones que tenía aplicadas
+                    if chunks == self._edit_count:
+                        self.apply_highlight(analysis)
+                elif kind == 'status':
+                    self.update_status(analysis)
+                else:
+                    self.update_status(analysis)
+                    self.show_report(analysis, chunks)
+        except queue.Empty:
+            pass
+        self.root.after(self.POLL_MS, self._poll_results)
+
+    def update_status(self, analysis):
+        if analysis.lexer_error:
+            status = analysis.lexer_error
+        elif analysis.fatal:
+            status = analysis.fatal
+        elif analysis.errors:
+            status = f"{len(analysis.errors)} error(es). {analysis.errors[0]}"
+        else:
+            status = "Sin errores de sintaxis"
+        self.status_label.config(text=status)
+
     def analyze_code(self):
         # Limpiar resultados anteriores
+        self._cancel_render()
         self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, "Analizando...\n")
         
-        # Obtener el código
-        code = self.code_text.get(1.0, tk.END).strip()
+        # El hilo de análisis responde con el resultado y el listado de tokens
+        self.worker.request('report')
+
+    def show_report(self, analysis, chunks):
+        self._cancel_render()
+        self.result_text.delete(1.0, tk.END)
         
-        try:
-            # Crear lexer y parser
-            lexer = Lexer()
-            parser = Parser()
-            
-            # Tokenizar
-            tokens = lexer.tokenize(code)
-            
-            # Analizar
-            success = parser.parse(tokens)
+        if analysis.lexer_error:
+            self.result_text.insert(tk.END, f"Error: {analysis.lexer_error}\n")
+            return
+        
+        lines = []
+        if analysis.valid:
+            lines.append("¡Análisis exitoso! El código es sintácticamente correcto.")
+        else:
+            lines.append("Error de sintaxis. Revise el código.")
+            lines.extend(analysis.errors)
+            if analysis.fatal:
+                lines.append(analysis.fatal)
             
-            if success:
-                self.result_text.insert(tk.END, "¡Análisis exitoso! El código es sintácticamente correcto.\n")
-            else:
-                self.result_text.insert(tk.END, "Error de sintaxis. Revise el código.\n")
-                
-            # Mostrar tokens generados
-            self.result_text.insert(tk.END, "\nTokens generados:\n")
-            for token in tokens:
-                self.result_text.insert(tk.END, str(token) + "\n")
-                
-        except Exception as e:
-            self.result_text.insert(tk.END, f"Error: {str(e)}\n")
+        # Mostrar tokens generados: un insert por bloque, cediendo el
+        # control a Tk entre bloques para que la ventana siga respondiendo
+        lines.append("\nTokens generados:\n")
+        self.result_text.insert(tk.END, "\n".join(lines))
+        self._render_chunks(chunks, 0)
+
+    def _render_chunks(self, chunks, index):
+        self._render_job = None
+        if index < len(chunks):
+            self.result_text.insert(tk.END, chunks[index])
+            self._render_job = self.root.after(1, self._render_chunks, chunks, index + 1)
+
+    def _cancel_render(self):
+        if self._render_job is not None:
+            self.root.after_cancel(self._render_job)
+            self._render_job = None
 
 def main():
     root = tk.Tk()
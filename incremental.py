@@ -0,0 +1,522 @@
+"""
+Análisis incremental del código que se edita en la interfaz.
+
+IncrementalAnalyzer mantiene el código como una lista de líneas junto con
+los tokens de cada línea y el estado del parser (la pila de símbolos) en los
+límites de sentencias y bloques. Después de una edición:
+
+- Sólo se vuelven a tokenizar las líneas editadas. Ningún token salvo una
+  cadena cruza un salto de línea, así que basta con extender la región
+  mientras una cadena quede abierta en su borde.
+- El parser se reanuda desde el último punto de control anterior al primer
+  token cambiado y se detiene en cuanto llega, después del último token
+  cambiado, a un punto de control con la misma pila que en el análisis
+  anterior: a partir de ahí el resultado anterior sigue siendo válido.
+
+Uso:
+    analyzer = IncrementalAnalyzer(codigo)
+    analyzer.replace((linea, columna), (linea, columna), texto)
+    resultado = analyzer.result()
+
+Las posiciones son (línea, columna) contadas desde 0; la edición reemplaza
+el texto entre ambas posiciones, como el comando replace de tkinter.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, repeat
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from main import (END_OF_INPUT, TOKEN_KINDS, TOKEN_TYPES, Diagnostic, InvalidCharacterError, Lexer,
+                  LineIndex, Parser, SyntaxError, Token)
+
+# No terminales en los que se guarda el estado del parser: CODE se expande
+# antes de cada sentencia y al final de cada bloque
+CHECKPOINT_SYMBOLS = ('CODE', 'Block')
+
+STRING_KIND = TOKEN_KINDS['STRING']
+
+Position = Tuple[int, int]
+# Marco de la pila del parser: (símbolo, marco de abajo o None)
+Frame = Tuple[int, Optional[tuple]]
+# Estado en un punto de control: marco de arriba, profundidad y si se recupera
+State = Tuple[Optional[Frame], int, bool]
+
+
+class _ShiftedArray:
+    """
+    Secuencia creciente de enteros (posiciones de tokens) en la que las
+    inserciones desplazan todos los valores siguientes. Como en un búfer
+    con hueco, el desplazamiento de la cola queda pendiente desde la última
+    edición (gap) y sólo se aplica al mover el hueco, así que ediciones
+    cercanas entre sí no recorren todo el arreglo.
+    """
+    def __init__(self, values: Iterable[int] = ()):
+        self.values = array('i', values)
+        self.gap = len(self.values)  # Desde aquí los valores guardados llevan shift pendiente
+        self.shift = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, position: int) -> int:
+        if position < 0:
+            position += len(self.values)
+        return self.values[position] + (self.shift if position >= self.gap else 0)
+
+    def bisect_left(self, value: int) -> int:
+        gap = self.gap
+        if gap and self.values[gap - 1] >= value:
+            return bisect_left(self.values, value, 0, gap)
+        return bisect_left(self.values, value - self.shift, gap)
+
+    def bisect_right(self, value: int) -> int:
+        gap = self.gap
+        if gap and self.values[gap - 1] > value:
+            return bisect_right(self.values, value, 0, gap)
+        return bisect_right(self.values, value - self.shift, gap)
+
+    def replace(self, start: int, end: int, values: Iterable[int], shift: int):
+        """Reemplaza las posiciones [start, end) y suma shift a todos los valores siguientes"""
+        self._move_gap(end)
+        tail = len(self.values) - end
+        self.values[start:end] = array('i', values)
+        self.gap = len(self.values) - tail
+        self.shift += shift
+        if not tail:
+            self.shift = 0
+
+    def _move_gap(self, position: int):
+        """Aplica el desplazamiento pendiente entre el hueco y position"""
+        gap, shift = self.gap, self.shift
+        if shift and position > gap:
+            self.values[gap:position] = array('i', map(shift.__add__, self.values[gap:position]))
+        elif shift and position < gap:
+            self.values[position:gap] = array('i', map((-shift).__add__, self.values[position:gap]))
+        self.gap = position
+
+
+class Analysis:
+    """Resultado del análisis con los mensajes ya formateados"""
+    def __init__(self, lexer_error: Optional[str], errors: List[str], fatal: Optional[str]):
+        self.lexer_error = lexer_error  # Primer carácter inválido del código
+        self.errors = errors  # Errores de sintaxis, con línea y columna
+        self.fatal = fatal  # Error que detuvo el parser (p. ej. fin de entrada)
+
+    @property
+    def valid(self) -> bool:
+        return self.lexer_error is None and not self.errors and self.fatal is None
+
+
+class _LexedLines:
+    """Tokens de un grupo de líneas, separados por línea"""
+    def __init__(self, count: int):
+        self.kinds = [b''] * count  # Tipos enteros de los tokens que empiezan en la línea
+        self.columns: List[Tuple[int, ...]] = [()] * count
+        self.lengths: List[Tuple[int, ...]] = [()] * count
+        self.continued = [False] * count  # La línea empieza dentro de una cadena
+        self.errors: List[Optional[Tuple[int, str]]] = [None] * count  # Primer carácter inválido
+        self.open_quote: Optional[int] = None  # Línea de una comilla sin cerrar al final del código
+
+
+class IncrementalAnalyzer:
+    def __init__(self, text: str = '', lexer: Optional[Lexer] = None, parser: Optional[Parser] = None):
+        self.lexer = lexer or Lexer()
+        self.parser = parser or Parser()
+
+        encoded = self.parser.encoded_table
+        self._start_symbol = encoded.symbol_ids['Programa']
+        self._checkpoint_symbols = frozenset(encoded.symbol_ids[name] for name in CHECKPOINT_SYMBOLS)
+
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        """Reemplaza todo el código y lo analiza completo"""
+        self.lines = text.split('\n')
+        lexed = self._lex_lines(self.lines, at_end=True)
+        self._line_kinds = lexed.kinds
+        self._line_columns = lexed.columns
+        self._line_lengths = lexed.lengths
+        self._continued = lexed.continued
+        self._line_errors = lexed.errors
+        self._error_lines = len(self._line_errors) - self._line_errors.count(None)
+        self._open_quote = lexed.open_quote
+        self._kinds = array('B', b''.join(lexed.kinds))
+        # Posición del primer token de cada línea (más el total al final)
+        self._line_starts = _ShiftedArray(accumulate(map(len, lexed.kinds), initial=0))
+
+        # Puntos de control: posición del token, estado del parser (la pila,
+        # su profundidad y si se está recuperando de un error) y errores
+        # registrados antes. La pila es una cadena de marcos (símbolo, marco
+        # de abajo) que comparten los puntos de control: cada uno sólo crea
+        # los marcos apilados desde el anterior, no una copia de la pila.
+        self._checkpoint_index = _ShiftedArray()
+        self._checkpoint_stacks: List[State] = []
+        self._checkpoint_errors = _ShiftedArray()
+        # Errores de sintaxis: posición del token y error, sin el token
+        self._error_index = _ShiftedArray()
+        self._diagnostics: List[Diagnostic] = []
+        self._fatal: Optional[str] = None
+        self._parse_from(-1, 0, 0)
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    @property
+    def token_count(self) -> int:
+        return len(self._kinds)
+
+    def replace(self, start: Position, end: Position, text: str):
+        """Reemplaza el texto entre start y end y actualiza el análisis"""
+        first_line, first_column = self._clamp(start)
+        last_line, last_column = self._clamp(end)
+        if (last_line, last_column) < (first_line, first_column):
+            last_line, last_column = first_line, first_column
+
+        lines = self.lines
+        edited = (lines[first_line][:first_column] + text + lines[last_line][last_column:]).split('\n')
+
+        # La región empieza en una línea que no está dentro de una cadena. Una
+        # comilla sin cerrar depende de todo el texto que la sigue (una comilla
+        # nueva la cerraría), así que la región también la incluye.
+        region_start = first_line
+        if self._open_quote is not None and self._open_quote < region_start:
+            region_start = self._open_quote
+        while self._continued[region_start]:
+            region_start -= 1
+
+        # y termina antes de una línea (sin editar) que tampoco lo está
+        region_end = last_line + 1
+        extra = 1
+        while True:
+            while region_end < len(lines) and self._continued[region_end]:
+                region_end += 1
+            region = lines[region_start:first_line] + edited + lines[last_line + 1:region_end]
+            lexed = self._lex_lines(region, at_end=region_end == len(lines))
+            if lexed is not None:
+                break
+            # Quedó una cadena abierta: incluir más líneas
+            region_end = min(len(lines), region_end + extra)
+            extra *= 2
+
+        token_start = self._line_starts[region_start]
+        token_end = self._line_starts[region_end]
+        old_kinds = self._kinds[token_start:token_end].tobytes()
+        new_kinds = b''.join(lexed.kinds)
+        delta = len(new_kinds) - len(old_kinds)
+
+        self._error_lines -= region_end - region_start - self._line_errors[region_start:region_end].count(None)
+        self._error_lines += len(lexed.errors) - lexed.errors.count(None)
+        if lexed.open_quote is not None:
+            self._open_quote = region_start + lexed.open_quote
+        elif self._open_quote is not None and self._open_quote >= region_start:
+            if self._open_quote >= region_end:
+                self._open_quote += len(region) - (region_end - region_start)
+            else:
+                self._open_quote = None
+        lines[region_start:region_end] = region
+        self._line_kinds[region_start:region_end] = lexed.kinds
+        self._line_columns[region_start:region_end] = lexed.columns
+        self._line_lengths[region_start:region_end] = lexed.lengths
+        self._continued[region_start:region_end] = lexed.continued
+        self._line_errors[region_start:region_end] = lexed.errors
+        self._kinds[token_start:token_end] = array('B', new_kinds)
+        line_starts = accumulate(map(len, lexed.kinds[:-1]), initial=token_start)
+        next(line_starts)  # El inicio de la primera línea no cambia
+        self._line_starts.replace(region_start + 1, region_end, line_starts, delta)
+
+        # El parser sólo ve los tipos: acotar el cambio a los tipos distintos
+        prefix = _common_prefix(old_kinds, new_kinds)
+        if prefix == len(old_kinds) == len(new_kinds):
+            return
+        suffix = _common_prefix(old_kinds[prefix:][::-1], new_kinds[prefix:][::-1])
+        self._parse_from(token_start + prefix, token_start + len(new_kinds) - suffix, delta)
+
+    def result(self) -> Analysis:
+        """Resultado del último análisis"""
+        lexer_error = None
+        if self._error_lines:
+            for line, error in enumerate(self._line_errors):
+                if error is not None:
+                    lexer_error = str(InvalidCharacterError(error[1], line + 1, error[0] + 1))
+                    break
+
+        errors = []
+        for position, diagnostic in enumerate(self._diagnostics):
+            index = self._error_index[position]
+            line = self._line_starts.bisect_right(index) - 1
+            column = self._line_columns[line][index - self._line_starts[line]]
+            errors.append(f"Error en línea {line + 1}, columna {column + 1}: {diagnostic.message}")
+
+        fatal = str(SyntaxError(self._fatal, -1)) if self._fatal is not None else None
+        return Analysis(lexer_error, errors, fatal)
+
+    def tokens(self) -> Iterator[Token]:
+        """Tokens del código actual, con su línea"""
+        for line, kinds in enumerate(self._line_kinds):
+            for kind, column, length in zip(kinds, self._line_columns[line], self._line_lengths[line]):
+                end_line = line
+                value = self.lines[line][column:column + length]
+                # Una cadena puede seguir en las líneas siguientes
+                while len(value) < length:
+                    end_line += 1
+                    value += '\n' + self.lines[end_line][:length - len(value) - 1]
+                yield Token(TOKEN_TYPES[kind], value, line + 1)
+
+    def spans(self, first_line: int, last_line: int) -> Tuple[List[Tuple[int, int, int, int]],
+                                                              List[Tuple[int, int, int]]]:
+        """
+        Tokens y errores de las líneas first_line a last_line (desde 0),
+        para resaltar sólo la parte visible del código: (línea, columna,
+        longitud, tipo) de cada token que empieza en ellas o en una cadena
+        que llega hasta ellas, y (línea, columna, longitud) de cada error
+        de sintaxis y carácter inválido. El costo depende de las líneas
+        pedidas y no del largo del código.
+        """
+        last_line = min(last_line, len(self.lines) - 1)
+        first_line = max(0, min(first_line, last_line))
+        while first_line > 0 and self._continued[first_line]:
+            first_line -= 1
+
+        tokens: List[Tuple[int, int, int, int]] = []
+        errors: List[Tuple[int, int, int]] = []
+        for line in range(first_line, last_line + 1):
+            tokens.extend(zip(repeat(line), self._line_columns[line], self._line_lengths[line],
+                              self._line_kinds[line]))
+            if self._line_errors[line] is not None:
+                errors.append((line, self._line_errors[line][0], 1))
+
+        line_starts = self._line_starts
+        error_index = self._error_index
+        start = error_index.bisect_left(line_starts[first_line])
+        end = error_index.bisect_left(line_starts[last_line + 1])
+        for position in range(start, end):
+            index = error_index[position]
+            line = line_starts.bisect_right(index) - 1
+            offset = index - line_starts[line]
+            errors.append((line, self._line_columns[line][offset], self._line_lengths[line][offset]))
+        return tokens, errors
+
+    def _clamp(self, position: Position) -> Position:
+        line, column = position
+        if line >= len(self.lines):
+            line = len(self.lines) - 1
+            column = len(self.lines[line])
+        return line, min(column, len(self.lines[line]))
+
+    def _lex_lines(self, lines: List[str], at_end: bool) -> Optional[_LexedLines]:
+        """
+        Tokeniza un grupo de líneas que no empieza dentro de una cadena.
+        Devuelve None si una cadena queda abierta al final y hay más líneas
+        después (at_end es False). Los caracteres inválidos se registran
+        por línea y el escaneo sigue después de ellos.
+        """
+        code = '\n'.join(lines)
+        index = LineIndex(code)
+        tokens: List[Token] = []
+        lexed = _LexedLines(len(lines))
+
+        position = 0
+        while True:
+            try:
+                self.lexer._scan(code[position:], position, index, tokens)
+                break
+            except InvalidCharacterError as error:
+                if error.character == '"' and not at_end:
+                    return None
+                line = error.line - 1
+                if error.character == '"':
+                    lexed.open_quote = line
+                if lexed.errors[line] is None:
+                    lexed.errors[line] = (error.column - 1, error.character)
+                position = error.offset + 1
+
+        kinds = [bytearray() for _ in lines]
+        columns: List[List[int]] = [[] for _ in lines]
+        lengths: List[List[int]] = [[] for _ in lines]
+        for token in tokens:
+            line, column = index.position(token.start)
+            kinds[line - 1].append(token.kind)
+            columns[line - 1].append(column - 1)
+            lengths[line - 1].append(len(token.value))
+            if token.kind == STRING_KIND:
+                for continued in range(line, line + token.value.count('\n')):
+                    lexed.continued[continued] = True
+
+        lexed.kinds = [bytes(line_kinds) for line_kinds in kinds]
+        lexed.columns = [tuple(line_columns) for line_columns in columns]
+        lexed.lengths = [tuple(line_lengths) for line_lengths in lengths]
+        return lexed
+
+    def _parse_from(self, change_start: int, change_end: int, delta: int):
+        """
+        Vuelve a analizar a partir del último punto de control anterior a
+        change_start. Los tokens desde change_end (numeración nueva) son los
+        mismos que desde change_end - delta en el análisis anterior.
+
+        Un punto de control en la posición i depende de los tokens hasta i
+        inclusive (el parser pudo decidir con el token i antes de llegar al
+        no terminal), por eso se reanuda desde uno estrictamente anterior al
+        cambio y sólo se converge en uno que no esté antes de change_end.
+        """
+        old_index = self._checkpoint_index
+        old_stacks = self._checkpoint_stacks
+
+        resume = old_index.bisect_left(change_start) - 1
+        if resume >= 0:
+            frame, depth, recovering = old_stacks[resume]
+            stack = _stack_list(frame)
+            current = old_index[resume]
+            error_start = self._checkpoint_errors[resume]
+        else:
+            resume = 0
+            frame, depth = None, 0
+            stack = [self._start_symbol]
+            recovering = False
+            current = 0
+            error_start = 0
+        # Profundidad mínima de la pila desde el último punto de control:
+        # los marcos de abajo de ella se comparten con el anterior
+        low = depth
+
+        # Puntos de control y errores nuevos, desde resume y error_start
+        checkpoint_index = array('i')
+        checkpoint_stacks: List[State] = []
+        checkpoint_errors = array('i')
+        error_index = array('i')
+        diagnostics: List[Diagnostic] = []
+
+        parser = self.parser
+        encoded = parser.encoded_table
+        terminal_count = encoded.terminal_count
+        table = encoded.table
+        productions = encoded.productions
+        names = encoded.symbol_names
+        expected_types = parser.expected_types
+        sync_kinds = parser.sync_kinds
+        defaults = parser.default_productions
+        checkpoint_symbols = self._checkpoint_symbols
+        kinds = self._kinds
+        end_of_input = END_OF_INPUT
+        token_count = len(kinds)
+        kind = kinds[current] if current < token_count else end_of_input
+        fatal = None
+        resume_end = len(old_index)  # Puntos de control anteriores que se reemplazan
+        error_end = len(self._diagnostics)
+
+        while stack:
+            symbol = stack[-1]
+            if symbol in checkpoint_symbols:
+                while depth > low:
+                    frame = frame[1]
+                    depth -= 1
+                for pushed in stack[low:]:
+                    frame = (pushed, frame)
+                depth = low = len(stack)
+                state = (frame, depth, recovering)
+                if current >= change_end and self._converges(current - delta, state):
+                    # Desde aquí el análisis anterior sigue siendo válido
+                    resume_end = self._match
+                    error_end = self._checkpoint_errors[resume_end]
+                    fatal = self._fatal
+                    break
+                checkpoint_index.append(current)
+                checkpoint_stacks.append(state)
+                checkpoint_errors.append(error_start + len(diagnostics))
+            stack.pop()
+            if len(stack) < low:
+                low = len(stack)
+
+            if kind == end_of_input:
+                if symbol < terminal_count:
+                    fatal = f"Unexpected end of input, expected {names[symbol]}"
+                else:
+                    fatal = f"Unexpected end of input while processing {names[symbol]}"
+                break
+
+            if symbol < terminal_count:  # Terminal
+                if symbol != kind:
+                    # Igual que Parser._recover_terminal y Parser._synchronize
+                    if not recovering:
+                        error_index.append(current)
+                        diagnostics.append(Diagnostic(Diagnostic.MISMATCH, names[symbol], expected_types[symbol],
+                                                      TOKEN_TYPES[kind], current))
+                        recovering = True
+                    if kind != end_of_input and not parser._accepts(stack[-1] if stack else None, kind):
+                        current += 1
+                        kind = kinds[current] if current < token_count else end_of_input
+                    if symbol != kind:
+                        continue
+                current += 1
+                kind = kinds[current] if current < token_count else end_of_input
+                recovering = False
+                continue
+
+            production = table[symbol * terminal_count + kind]
+            if production >= 0:
+                stack.extend(productions[production])
+                continue
+
+            if defaults[symbol] >= 0 and parser._use_default(symbol, stack[-1] if stack else None, kind):
+                continue
+            if not recovering:
+                error_index.append(current)
+                diagnostics.append(Diagnostic(Diagnostic.UNEXPECTED_TOKEN, names[symbol], expected_types[symbol],
+                                              TOKEN_TYPES[kind], current))
+                recovering = True
+            symbol_sync = sync_kinds[symbol]
+            while kind != end_of_input and kind not in symbol_sync:
+                current += 1
+                kind = kinds[current] if current < token_count else end_of_input
+            if kind == end_of_input:
+                fatal = "Could not synchronize after error"
+                break
+            stack.extend(parser._resume(symbol, kind))
+
+        error_delta = error_start + len(diagnostics) - error_end
+        old_index.replace(resume, resume_end, checkpoint_index, delta)
+        old_stacks[resume:resume_end] = checkpoint_stacks
+        self._checkpoint_errors.replace(resume, resume_end, checkpoint_errors, error_delta)
+        self._error_index.replace(error_start, error_end, error_index, delta)
+        self._diagnostics[error_start:error_end] = diagnostics
+        self._fatal = fatal
+
+    def _converges(self, old_current: int, state: State) -> bool:
+        """
+        Busca un punto de control del análisis anterior en la posición
+        old_current con la misma pila; si existe lo deja en self._match.
+        Las pilas se comparan desde arriba hasta el primer marco compartido.
+        """
+        frame, depth, recovering = state
+        old_index = self._checkpoint_index
+        match = old_index.bisect_left(old_current)
+        while match < len(old_index) and old_index[match] == old_current:
+            old_frame, old_depth, old_recovering = self._checkpoint_stacks[match]
+            if old_depth == depth and old_recovering == recovering:
+                new_frame = frame
+                while old_frame is not new_frame and old_frame[0] == new_frame[0]:
+                    old_frame, new_frame = old_frame[1], new_frame[1]
+                if old_frame is new_frame:
+                    self._match = match
+                    return True
+            match += 1
+        return False
+
+
+def _stack_list(frame: Optional[Frame]) -> List[int]:
+    """Pila del parser (el tope al final) a partir de su marco de arriba"""
+    stack = []
+    while frame is not None:
+        stack.append(frame[0])
+        frame = frame[1]
+    stack.reverse()
+    return stack
+
+
+def _common_prefix(first: bytes, second: bytes) -> int:
+    """Longitud del prefijo común de dos secuencias de tipos"""
+    length = min(len(first), len(second))
+    for position in range(length):
+        if first[position] != second[position]:
+            return position
+    return length
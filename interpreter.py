@@ -0,0 +1,202 @@
+"""
+Intérprete de referencia: ejecuta un programa recorriendo su árbol de
+análisis.
+
+Es la forma directa de ejecutar un programa, y la que compiler.py evita:
+cada sentencia se despacha por el nombre de su nodo cada vez que se
+ejecuta, las variables se buscan por nombre en una cadena de ámbitos
+(diccionarios), las expresiones se evalúan nodo por nodo sobre su árbol
+con precedencia y BREAKinter, CONTINUEinter y Returninter son
+excepciones. Sirve para comparar resultados y tiempos con el compilador
+(ver runbench.py); la semántica es la misma (ver runtime.py).
+"""
+from typing import Dict, List, Optional, Sequence
+
+from expressions import ExpressionTree, parse_expression
+from runtime import (DEFAULT_VALUES, ProgramError, ProgramIO, divide, format_value, index_error,
+                     new_array, read_value)
+
+
+class _Break(Exception):
+    pass
+
+
+class _Continue(Exception):
+    pass
+
+
+class _Variable:
+    __slots__ = ('type', 'value')
+
+    def __init__(self, type: str, value):
+        self.type = type  # Tipo de la variable o de los elementos del array
+        self.value = value
+
+
+class Interpreter:
+    def __init__(self, tree, tokens: Sequence, io=None):
+        self.tree = tree
+        self.tokens = list(tokens)  # Tokens como objetos (un TokenBuffer los crea al pedirlos)
+        self.io = io if io is not None else ProgramIO()
+        self.scopes: List[Dict[str, _Variable]] = []
+        self.expression_trees: Dict[int, ExpressionTree] = {}
+
+    def run(self):
+        tree = self.tree
+        self.scopes = [{}]
+        try:
+            for child in tree.children(0):
+                if tree.name(child) == 'CODE':
+                    self._code(child)
+        except ZeroDivisionError:
+            raise ProgramError("Division by zero") from None
+        except OverflowError as e:
+            raise ProgramError(f"Value out of range: {e}") from None
+        finally:
+            self.io.flush()
+
+    def _variable(self, name: str) -> _Variable:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise ProgramError(f"Undeclared identifier {name}")
+
+    def _block(self, block: int):
+        # Block → { CODE }
+        self.scopes.append({})
+        try:
+            if self.tree.subtree_ends[block] > block + 1:
+                self._code(block + 1)
+        finally:
+            self.scopes.pop()
+
+    def _code(self, code: int):
+        for statement in self.tree.children(code):
+            self._statement(statement + 1)
+
+    def _statement(self, index: int):
+        tree = self.tree
+        tokens = self.tokens
+        name = tree.name(index)
+        first = tree.first_tokens[index]
+
+        if name == 'VarDec':
+            position, end = first + 1, tree.token_ends[index]
+            while position + 2 < end:
+                type = tokens[position + 2].value
+                self.scopes[-1][tokens[position].value] = _Variable(type, DEFAULT_VALUES[type])
+                position += 4
+        elif name == 'Array_Dec':
+            size = tokens[first + 3]
+            length = self._variable(size.value).value if size.type == 'ID' else int(size.value)
+            type = tokens[first + 6].value
+            self.scopes[-1][tokens[first + 1].value] = _Variable(
+                type, new_array(type, length, tokens[first + 1].value, tokens[first + 1].location()))
+        elif name == 'ExpressionStatement':
+            target = tokens[first]
+            variable = self._variable(target.value)
+            expressions = [child for child in tree.children(index + 1) if tree.name(child) == 'Expresion']
+            value = self._evaluate(expressions[-1])
+            if len(expressions) == 1:
+                variable.value = float(value) if variable.type == 'FLOATer' else value
+            else:
+                offset = self._evaluate(expressions[0])
+                if not 0 <= offset < len(variable.value):
+                    index_error(offset, target.value, len(variable.value), target.location())
+                variable.value[offset] = value
+        elif name == 'Print':
+            self.io.write_line(format_value(self._evaluate(index + 2)))
+        elif name == 'Input':
+            target = tokens[first + 2]
+            variable = self._variable(target.value)
+            variable.value = read_value(self.io, variable.type, target.value, target.location())
+        elif name == 'Conditions':
+            condition, block, *rest = tree.children(index)
+            if self._evaluate(condition + 1):
+                self._block(block)
+            elif rest:
+                self._block(rest[0] + 1)
+        elif name == 'Loops':
+            self._loop(index)
+        elif name == 'Break':
+            raise _Break()
+        elif name == 'Continue':
+            raise _Continue()
+        elif name == 'Return':
+            raise ProgramError("Returninter outside of a method")
+
+    def _loop(self, index: int):
+        tree = self.tree
+        children = list(tree.children(index))
+        self.scopes.append({})
+        try:
+            if len(children) == 2:
+                condition, block = children
+                update = None
+            else:
+                initial, condition, update, block = children
+                self._statement(initial + 1)
+            while self._evaluate(condition + 1):
+                try:
+                    self._block(block)
+                except _Break:
+                    break
+                except _Continue:
+                    pass
+                if update is not None:
+                    self._statement(update)
+        finally:
+            self.scopes.pop()
+
+    def _evaluate(self, index: int):
+        """Valor de un nodo Expresion"""
+        expression = self.expression_trees.get(index)
+        if expression is None:
+            expression = parse_expression(self.tokens, self.tree.first_tokens[index], self.tree.token_ends[index])
+            self.expression_trees[index] = expression
+        values: List[Optional[object]] = []
+        for node in range(len(expression)):
+            token = self.tokens[expression.token_indexes[node]]
+            left, right = expression.lefts[node], expression.rights[node]
+            if right < 0:
+                if token.type == 'ID':
+                    values.append(self._variable(token.value).value)
+                elif token.type == 'NUMBER':
+                    values.append(float(token.value) if '.' in token.value else int(token.value))
+                elif token.type == 'STRING':
+                    values.append(token.value[1:-1])
+                else:
+                    values.append(token.value == 'TRUEter')
+            elif left < 0:
+                values.append(not values[right])
+            else:
+                values.append(_apply(token.value, values[left], values[right]))
+        return values[-1]
+
+
+def _apply(operator: str, left, right):
+    if operator == '+':
+        return left + right
+    if operator == '-':
+        return left - right
+    if operator == '*':
+        return left * right
+    if operator == '/':
+        if isinstance(left, int) and isinstance(right, int):
+            return divide(left, right)
+        return left / right
+    if operator == '==':
+        return left == right
+    if operator == '!=':
+        return left != right
+    if operator == '>':
+        return left > right
+    if operator == '<':
+        return left < right
+    if operator == '>=':
+        return left >= right
+    if operator == '<=':
+        return left <= right
+    if operator == 'ANDter':
+        return left and right
+    return left or right
@@ -1,81 +1,673 @@
+import codecs
+import mmap
+import os
 import re
-from typing import List, Dict, Set, Optional
+from array import array
+from bisect import bisect_right
+from functools import partial
+from itertools import accumulate, repeat
+from operator import add, attrgetter
+from typing import IO, Callable, FrozenSet, Iterable, Iterator, List, Dict, Set, Optional, Sequence, Tuple, Union
+
+from tree import ParseTree, TreeTables
+
+# Patrones del lexer, en orden de prioridad
+TOKEN_PATTERNS = [
+    ('WHITESPACE', r'[ \t\n]+'),
+    ('START_PROG', r'= \^ \.'),
+    ('END_PROG', r'\. \^ ='),
+    ('DECVAR', r'DECVARinter'),
+    ('ENDDEC', r'EndDecinter'),
+    ('METHOD', r'Methodinter'),
+    ('IF', r'Siinter'),
+    ('ELSE', r'Sinointer'),
+    ('WHILE', r'Mientinter'),
+    ('FOR', r'Forinter'),
+    ('ARRAY', r'ARRAYinter'),
+    ('PRINT', r'Mostrinter'),
+    ('READ', r'LEERinter'),
+    ('BREAK', r'BREAKinter'),
+    ('CONTINUE', r'CONTINUEinter'),
+    ('RETURN', r'Returninter'),
+    ('TYPE', r'(INTer|FLOATer|STRINGter|BOOLEANter|VOIDter)'),
+    ('BOOLEAN', r'(TRUEter|FALSEter)'),
+    ('STRING', r'"[^"]*"'),
+    ('NUMBER', r'\d+(\.\d+)?'),
+    ('OP_REL', r'(==|!=|>=|<=|>|<)'),
+    ('OP_LOG', r'(ANDter|ORter|NOTter)'),
+    ('OP_ARIT', r'[\+\-\*/]'),
+    ('END_STMT', r':3'),
+    ('SEMI', r';'),
+    ('COMMA', r','),
+    ('COLON', r':'),
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('LBRACE', r'\{'),
+    ('RBRACE', r'\}'),
+    ('LBRACK', r'\['),
+    ('RBRACK', r'\]'),
+    ('ASSIGN', r'='),
+    ('COMMENT', r'##.*'),
+    ('ID', r'[a-zA-Z_][a-zA-Z0-9_]*'),  # Un solo tipo de ID para simplificar
+]
+
+# Identificador entero de cada tipo de token (WHITESPACE, el 0, nunca llega
+# al parser y sirve también para tipos desconocidos)
+TOKEN_KINDS: Dict[str, int] = {name: kind for kind, (name, _) in enumerate(TOKEN_PATTERNS)}
+TOKEN_TYPES = tuple(name for name, _ in TOKEN_PATTERNS)
+
+# Valor de current_kind cuando ya no quedan tokens
+END_OF_INPUT = -1
+
+# Errores que registra el parser antes de detenerse
+DEFAULT_MAX_ERRORS = 100
+
+# Palabras clave: se reconocen escaneando el identificador completo y
+# buscándolo en este diccionario (deben coincidir con TOKEN_PATTERNS)
+KEYWORDS: Dict[str, str] = {
+    'DECVARinter': 'DECVAR',
+    'EndDecinter': 'ENDDEC',
+    'Methodinter': 'METHOD',
+    'Siinter': 'IF',
+    'Sinointer': 'ELSE',
+    'Mientinter': 'WHILE',
+    'Forinter': 'FOR',
+    'ARRAYinter': 'ARRAY',
+    'Mostrinter': 'PRINT',
+    'LEERinter': 'READ',
+    'BREAKinter': 'BREAK',
+    'CONTINUEinter': 'CONTINUE',
+    'Returninter': 'RETURN',
+    'INTer': 'TYPE',
+    'FLOATer': 'TYPE',
+    'STRINGter': 'TYPE',
+    'BOOLEANter': 'TYPE',
+    'VOIDter': 'TYPE',
+    'TRUEter': 'BOOLEAN',
+    'FALSEter': 'BOOLEAN',
+    'ANDter': 'OP_LOG',
+    'ORter': 'OP_LOG',
+    'NOTter': 'OP_LOG',
+}
+
+# Operadores y signos de longitud fija
+SYMBOLS: Dict[str, str] = {
+    '= ^ .': 'START_PROG',
+    '. ^ =': 'END_PROG',
+    '==': 'OP_REL', '!=': 'OP_REL', '>=': 'OP_REL', '<=': 'OP_REL', '>': 'OP_REL', '<': 'OP_REL',
+    '+': 'OP_ARIT', '-': 'OP_ARIT', '*': 'OP_ARIT', '/': 'OP_ARIT',
+    ':3': 'END_STMT',
+    ';': 'SEMI',
+    ',': 'COMMA',
+    ':': 'COLON',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    '[': 'LBRACK',
+    ']': 'RBRACK',
+    '=': 'ASSIGN',
+}
+
+# Tipo de los lexemas de longitud variable según su primer carácter
+# (cualquier otro es un dígito, es decir NUMBER)
+FIRST_CHAR_TYPES: Dict[str, str] = {'"': 'STRING', '#': 'COMMENT'}
+
+# Escáner de una sola pasada. Cada coincidencia devuelve una tupla (espacios
+# previos, saltos de línea, identificador, otro lexema, carácter inválido)
+# en la que, aparte de los espacios, hay un único grupo no vacío; el orden de
+# las alternativas de "otro lexema" reproduce la prioridad de TOKEN_PATTERNS.
+SCANNER_REGEX = re.compile(
+    r'([ \t]*)(?:'
+    r'(\n[ \t\n]*)'
+    r'|([a-zA-Z_][a-zA-Z0-9_]*(?:\d+(?:\.\d+)?|\.\d+)?)'
+    r'|(= \^ \.|\. \^ =|[=!<>]=|:3|\d+(?:\.\d+)?|"[^"]*"|##.*|[-+*/;,:(){}\[\]<>=])'
+    r'|(.)'
+    r'|$)'
+)
+
+# Un identificador que no es palabra clave pero empieza con una (por ejemplo
+# "INTeres"), o que va seguido de dígitos no ASCII o de ".dígitos", se
+# divide con la alternancia de TOKEN_PATTERNS para conservar sus resultados
+KEYWORD_PREFIX_REGEX = re.compile('|'.join(sorted(KEYWORDS, key=len, reverse=True)))
+
+# Escáner de bytes para archivos mapeados en memoria (Lexer.tokenize_file).
+# Cada alternativa es un grupo de un único tipo, así que match.lastindex da
+# el tipo sin recortar el lexema: las palabras clave son grupos (que no
+# pueden seguir con otro carácter de identificador ni con ".dígitos",
+# y que sólo se prueban si el carácter es inicial de alguna) antes del
+# identificador, y los signos siguen el orden de SCANNER_REGEX. Los
+# grupos 1 y 2 son los espacios y los saltos de línea, y el último un
+# carácter inválido; con \d y las clases en bytes, sólo se aceptan dígitos
+# ASCII.
+_BYTES_SCANNER_GROUPS: List[Tuple[str, str]] = [
+    *((token_type, '(?:' + '|'.join(sorted((word for word, word_type in KEYWORDS.items() if word_type == token_type),
+                                          key=len, reverse=True)) + r')(?![a-zA-Z0-9_]|\.\d)')
+      for token_type in dict.fromkeys(KEYWORDS.values())),
+    ('ID', r'[a-zA-Z_][a-zA-Z0-9_]*(?:\d+(?:\.\d+)?|\.\d+)?'),
+    ('START_PROG', r'= \^ \.'),
+    ('END_PROG', r'\. \^ ='),
+    ('OP_REL', r'[=!<>]='),
+    ('END_STMT', r':3'),
+    ('NUMBER', r'\d+(?:\.\d+)?'),
+    ('STRING', r'"[^"]*"'),
+    ('COMMENT', r'##.*'),
+    ('OP_ARIT', r'[-+*/]'),
+    ('SEMI', r';'),
+    ('COMMA', r','),
+    ('COLON', r':'),
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('LBRACE', r'\{'),
+    ('RBRACE', r'\}'),
+    ('LBRACK', r'\['),
+    ('RBRACK', r'\]'),
+    ('OP_REL', r'[<>]'),
+    ('ASSIGN', r'='),
+]
+_BYTES_KEYWORD_GROUPS = len(dict.fromkeys(KEYWORDS.values()))
+BYTES_SCANNER_REGEX = re.compile(
+    (r'([ \t]*)(?:(\n[ \t\n]*)'
+     + '|(?=[' + ''.join(sorted({word[0] for word in KEYWORDS})) + '])(?:'
+     + '|'.join(f'({pattern})' for _, pattern in _BYTES_SCANNER_GROUPS[:_BYTES_KEYWORD_GROUPS]) + ')|'
+     + '|'.join(f'({pattern})' for _, pattern in _BYTES_SCANNER_GROUPS[_BYTES_KEYWORD_GROUPS:])
+     + r'|(.)|$)').encode('ascii')
+)
+# Tipo de cada grupo de BYTES_SCANNER_REGEX (0 para espacios, saltos de línea y el carácter inválido)
+_BYTES_GROUP_KINDS = bytes([0, 0, 0, *(TOKEN_KINDS[token_type] for token_type, _ in _BYTES_SCANNER_GROUPS), 0])
+_BYTES_INVALID_GROUP = len(_BYTES_GROUP_KINDS) - 1
+BYTES_KEYWORD_PREFIX_REGEX = re.compile(KEYWORD_PREFIX_REGEX.pattern.encode('ascii'))
+
+# Las mismas tablas, con el identificador entero del tipo
+_KEYWORD_KINDS = {word: TOKEN_KINDS[token_type] for word, token_type in KEYWORDS.items()}
+_SYMBOL_KINDS = {symbol: TOKEN_KINDS[token_type] for symbol, token_type in SYMBOLS.items()}
+_FIRST_CHAR_KINDS = {char: TOKEN_KINDS[token_type] for char, token_type in FIRST_CHAR_TYPES.items()}
+
+class LineIndex:
+    """
+    Inicios de línea de un código, para convertir un desplazamiento en
+    (línea, columna) con búsqueda binaria. El índice se construye la primera
+    vez que se consulta, fuera del ciclo del lexer.
+    """
+    def __init__(self, source: Union[str, bytes, mmap.mmap, None] = None):
+        self._source = source
+        self._starts: Optional[array] = None if source is not None else array('I', [0])
+        # Código en bytes (UTF-8): las columnas cuentan caracteres, no bytes
+        self._encoded = source if isinstance(source, (bytes, mmap.mmap)) else None
+
+    @classmethod
+    def from_starts(cls, starts: Sequence[int]) -> 'LineIndex':
+        """Índice a partir de los inicios de línea ya calculados (ver starts)"""
+        index = cls()
+        index._starts = starts
+        return index
+
+    def starts(self) -> Sequence[int]:
+        """Desplazamiento en que empieza cada línea"""
+        return self._offsets()
+
+    def extend(self, text: str, base: int):
+        """Agrega las líneas de un bloque que empieza en base (lectura por bloques)"""
+        starts = self._offsets()
+        position = text.find('\n')
+        while position >= 0:
+            starts.append(base + position + 1)
+            position = text.find('\n', position + 1)
+
+    def _offsets(self) -> array:
+        if self._starts is None:
+            if isinstance(self._source, str):
+                # Cada línea empieza después de la anterior y su salto de línea
+                lengths = map(len, self._source.split('\n'))
+                self._starts = array('I', accumulate(map(add, lengths, repeat(1)), initial=0))
+                self._starts.pop()
+            else:
+                # Bytes o un archivo mapeado: buscar los saltos sin copiar el contenido
+                starts = array('I', [0])
+                find = self._source.find
+                position = find(b'\n')
+                while position >= 0:
+                    starts.append(position + 1)
+                    position = find(b'\n', position + 1)
+                self._starts = starts
+            self._source = None
+        return self._starts
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self._offsets(), offset)
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """Línea y columna (ambas desde 1) de un desplazamiento"""
+        starts = self._offsets()
+        line = bisect_right(starts, offset)
+        start = starts[line - 1]
+        if self._encoded is not None and offset > start:
+            return line, len(str(self._encoded[start:offset], 'utf-8', 'replace')) + 1
+        return line, offset - start + 1
 
 class Token:
-    def __init__(self, type: str, value: str, line: int):
+    # Sin __dict__ por instancia: los programas grandes crean millones
+    __slots__ = ('type', 'value', 'kind', 'start', '_line', '_index')
+
+    def __init__(self, type: str, value: str, line: Optional[int] = None,
+                 start: int = -1, index: Optional[LineIndex] = None):
         self.type = type
         self.value = value
-        self.line = line
+        self.kind = TOKEN_KINDS.get(type, 0)
+        self.start = start  # Desplazamiento en el código (-1 si se desconoce)
+        self._line = line
+        self._index = index
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.value)
+
+    @property
+    def line(self) -> int:
+        """Línea del token; los del lexer la calculan a partir de su desplazamiento"""
+        if self._line is None:
+            self._line = self._index.line(self.start) if self._index is not None else -1
+        return self._line
+
+    @property
+    def column(self) -> Optional[int]:
+        """Columna (desde 1), o None si el token no tiene desplazamiento"""
+        if self._index is None:
+            return None
+        return self._index.position(self.start)[1]
+
+    def location(self) -> str:
+        """Ubicación para mensajes de error: línea, y columna si se conoce"""
+        column = self.column
+        return f"línea {self.line}" if column is None else f"línea {self.line}, columna {column}"
 
     def __str__(self):
         return f"Token({self.type}, {self.value}, line={self.line})"
 
+class TokenBuffer:
+    """
+    Tokens almacenados en columnas (arrays paralelos) en lugar de un objeto
+    por lexema: tipo como entero e inicio y fin en el código. El valor se
+    recorta del código y la línea se calcula con el LineIndex sólo cuando
+    se piden, y los objetos Token se crean únicamente al indexar o iterar.
+    """
+    def __init__(self, source: str, index: Optional[LineIndex] = None):
+        self.source = source
+        self.index = index or LineIndex(source)
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        return Token(TOKEN_TYPES[self.kinds[index]], self.value(index), None,
+                     self.starts[index], self.index)
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def truncate(self, length: int):
+        """Descarta los tokens a partir de la posición length"""
+        for column in (self.kinds, self.starts, self.ends):
+            del column[length:]
+
+    def type(self, index: int) -> str:
+        return TOKEN_TYPES[self.kinds[index]]
+
+    def value(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def line(self, index: int) -> int:
+        return self.index.line(self.starts[index])
+
+    def view(self, index: int) -> Tuple[int, int, int]:
+        """Tipo (entero), desplazamiento y longitud de un token, sin recortar el código"""
+        start = self.starts[index]
+        return self.kinds[index], start, self.ends[index] - start
+
+class MappedTokenBuffer(TokenBuffer):
+    """
+    TokenBuffer de un archivo mapeado en memoria (ver Lexer.tokenize_file).
+    Los desplazamientos son en bytes y el texto de un token se decodifica
+    sólo cuando se pide su valor; el archivo queda mapeado hasta close().
+    """
+    def __init__(self, source: Union[bytes, mmap.mmap]):
+        super().__init__(source, LineIndex(source))
+
+    def value(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]].decode('utf-8', 'replace')
+
+    def close(self):
+        if isinstance(self.source, mmap.mmap):
+            self.source.close()
+
+    def __enter__(self) -> 'MappedTokenBuffer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class InvalidCharacterError(ValueError):
+    def __init__(self, character: str, line: int, column: Optional[int] = None, offset: int = -1):
+        self.character = character
+        self.line = line
+        self.column = column
+        self.offset = offset  # Desplazamiento del carácter en el código
+        location = f"line {line}" if column is None else f"line {line}, column {column}"
+        super().__init__(f"Invalid character at {location}: {character}")
+
 class Lexer:
+    # Caracteres leídos por bloque en iter_tokens
+    CHUNK_SIZE = 1 << 16
+    # Bytes escaneados por tokenize_file entre dos liberaciones de páginas
+    RELEASE_SIZE = 16 << 20
+
     def __init__(self):
-        self.token_patterns = [
-            ('WHITESPACE', r'[ \t\n]+'),
-            ('START_PROG', r'= \^ \.'),
-            ('END_PROG', r'\. \^ ='),
-            ('DECVAR', r'DECVARinter'),
-            ('ENDDEC', r'EndDecinter'),
-            ('METHOD', r'Methodinter'),
-            ('IF', r'Siinter'),
-            ('ELSE', r'Sinointer'),
-            ('WHILE', r'Mientinter'),
-            ('FOR', r'Forinter'),
-            ('ARRAY', r'ARRAYinter'),
-            ('PRINT', r'Mostrinter'),
-            ('READ', r'LEERinter'),
-            ('BREAK', r'BREAKinter'),
-            ('CONTINUE', r'CONTINUEinter'),
-            ('RETURN', r'Returninter'),
-            ('TYPE', r'(INTer|FLOATer|STRINGter|BOOLEANter|VOIDter)'),
-            ('BOOLEAN', r'(TRUEter|FALSEter)'),
-            ('STRING', r'"[^"]*"'),
-            ('NUMBER', r'\d+(\.\d+)?'),
-            ('OP_REL', r'(==|!=|>=|<=|>|<)'),
-            ('OP_LOG', r'(ANDter|ORter|NOTter)'),
-            ('OP_ARIT', r'[\+\-\*/]'),
-            ('END_STMT', r':3'),
-            ('SEMI', r';'),
-            ('COMMA', r','),
-            ('COLON', r':'),
-            ('LPAREN', r'\('),
-            ('RPAREN', r'\)'),
-            ('LBRACE', r'\{'),
-            ('RBRACE', r'\}'),
-            ('LBRACK', r'\['),
-            ('RBRACK', r'\]'),
-            ('ASSIGN', r'='),
-            ('COMMENT', r'##.*'),
-            ('ID', r'[a-zA-Z_][a-zA-Z0-9_]*'),  # Un solo tipo de ID para simplificar
-        ]
+        self.token_patterns = list(TOKEN_PATTERNS)
         
         self.token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.token_patterns)
         self.regex = re.compile(self.token_regex)
         
     def tokenize(self, code: str) -> List[Token]:
-        tokens = []
-        line = 1
-        pos = 0
+        """
+        Tokeniza el código en una sola pasada. Los identificadores se escanean
+        una vez y se clasifican con KEYWORDS; el resto de lexemas se clasifica
+        con SYMBOLS o por su primer carácter. Cada token guarda su inicio y fin;
+        la línea y la columna se calculan a pedido con un LineIndex.
+
+        Crear un Token por lexema cuesta casi tanto como el escaneo: con
+        benchmark.py 20000 esto es unas 1,7 veces más rápido que la alternancia
+        de expresiones regulares anterior, contra unas 2,9 veces de
+        tokenize_buffer, que no crea objetos. Ése es el techo de una lista de
+        Token; el camino más rápido es tokenize_buffer.
+        """
+        tokens: List[Token] = []
+        self._scan(code, 0, LineIndex(code), tokens)
+        return tokens
+
+    def tokenize_buffer(self, code: str) -> TokenBuffer:
+        """
+        Igual que tokenize, pero guarda los tokens en columnas (TokenBuffer):
+        unos pocos bytes por token en lugar de un objeto y una cadena por
+        lexema. Parser.parse lo recorre sin crear objetos Token.
+
+        El código se escanea en ventanas que terminan en un salto de línea,
+        para no materializar de una vez las coincidencias de todo el archivo
+        (ver iter_tokens para el caso de una cadena abierta en el corte).
+        """
+        buffer = TokenBuffer(code)
+        start = 0
+        window = self.CHUNK_SIZE
+
+        while start < len(code):
+            if start + window >= len(code):
+                end = len(code)
+            else:
+                end = code.rfind('\n', start, start + window) + 1
+                if end <= start:  # Línea más larga que la ventana
+                    window *= 2
+                    continue
+
+            length = len(buffer)
+            try:
+                self._scan_columns(code, start, end, buffer)
+            except InvalidCharacterError as error:
+                if error.character != '"' or end == len(code):
+                    raise
+                buffer.truncate(length)
+                window *= 2
+                continue
+
+            start = end
+            window = self.CHUNK_SIZE
+
+        return buffer
+
+    def _scan_columns(self, code: str, start: int, end: int, buffer: TokenBuffer):
+        """Agrega a buffer los tokens de code[start:end]"""
+        add_kind = buffer.kinds.append
+        add_start = buffer.starts.append
+        add_end = buffer.ends.append
+        keyword_kind = _KEYWORD_KINDS.get
+        symbol_kind = _SYMBOL_KINDS.get
+        first_char_kind = _FIRST_CHAR_KINDS.get
+        keyword_prefix = KEYWORD_PREFIX_REGEX.match
+        id_kind = TOKEN_KINDS['ID']
+        number_kind = TOKEN_KINDS['NUMBER']
+        pos = start
+
+        for blanks, newlines, word, lexeme, invalid in SCANNER_REGEX.findall(code, start, end):
+            if blanks:
+                pos += len(blanks)
+            if word:
+                kind = keyword_kind(word)
+                if kind is None:
+                    if '.' in word or not word.isascii() or keyword_prefix(word) is not None:
+                        for token_type, value, offset in self._split_word(word, pos, buffer.index):
+                            add_kind(TOKEN_KINDS[token_type])
+                            add_start(offset)
+                            add_end(offset + len(value))
+                        pos += len(word)
+                        continue
+                    kind = id_kind
+                lexeme = word
+            elif lexeme:
+                kind = symbol_kind(lexeme)
+                if kind is None:
+                    kind = first_char_kind(lexeme[0], number_kind)
+            elif newlines:
+                pos += len(newlines)
+                continue
+            elif invalid:
+                raise InvalidCharacterError(invalid, *buffer.index.position(pos), pos)
+            else:
+                continue
+
+            add_kind(kind)
+            add_start(pos)
+            pos += len(lexeme)
+            add_end(pos)
+
+    def tokenize_file(self, path: Union[str, os.PathLike]) -> MappedTokenBuffer:
+        """
+        Tokeniza un archivo mapeándolo en memoria y escaneando sus bytes con
+        BYTES_SCANNER_REGEX: el archivo no se lee ni se decodifica entero y
+        no se crea una cadena por lexema (el tipo sale del grupo que
+        coincidió). Las páginas ya escaneadas se devuelven al sistema cada
+        RELEASE_SIZE bytes, así que la memoria residente queda cerca del
+        tamaño de las columnas del TokenBuffer y no del archivo.
+
+        Los desplazamientos son en bytes (iguales a los de tokenize_buffer
+        si el archivo es ASCII); las columnas de los tokens y de los
+        errores, en caracteres. Igual que al leerlo como texto, un archivo
+        que no es UTF-8 válido da UnicodeDecodeError. El resultado mantiene
+        el archivo mapeado: hay que cerrarlo con close() o usarlo en un with.
+        """
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return MappedTokenBuffer(b'')  # mmap no admite archivos vacíos
+            source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = MappedTokenBuffer(source)
+        try:
+            self._check_utf8(source)
+            self._scan_bytes(buffer)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+
+    def _check_utf8(self, source: Union[bytes, mmap.mmap]):
+        """
+        Decodifica el código por bloques de RELEASE_SIZE sólo para
+        verificarlo (y devuelve las páginas de cada bloque al sistema); el
+        error indica el desplazamiento en el archivo
+        """
+        release = None
+        if isinstance(source, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            release = source.madvise
+        view = memoryview(source)
+        try:
+            position = 0
+            while position < len(view):
+                end = position + self.RELEASE_SIZE
+                try:
+                    _, consumed = codecs.utf_8_decode(view[position:end], 'strict', end >= len(view))
+                except UnicodeDecodeError as e:
+                    if not position:
+                        raise
+                    raise UnicodeDecodeError(e.encoding, e.object, e.start, e.end,
+                                             f"{e.reason} (byte {position + e.start} of the file)") from None
+                if release is not None:
+                    release(mmap.MADV_DONTNEED, 0, (position + consumed) - (position + consumed) % mmap.PAGESIZE)
+                position += consumed
+        finally:
+            view.release()
+
+    def _scan_bytes(self, buffer: MappedTokenBuffer):
+        """Agrega a buffer los tokens de su código en bytes"""
+        source = buffer.source
+        add_kind = buffer.kinds.append
+        add_start = buffer.starts.append
+        add_end = buffer.ends.append
+        group_kinds = _BYTES_GROUP_KINDS
+        keyword_prefix = BYTES_KEYWORD_PREFIX_REGEX.match
+        find = source.find
+        id_kind = TOKEN_KINDS['ID']
+
+        release = None
+        if isinstance(source, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            source.madvise(mmap.MADV_SEQUENTIAL)
+            release = source.madvise
+        released = 0  # Bytes del principio ya devueltos (múltiplo de PAGESIZE)
+        next_release = self.RELEASE_SIZE
+
+        for match in BYTES_SCANNER_REGEX.finditer(source):
+            group = match.lastindex
+            kind = group_kinds[group]
+            if kind:
+                start, end = match.span(group)
+                if kind == id_kind and (find(b'.', start, end) >= 0 or keyword_prefix(source, start, end)):
+                    word = source[start:end].decode('ascii')
+                    for token_type, value, offset in self._split_word(word, start, buffer.index):
+                        add_kind(TOKEN_KINDS[token_type])
+                        add_start(offset)
+                        add_end(offset + len(value))
+                    continue
+                add_kind(kind)
+                add_start(start)
+                add_end(end)
+                if end >= next_release and release is not None:
+                    boundary = end - end % mmap.PAGESIZE
+                    release(mmap.MADV_DONTNEED, released, boundary - released)
+                    released = boundary
+                    next_release = end + self.RELEASE_SIZE
+            elif group == _BYTES_INVALID_GROUP:
+                position = match.start(group)
+                character = source[position:position + 4].decode('utf-8', 'replace')[0]
+                raise InvalidCharacterError(character, *buffer.index.position(position), position)
+
+    def iter_tokens(self, source: Union[str, os.PathLike, IO[str]],
+                    chunk_size: Optional[int] = None) -> Iterator[Token]:
+        """
+        Tokeniza un archivo (ruta) o un flujo de texto por bloques y entrega
+        los tokens a medida que se producen, sin cargar todo el código.
+
+        Cada bloque se corta después de su último salto de línea: ningún
+        token salvo una cadena puede contener un salto de línea, así que un
+        lexema como "= ^ ." o ":3" nunca queda partido. Si el corte cae
+        dentro de una cadena, su comilla inicial aparece como carácter
+        inválido; en ese caso se leen más datos y se vuelve a escanear.
+        Los desplazamientos de los tokens son relativos al flujo completo.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding='utf-8') as stream:
+                yield from self.iter_tokens(stream, chunk_size)
+            return
+
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        index = LineIndex()
+        buffer = ''
+        base = 0  # Desplazamiento de buffer[0] en el flujo
+        indexed = 0  # Caracteres de buffer ya agregados al índice
+        at_end = False
+
+        while not at_end:
+            # Si el búfer creció por una cadena abierta, duplicar la lectura
+            data = source.read(max(chunk_size, len(buffer)))
+            at_end = not data
+            buffer += data
+
+            cut = len(buffer) if at_end else buffer.rfind('\n') + 1
+            if cut == 0:
+                continue  # Aún no hay una línea completa
+
+            index.extend(buffer[indexed:cut], base + indexed)
+            indexed = cut
+
+            tokens: List[Token] = []
+            try:
+                self._scan(buffer[:cut], base, index, tokens)
+            except InvalidCharacterError as error:
+                if error.character == '"' and not at_end:
+                    continue  # Cadena abierta en el corte: leer más
+                raise
+
+            yield from tokens
+            buffer = buffer[cut:]
+            base += cut
+            indexed = 0
+
+    def _scan(self, code: str, base: int, index: LineIndex, tokens: List[Token]):
+        """Agrega a tokens los lexemas de code, que empieza en el desplazamiento base"""
+        append = tokens.append
+        keyword_type = KEYWORDS.get
+        symbol_type = SYMBOLS.get
+        first_char_type = FIRST_CHAR_TYPES.get
+        keyword_prefix = KEYWORD_PREFIX_REGEX.match
+        pos = base
         
-        while pos < len(code):
-            match = self.regex.match(code, pos)
+        for blanks, newlines, word, lexeme, invalid in SCANNER_REGEX.findall(code):
+            if blanks:
+                pos += len(blanks)
+            if word:
+                token_type = keyword_type(word)
+                if token_type is None:
+                    if '.' in word or not word.isascii() or keyword_prefix(word) is not None:
+                        for token_type, value, offset in self._split_word(word, pos, index):
+                            append(Token(token_type, value, None, offset, index))
+                        pos += len(word)
+                        continue
+                    token_type = 'ID'
+                append(Token(token_type, word, None, pos, index))
+                pos += len(word)
+            elif lexeme:
+                token_type = symbol_type(lexeme)
+                if token_type is None:
+                    token_type = first_char_type(lexeme[0], 'NUMBER')
+                append(Token(token_type, lexeme, None, pos, index))
+                pos += len(lexeme)
+            elif newlines:
+                pos += len(newlines)
+            elif invalid:
+                raise InvalidCharacterError(invalid, *index.position(pos), pos)
+
+    def _split_word(self, word: str, start: int, index: LineIndex) -> List[Tuple[str, str, int]]:
+        """
+        Divide un identificador con la alternancia original de patrones.
+        Devuelve (tipo, valor, desplazamiento) de cada parte.
+        """
+        parts = []
+        pos = 0
+        while pos < len(word):
+            match = self.regex.match(word, pos)
             if match is None:
-                raise ValueError(f"Invalid character at line {line}: {code[pos]}")
-                
-            token_type = match.lastgroup
-            token_value = match.group()
-            
-            if token_type != 'WHITESPACE':
-                tokens.append(Token(token_type, token_value, line))
-                
-            if token_value.count('\n') > 0:
-                line += token_value.count('\n')
-                
+                raise InvalidCharacterError(word[pos], *index.position(start + pos), start + pos)
+            parts.append((match.lastgroup, match.group(), start + pos))
             pos = match.end()
-            
-        return tokens
+        return parts
 
 class SyntaxError(Exception):
     def __init__(self, message: str, line: int):
@@ -83,330 +675,725 @@ class SyntaxError(Exception):
         self.line = line
         super().__init__(f"Syntax Error at line {line}: {message}")
 
-class Parser:
-    def __init__(self):
-        self.tokens: List[Token] = []
-        self.current = 0
-        self.current_token: Optional[Token] = None
-        self.errors: List[str] = []  # Lista para almacenar errores
-        
-        # Tokens de sincronización para modo pánico
-        self.sync_tokens = {
-            'Statement': {'END_STMT', 'SEMI', 'RBRACE', 'END_PROG'},
-            'VarDec': {'ENDDEC', 'END_STMT', 'RBRACE', 'END_PROG'},
-            'Method': {'RBRACE', 'END_PROG'},
-            'Conditions': {'ELSE', 'END_STMT', 'RBRACE', 'END_PROG'},
-            'Loops': {'RBRACE', 'END_PROG'},
-            'Block': {'RBRACE', 'END_PROG', 'ELSE'},
-            'Expresion': {'END_STMT', 'SEMI', 'RPAREN', 'COMMA', 'RBRACK'},
-            'CODE': {'END_PROG', 'RBRACE'}
+class Diagnostic:
+    """
+    Error de sintaxis del que el parser se recuperó. Guarda los datos del
+    error; el mensaje se arma sólo cuando se pide (message, str), así que
+    un programa con muchos errores no paga el formateo durante el análisis.
+    """
+    __slots__ = ('code', 'symbol', 'expected', 'found', 'position', 'token')
+
+    UNEXPECTED_TOKEN = 'unexpected-token'  # Un no terminal no tiene producción para el token
+    MISMATCH = 'mismatch'  # Se esperaba otro terminal
+
+    def __init__(self, code: str, symbol: str, expected: FrozenSet[str], found: str,
+                 position: int, token: Optional[Token] = None):
+        self.code = code
+        self.symbol = symbol  # No terminal o terminal que se estaba procesando
+        self.expected = expected  # Tipos de token con los que se podía continuar
+        self.found = found  # Tipo del token encontrado
+        self.position = position  # Posición del token en el flujo
+        self.token = token
+
+    @property
+    def offset(self) -> int:
+        return self.token.start if self.token is not None else -1
+
+    @property
+    def message(self) -> str:
+        if self.code == Diagnostic.MISMATCH:
+            return f"Expected {self.symbol}, got {self.found}"
+        return f"Unexpected token {self.found} while processing {self.symbol}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'code': self.code,
+            'message': self.message,
+            'expected': sorted(self.expected),
+            'found': self.found,
+            'offset': self.offset,
+            'line': self.token.line if self.token is not None else -1,
+            'column': self.token.column if self.token is not None else None,
         }
+
+    def __str__(self):
+        if self.token is None:
+            return f"Error: {self.message}"
+        return f"Error en {self.token.location()}: {self.message}"
+
+class _TokenCursor:
+    """Recorre un iterador de tokens recordando el último, para los mensajes de error"""
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        self.token: Optional[Token] = None
+
+    def kinds(self) -> Iterator[int]:
+        for token in self.tokens:
+            self.token = token
+            yield token.kind
+
+    def token_at(self, index: int) -> Optional[Token]:
+        # Un iterador sólo puede devolver el token actual
+        return self.token
+
+class _ExpressionGrammar:
+    """
+    Tipos de token de las expresiones, obtenidos de la tabla:
+    Expresion → Factor ExprTail, Factor → átomo | prefijo Factor |
+    "(" Expresion ")", ExprTail → operador Factor ExprTail | ε
+    """
+    def __init__(self, expression: int, factor: int, tail: int, atoms: Set[int], prefixes: Set[int],
+                 operators: Set[int], ends: Set[int], open_kind: int, close_kind: int):
+        self.expression = expression
+        self.factor = factor
+        self.tail = tail
+        self.atoms = frozenset(atoms)  # ID, NUMBER, STRING, BOOLEAN
+        self.prefixes = frozenset(prefixes)  # OP_LOG (NOTter)
+        self.operators = frozenset(operators)  # OP_ARIT, OP_REL, OP_LOG
+        self.ends = frozenset(ends)  # Tokens que terminan la expresión (ExprTail → ε)
+        self.open_kind = open_kind
+        self.close_kind = close_kind
+        self.starts = self.atoms | self.prefixes | {open_kind}
+
+class Parser:
+    def __init__(self, max_errors: Optional[int] = DEFAULT_MAX_ERRORS):
+        self.tokens: Iterable[Token] = []
+        self.current = 0  # Posición del token actual en el flujo
+        self.current_kind = END_OF_INPUT  # Tipo entero del token actual
+        self._kinds: Iterator[int] = iter(())
+        self._token_at: Callable[[int], Optional[Token]] = lambda index: None
+        self.diagnostics: List[Diagnostic] = []  # Errores del último análisis
+        self.max_errors = max_errors  # Errores antes de detener el análisis (None: sin límite)
+        self.fatal_error: Optional[SyntaxError] = None  # Error que detuvo el análisis
+        self.tree: Optional[ParseTree] = None  # Árbol del último análisis, si se pidió
+        self.profile = None  # ParseProfile que se está llenando (ver instrument)
         
-        # Inicializar tabla de análisis predictivo
-        self.parse_table: Dict[str, Dict[str, List[str]]] = self._initialize_parse_table()
+        # Gramática compilada: tabla por nombres y su versión codificada con enteros
+        self.grammar = self._load_grammar()
+        self.parse_table: Dict[str, Dict[str, List[str]]] = self.grammar.table
+        self.encoded_table = self.grammar.encoded
+        self.expression_grammar = self._expression_grammar()
+
+        # Recuperación de errores, por símbolo y derivada de la gramática:
+        # tipos de token con los que se puede continuar (los de su fila de la
+        # tabla), tokens de sincronización del modo pánico (esos más su
+        # FOLLOW) y producción vacía que se usa por defecto (o -1). reentries
+        # es la lista (CODE) a la que se vuelve si falla lo que la sigue
+        self.reentries = self.encoded_table.reentries()
+        self.expected_types, self.sync_kinds, self.default_productions = self._recovery_sets()
+        # Cuerpos con las listas marcadas y tabla para registrar las expansiones, para armar el árbol
+        self.tree_tables = TreeTables(self.encoded_table)
+
+    @property
+    def errors(self) -> List[str]:
+        """Mensajes de los errores del último análisis, formateados al pedirlos"""
+        return [str(diagnostic) for diagnostic in self.diagnostics]
+
+    @property
+    def current_token(self) -> Optional[Token]:
+        """Token actual; sólo se materializa cuando se necesita (p. ej. en errores)"""
+        if self.current_kind == END_OF_INPUT:
+            return None
+        return self._token_at(self.current)
+
+    def _recovery_sets(self) -> Tuple[List[FrozenSet[str]], List[FrozenSet[int]], List[int]]:
+        encoded = self.encoded_table
+        terminal_count = encoded.terminal_count
+        names = encoded.symbol_names
+
+        def row(symbol: int):
+            return encoded.table[symbol * terminal_count:(symbol + 1) * terminal_count]
 
-    def _synchronize(self, non_terminal: str) -> bool:
+        expected = [frozenset((name,)) for name in names[:terminal_count]]
+        sync = [frozenset((kind,)) for kind in range(terminal_count)]
+        defaults = [-1] * len(names)
+        for symbol in range(terminal_count, len(names)):
+            cells = row(symbol)
+            starts = {kind for kind, production in enumerate(cells) if production >= 0}
+            follow = self.grammar.follow.get(names[symbol], ())
+            expected.append(frozenset(names[kind] for kind in starts))
+            # También los tokens con los que se vuelve a entrar en la lista anterior
+            reentry = self.reentries[symbol]
+            if reentry >= 0:
+                starts.update(kind for kind, production in enumerate(row(reentry))
+                              if production >= 0 and encoded.productions[production])
+            sync.append(frozenset(starts | {TOKEN_KINDS[token_type] for token_type in follow
+                                            if token_type in TOKEN_KINDS}))
+            for production in cells:
+                if production >= 0 and not encoded.productions[production]:
+                    defaults[symbol] = production
+        return expected, sync, defaults
+
+    def _synchronize(self, symbol: int) -> bool:
         """
-        Intenta sincronizar el análisis después de un error
+        Modo pánico: descarta tokens hasta uno con el que el no terminal
+        pueda continuar o que pueda seguirlo (su FOLLOW).
         Retorna True si logró sincronizar, False si no hay más tokens
         """
-        if non_terminal not in self.sync_tokens:
-            return True
-
-        while self.current_token is not None:
-            # Si encontramos un token de sincronización para este no terminal
-            if self.current_token.type in self.sync_tokens[non_terminal]:
+        sync_kinds = self.sync_kinds[symbol]
+        while self.current_kind != END_OF_INPUT:
+            if self.current_kind in sync_kinds:
                 return True
-                
-            # Avanzar al siguiente token
             self.current += 1
-            self.current_token = self.tokens[self.current] if self.current < len(self.tokens) else None
-            
+            self.current_kind = next(self._kinds, END_OF_INPUT)
         return False
 
-    def _initialize_parse_table(self) -> Dict[str, Dict[str, List[str]]]:
-        table = {}
-        
-        # Programa y estructura básica
-        table['Programa'] = {
-            'START_PROG': ['START', 'CODE', 'FINISH']
-        }
-        
-        table['START'] = {
-            'START_PROG': ['START_PROG']
-        }
-        
-        table['FINISH'] = {
-            'END_PROG': ['END_PROG']
-        }
-        
-        # CODE y Statement
-        table['CODE'] = {
-            'DECVAR': ['Statement', 'CODE'],
-            'PRINT': ['Statement', 'CODE'],
-            'ID': ['Statement', 'CODE'],
-            'METHOD': ['Statement', 'CODE'],
-            'IF': ['Statement', 'CODE'],
-            'WHILE': ['Statement', 'CODE'],
-            'FOR': ['Statement', 'CODE'],
-            'ARRAY': ['Statement', 'CODE'],
-            'READ': ['Statement', 'CODE'],
-            'COMMENT': ['Statement', 'CODE'],
-            'BREAK': ['Statement', 'CODE'],
-            'CONTINUE': ['Statement', 'CODE'],
-            'RETURN': ['Statement', 'CODE'],
-            'END_PROG': ['ε'],
-            'RBRACE': ['ε']
-        }
-        
-        # Declaraciones
-        table['VarDec'] = {
-            'DECVAR': ['DECVAR', 'VarList', 'ENDDEC']
-        }
-        
-        table['VarList'] = {
-            'ID': ['VarDecItem', 'RestVarList']
-        }
-        
-        table['VarDecItem'] = {
-            'ID': ['ID', 'COLON', 'TYPE']
-        }
-        
-        table['RestVarList'] = {
-            'COMMA': ['COMMA', 'VarDecItem', 'RestVarList'],
-            'ENDDEC': ['ε']
-        }
-        
-        # Expresiones
-        table['ExpressionStatement'] = {
-            'ID': ['ID', 'ExpressionStatementTail']
-        }
-        
-        table['ExpressionStatementTail'] = {
-            'ASSIGN': ['ASSIGN', 'Expresion', 'END_STMT'],
-            'LBRACK': ['LBRACK', 'Expresion', 'RBRACK', 'ASSIGN', 'Expresion', 'END_STMT']
-        }
-        
-        table['Expresion'] = {
-            'ID': ['Factor', 'ExprTail'],
-            'NUMBER': ['Factor', 'ExprTail'],
-            'STRING': ['Factor', 'ExprTail'],
-            'LPAREN': ['Factor', 'ExprTail'],
-            'BOOLEAN': ['Factor', 'ExprTail'],
-            'OP_LOG': ['Factor', 'ExprTail']
-        }
-        
-        table['ExprTail'] = {
-            'OP_ARIT': ['OP_ARIT', 'Factor', 'ExprTail'],
-            'OP_REL': ['OP_REL', 'Factor', 'ExprTail'],
-            'OP_LOG': ['OP_LOG', 'Factor', 'ExprTail'],
-            'END_STMT': ['ε'],
-            'RPAREN': ['ε'],
-            'COMMA': ['ε'],
-            'RBRACK': ['ε']
-        }
-        
-        table['Factor'] = {
-            'ID': ['ID'],
-            'NUMBER': ['NUMBER'],
-            'BOOLEAN': ['BOOLEAN'],
-            'STRING': ['STRING'],
-            'LPAREN': ['LPAREN', 'Expresion', 'RPAREN'],
-            'OP_LOG': ['OP_LOG', 'Factor']
-        }
-        
-        # Condiciones
-        table['Condition'] = {
-            'ID': ['Expresion'],
-            'NUMBER': ['Expresion'],
-            'LPAREN': ['Expresion'],
-            'BOOLEAN': ['Expresion'],
-            'OP_LOG': ['Expresion']
-        }
-        
-        # Estructuras de control
-        table['Conditions'] = {
-            'IF': ['IF', 'LPAREN', 'Condition', 'RPAREN', 'Block', 'OptionalElse']
-        }
-        
-        table['Block'] = {
-            'LBRACE': ['LBRACE', 'CODE', 'RBRACE']
-        }
-        
-        table['OptionalElse'] = {
-            'ELSE': ['ELSE', 'LBRACE', 'CODE', 'RBRACE'],
-            'END_PROG': ['ε'],
-            'DECVAR': ['ε'],
-            'PRINT': ['ε'],
-            'ID': ['ε'],
-            'METHOD': ['ε'],
-            'IF': ['ε'],
-            'WHILE': ['ε'],
-            'FOR': ['ε'],
-            'ARRAY': ['ε'],
-            'READ': ['ε'],
-            'COMMENT': ['ε'],
-            'BREAK': ['ε'],
-            'CONTINUE': ['ε'],
-            'RETURN': ['ε'],
-            'RBRACE': ['ε']
-        }
-        
-        # Bucles
-        table['Loops'] = {
-            'WHILE': ['WHILE', 'LPAREN', 'Condition', 'RPAREN', 'Block'],
-            'FOR': ['FOR', 'LPAREN', 'ForInit', 'SEMI', 'Condition', 'SEMI', 'ExpressionStatement', 'RPAREN', 'Block']
-        }
-        
-        table['ForInit'] = {
-            'DECVAR': ['VarDec'],
-            'ID': ['ExpressionStatement']
-        }
-        
-        # Métodos
-        table['Method'] = {
-            'METHOD': ['METHOD', 'ID', 'LPAREN', 'ParamList', 'RPAREN', 'Block']
-        }
-        
-        table['ParamList'] = {
-            'TYPE': ['ParamItem', 'RestParams'],
-            'RPAREN': ['ε']
-        }
-        
-        table['ParamItem'] = {
-            'TYPE': ['TYPE', 'ID']
-        }
-        
-        table['RestParams'] = {
-            'COMMA': ['COMMA', 'ParamItem', 'RestParams'],
-            'RPAREN': ['ε']
-        }
-        
-        # Arrays
-        table['Array_Dec'] = {
-            'ARRAY': ['ARRAY', 'ID', 'LBRACK', 'ArraySize', 'RBRACK', 'COLON', 'TYPE', 'END_STMT']
-        }
-        
-        table['ArraySize'] = {
-            'NUMBER': ['NUMBER'],
-            'ID': ['ID']
-        }
-        
-        # Entrada/Salida
-        table['Print'] = {
-            'PRINT': ['PRINT', 'LPAREN', 'Printable', 'RPAREN', 'END_STMT']
-        }
-        
-        table['Printable'] = {
-            'STRING': ['STRING'],
-            'ID': ['Expresion'],
-            'NUMBER': ['Expresion'],
-            'BOOLEAN': ['Expresion'],
-            'LPAREN': ['Expresion']
-        }
-        
-        table['Input'] = {
-            'READ': ['READ', 'LPAREN', 'ID', 'RPAREN', 'END_STMT']
-        }
-        
-        # Control de flujo
-        table['Break'] = {
-            'BREAK': ['BREAK', 'END_STMT']
-        }
-        
-        table['Continue'] = {
-            'CONTINUE': ['CONTINUE', 'END_STMT']
-        }
-        
-        table['Return'] = {
-            'RETURN': ['RETURN', 'Expresion', 'END_STMT']
-        }
-        
-        # Statement
-        table['Statement'] = {
-            'DECVAR': ['VarDec'],
-            'PRINT': ['Print'],
-            'ID': ['ExpressionStatement'],
-            'METHOD': ['Method'],
-            'IF': ['Conditions'],
-            'WHILE': ['Loops'],
-            'FOR': ['Loops'],
-            'ARRAY': ['Array_Dec'],
-            'READ': ['Input'],
-            'COMMENT': ['Comment'],
-            'BREAK': ['Break'],
-            'CONTINUE': ['Continue'],
-            'RETURN': ['Return']
-        }
-        
-        # Comentarios
-        table['Comment'] = {
-            'COMMENT': ['COMMENT']
-        }
-        
-        return table
+    def _accepts(self, symbol: Optional[int], kind: int) -> bool:
+        """El símbolo de la pila puede continuar con el token"""
+        if symbol is None:
+            return False
+        encoded = self.encoded_table
+        if symbol < encoded.terminal_count:
+            return symbol == kind
+        return encoded.table[symbol * encoded.terminal_count + kind] >= 0
+
+    def _use_default(self, symbol: int, following: Optional[int], kind: int) -> bool:
+        """
+        Un no terminal sin producción para el token toma su producción vacía
+        (y el error se reporta más adelante) si lo que sigue en la pila puede
+        continuar con el token, o es un terminal que se dará por insertado.
+        Una lista de sentencias seguida de "}" o de FINISH no se cierra: se
+        sincroniza y sigue.
+        """
+        if self.default_productions[symbol] < 0:
+            return False
+        if following is None or self._accepts(following, kind):
+            return True
+        return following < self.encoded_table.terminal_count and self.reentries[following] != symbol
+
+    def _resume(self, symbol: int, kind: int) -> Tuple[int, ...]:
+        """
+        Símbolos a apilar después de sincronizar un no terminal: él mismo si
+        puede continuar con el token, él y la lista anterior si el token
+        vuelve a entrar en ella, o nada (se abandona)
+        """
+        encoded = self.encoded_table
+        if encoded.table[symbol * encoded.terminal_count + kind] >= 0:
+            return (symbol,)
+        reentry = self.reentries[symbol]
+        if reentry >= 0:
+            production = encoded.table[reentry * encoded.terminal_count + kind]
+            if production >= 0 and encoded.productions[production]:
+                return symbol, reentry
+        return ()
+
+    def _recover_terminal(self, expected: int, following: Optional[int], current: int, kind: int) -> Tuple[int, int]:
+        """
+        Un terminal no coincide. Si el símbolo siguiente de la pila puede
+        continuar con el token, el terminal se da por insertado; si no, se
+        descarta un token (y si el que sigue es el esperado, coincide).
+        Devuelve la posición y el tipo del token donde quedó.
+        """
+        if kind != END_OF_INPUT and not self._accepts(following, kind):
+            current += 1
+            kind = next(self._kinds, END_OF_INPUT)
+        return current, kind
+
+    def _report(self, code: str, symbol: int, current: int):
+        """Registra un error; si ya se registraron max_errors, detiene el análisis"""
+        token = self._token_at(current)
+        if self.max_errors is not None and len(self.diagnostics) >= self.max_errors:
+            self.current = current
+            raise SyntaxError(f"Too many errors, stopped after {self.max_errors}", token.line)
+        self.diagnostics.append(Diagnostic(code, self.encoded_table.symbol_names[symbol],
+                                           self.expected_types[symbol], token.type, current, token))
+
+    def instrument(self, profile):
+        """
+        Perfilado opcional: con un ParseProfile (ver profiler.py), los
+        análisis de este parser pasan por un ciclo instrumentado que lo va
+        llenando; con None se vuelve al ciclo normal. El ciclo normal no se
+        toca, así que un parser sin perfil no paga nada por esto.
+        """
+        self.__dict__.pop('_parse_non_terminal', None)
+        self.__dict__.pop('_parse_tree', None)
+        self.profile = profile
+        if profile is not None:
+            from profiler import instrumented_parse
+            self._parse_non_terminal = partial(instrumented_parse, self, profile)
+            self._parse_tree = partial(instrumented_parse, self, profile)
+        return profile
+
+    def _load_grammar(self):
+        """
+        Obtiene la gramática compilada a partir de Gramatica.ebnf. El
+        compilador la guarda en disco y en memoria, así que construir un
+        Parser no vuelve a calcular FIRST/FOLLOW ni la tabla.
+        """
+        from grammar import load_grammar
+        return load_grammar()
+
+    def _expression_grammar(self) -> Optional[_ExpressionGrammar]:
+        """
+        Reconoce en la tabla la forma de las expresiones, para recorrerlas
+        con un ciclo propio. None si la gramática no tiene esa forma (las
+        expresiones se analizan entonces con la tabla, como todo lo demás).
+        """
+        encoded = self.encoded_table
+        terminal_count = encoded.terminal_count
+        symbol_ids = encoded.symbol_ids
+        if not {'Expresion', 'Factor', 'ExprTail'} <= symbol_ids.keys():
+            return None
+        expression, factor, tail = symbol_ids['Expresion'], symbol_ids['Factor'], symbol_ids['ExprTail']
+
+        def row(symbol: int) -> Dict[int, Tuple[int, ...]]:
+            cells = encoded.table[symbol * terminal_count:(symbol + 1) * terminal_count]
+            return {kind: encoded.productions[production] for kind, production in enumerate(cells)
+                    if production >= 0}
+
+        # Las producciones están invertidas: el primer elemento es el último símbolo
+        if any(body != (tail, factor) for body in row(expression).values()):
+            return None
+        atoms, prefixes, groups = set(), set(), {}
+        for kind, body in row(factor).items():
+            if body == (kind,):
+                atoms.add(kind)
+            elif body == (factor, kind):
+                prefixes.add(kind)
+            elif len(body) == 3 and body[1:] == (expression, kind) and body[0] < terminal_count:
+                groups[kind] = body[0]
+            else:
+                return None
+        operators, ends = set(), set()
+        for kind, body in row(tail).items():
+            if body == (tail, factor, kind):
+                operators.add(kind)
+            elif not body:
+                ends.add(kind)
+            else:
+                return None
+        if len(groups) != 1:
+            return None
+        (open_kind, close_kind), = groups.items()
+        return _ExpressionGrammar(expression, factor, tail, atoms, prefixes, operators, ends,
+                                  open_kind, close_kind)
+
+    def parse(self, tokens: Iterable[Token], build_tree: bool = False) -> bool:
+        """
+        Analiza los tokens usando la tabla de análisis predictivo. Acepta una
+        lista, un TokenBuffer o cualquier iterador (por ejemplo
+        Lexer.iter_tokens): sólo se mantiene un token de anticipación.
+        Con build_tree, el árbol de análisis queda en self.tree.
+        """
+        if self.validate(tokens, build_tree):
+            return True
+        if self.fatal_error is not None:
+            print(self.fatal_error)
+        else:
+            print("\nErrores encontrados durante el análisis:")
+            for error in self.errors:
+                print(error)
+        return False
 
-    def parse(self, tokens: List[Token]) -> bool:
-        """Analiza la lista de tokens usando la tabla de análisis predictivo"""
+    def validate(self, tokens: Iterable[Token], build_tree: bool = False) -> bool:
+        """
+        Igual que parse, pero sin imprimir: los errores quedan en
+        self.diagnostics (self.errors los formatea) y el que detuvo el
+        análisis en self.fatal_error
+        """
         self.tokens = tokens
+        self._kinds, self._token_at = self._token_source(tokens)
         self.current = 0
-        self.current_token = self.tokens[0] if tokens else None
-        self.errors = []  # Reiniciar lista de errores
+        self.current_kind = next(self._kinds, END_OF_INPUT)
+        self.diagnostics = []  # Reiniciar lista de errores
+        self.fatal_error = None
+        self.tree = None
+        tree = ParseTree(self.encoded_table, 'Programa', self.tree_tables) if build_tree else None
         
         try:
-            self._parse_non_terminal('Programa')
-            if self.errors:
-                print("\nErrores encontrados durante el análisis:")
-                for error in self.errors:
-                    print(error)
-                return False
-            return True
+            if tree is None:
+                self._parse_non_terminal('Programa')
+            else:
+                self._parse_tree('Programa', tree)
         except SyntaxError as e:
-            print(e)
-            return False
+            self.fatal_error = e
+        self.tree = tree
+        return self.fatal_error is None and not self.diagnostics
+
+    def _token_source(self, tokens: Iterable[Token]) -> Tuple[Iterator[int], Callable[[int], Optional[Token]]]:
+        """
+        Devuelve un iterador con el tipo entero de cada token y una función
+        que obtiene el Token de una posición. El ciclo del parser sólo usa
+        los tipos; los Token se piden para los mensajes de error.
+        """
+        if isinstance(tokens, TokenBuffer):
+            return iter(tokens.kinds), tokens.__getitem__
+        if isinstance(tokens, list):
+            return map(attrgetter('kind'), tokens), tokens.__getitem__
+        cursor = _TokenCursor(tokens)
+        return cursor.kinds(), cursor.token_at
 
     def _parse_non_terminal(self, non_terminal: str):
-        """Procesa un símbolo no terminal usando la tabla de análisis predictivo"""
-        if self.current_token is None:
-            raise SyntaxError(f"Unexpected end of input while processing {non_terminal}", -1)
-            
-        # Obtener la producción de la tabla
-        token_type = self.current_token.type
-        if non_terminal not in self.parse_table or token_type not in self.parse_table[non_terminal]:
-            error_msg = f"Unexpected token {token_type} while processing {non_terminal}"
-            self.errors.append(f"Error en línea {self.current_token.line}: {error_msg}")
-            
-            # Intentar sincronizar
-            if self._synchronize(non_terminal):
-                return
-            else:
-                raise SyntaxError("Could not synchronize after error", self.current_token.line)
-            
-        # Obtener y procesar la producción
-        production = self.parse_table[non_terminal][token_type]
-        for symbol in production:
-            if symbol == 'ε':  # Epsilon production
+        """
+        Procesa un símbolo no terminal usando la tabla de análisis predictivo.
+        Usa una pila explícita de símbolos en lugar de recursión, de modo que
+        la profundidad de la pila de Python es constante sin importar cuántas
+        sentencias o bloques anidados tenga el programa. Los símbolos son
+        enteros: los menores que terminal_count son terminales y el resto
+        índices de fila en la tabla plana.
+        """
+        encoded = self.encoded_table
+        terminal_count = encoded.terminal_count
+        table = encoded.table
+        productions = encoded.productions
+        names = encoded.symbol_names
+
+        kinds = self._kinds
+        end_of_input = END_OF_INPUT
+        current = self.current
+        kind = self.current_kind
+
+        expressions = self.expression_grammar
+        expression = expressions.expression if expressions is not None else -1
+        expression_starts = expressions.starts if expressions is not None else frozenset()
+
+        defaults = self.default_productions
+
+        stack = [encoded.symbol_ids[non_terminal]]
+        pop = stack.pop
+        push = stack.extend
+        # Hubo un error y todavía no coincidió ningún terminal: los errores
+        # siguientes son consecuencia del primero y no se registran
+        recovering = False
+
+        while stack:
+            symbol = pop()
+
+            if kind == end_of_input:
+                self.current = current
+                if symbol < terminal_count:
+                    raise SyntaxError(f"Unexpected end of input, expected {names[symbol]}", -1)
+                raise SyntaxError(f"Unexpected end of input while processing {names[symbol]}", -1)
+
+            if symbol < terminal_count:  # Terminal
+                if symbol != kind:
+                    if not recovering:
+                        self._report(Diagnostic.MISMATCH, symbol, current)
+                        recovering = True
+                    current, kind = self._recover_terminal(symbol, stack[-1] if stack else None, current, kind)
+                    if symbol != kind:
+                        continue  # Se da por insertado el terminal que falta
+                current += 1
+                kind = next(kinds, end_of_input)
+                recovering = False
                 continue
-            elif symbol in self.parse_table:  # No terminal
-                self._parse_non_terminal(symbol)
-            else:  # Terminal
-                self._match(symbol)
-
-    def _match(self, expected: str):
-        """Compara el token actual con el esperado"""
-        if self.current_token is None:
-            raise SyntaxError(f"Unexpected end of input, expected {expected}", -1)
-            
-        if self.current_token.type == expected:
-            self.current += 1
-            self.current_token = self.tokens[self.current] if self.current < len(self.tokens) else None
+
+            if symbol == expression and kind in expression_starts:
+                current, kind, pending = self._skip_expression(current, kind)
+                push(pending)
+                recovering = False
+                continue
+
+            production = table[symbol * terminal_count + kind]
+            if production >= 0:
+                push(productions[production])
+                continue
+
+            # No hay producción. Si el no terminal puede ser vacío, se toma
+            # esa producción y el error se reporta en el próximo terminal
+            if defaults[symbol] >= 0 and self._use_default(symbol, stack[-1] if stack else None, kind):
+                continue
+            # Si no, registrar el error y sincronizar
+            if not recovering:
+                self._report(Diagnostic.UNEXPECTED_TOKEN, symbol, current)
+                recovering = True
+            self.current, self.current_kind = current, kind
+            if not self._synchronize(symbol):
+                raise SyntaxError("Could not synchronize after error", -1)
+            current, kind = self.current, self.current_kind
+            push(self._resume(symbol, kind))
+
+        self.current, self.current_kind = current, kind
+
+    def _skip_expression(self, current: int, kind: int) -> Tuple[int, int, List[int]]:
+        """
+        Recorre una expresión sin pasar por la tabla: alterna entre esperar
+        un operando (con prefijos y paréntesis) y esperar un operador, con
+        un contador de paréntesis abiertos en lugar de pila. Es lo mismo que
+        harían Expresion, Factor y ExprTail, sin apilar tres símbolos por
+        operador. Ante cualquier token que no siga ese camino devuelve los
+        símbolos que la tabla tendría en la pila en ese punto, para que el
+        ciclo general reporte el error y se recupere igual que siempre.
+        """
+        expressions = self.expression_grammar
+        atoms = expressions.atoms
+        prefixes = expressions.prefixes
+        operators = expressions.operators
+        ends = expressions.ends
+        open_kind = expressions.open_kind
+        close_kind = expressions.close_kind
+        kinds = self._kinds
+        end_of_input = END_OF_INPUT
+        depth = 0
+        opened = False  # Se acaba de abrir un paréntesis: la tabla espera Expresion
+
+        while True:
+            # Operando
+            while kind in prefixes:
+                opened = False
+                current += 1
+                kind = next(kinds, end_of_input)
+            if kind == open_kind:
+                depth += 1
+                opened = True
+                current += 1
+                kind = next(kinds, end_of_input)
+                continue
+            if kind not in atoms:
+                if opened:
+                    stack = self._expression_stack(depth - 1)
+                    stack += (expressions.close_kind, expressions.expression)
+                    return current, kind, stack
+                stack = self._expression_stack(depth)
+                stack.append(expressions.factor)
+                return current, kind, stack
+            opened = False
+            current += 1
+            kind = next(kinds, end_of_input)
+
+            # Operador, o cierre de paréntesis
+            while kind not in operators:
+                if depth and kind == close_kind:
+                    depth -= 1
+                    current += 1
+                    kind = next(kinds, end_of_input)
+                    continue
+                if not depth and kind in ends:
+                    return current, kind, []
+                return current, kind, self._expression_stack(depth)
+            current += 1
+            kind = next(kinds, end_of_input)
+
+    def _expression_stack(self, depth: int) -> List[int]:
+        """Pila equivalente de la tabla después de un operando, dentro de depth paréntesis"""
+        expressions = self.expression_grammar
+        return [expressions.tail] + [expressions.close_kind, expressions.tail] * depth
+
+    def _parse_tree(self, non_terminal: str, tree: ParseTree):
+        """
+        Igual que _parse_non_terminal, pero registra en tree cada expansión
+        no vacía que podría no haberse hecho: la celda de la tabla (no
+        terminal y token) y el token donde empieza. Es todo lo que se hace
+        por nodo; los nodos se arman con el registro cuando se piden (ver
+        ParseTree.replay). Usa la tabla de TreeTables, en la que decidir si
+        se registra es una comparación. Ante el primer error o el fin de la
+        entrada se arma lo registrado hasta ahí y el análisis sigue en
+        _build_tree, que arma los nodos mientras se recupera.
+        """
+        encoded = self.encoded_table
+        terminal_count = encoded.terminal_count
+        tables = self.tree_tables
+        table = tables.table
+        productions = tables.productions
+        recorded = tables.recorded
+        expanded = tables.expanded
+
+        kinds = self._kinds
+        end_of_input = END_OF_INPUT
+        current = self.current
+        kind = self.current_kind
+
+        expressions = self.expression_grammar
+        expression = expressions.expression if expressions is not None else -1
+        expression_starts = expressions.starts if expressions is not None else frozenset()
+
+        add_cell = tree.cells.append
+        add_first = tree.firsts.append
+        add_expression_end = tree.expression_ends.append
+        pending_bodies = tree.pending
+
+        stack = [encoded.symbol_ids[non_terminal]]
+        pop = stack.pop
+        push = stack.extend
+
+        while stack:
+            symbol = pop()
+
+            if kind == end_of_input:
+                break
+
+            if symbol < terminal_count:  # Terminal
+                if symbol != kind:
+                    break
+                current += 1
+                kind = next(kinds, end_of_input)
+                continue
+
+            if symbol == expression and kind in expression_starts:
+                add_cell(~symbol)
+                add_first(current)
+                current, kind, pending = self._skip_expression(current, kind)
+                add_expression_end(current)
+                if pending:
+                    pending_bodies[len(tree.cells) - 1] = tuple(pending)
+                    push(pending)
+                continue
+
+            cell = symbol * terminal_count + kind
+            production = table[cell]
+            if production < recorded:
+                if production < 0:
+                    break
+                add_cell(cell)
+                add_first(current)
+                push(productions[production])
+            elif production < expanded:
+                push(productions[production])
         else:
-            error_msg = f"Expected {expected}, got {self.current_token.type}"
-            self.errors.append(f"Error en línea {self.current_token.line}: {error_msg}")
-            
-            # Intentar sincronizar con el siguiente token válido
-            self.current += 1
-            self.current_token = self.tokens[self.current] if self.current < len(self.tokens) else None
+            self.current, self.current_kind = current, kind
+            return
+
+        # Error: armar los nodos registrados y seguir desde el mismo símbolo
+        stack.append(symbol)
+        self.current, self.current_kind = current, kind
+        marked, open_node = tree.replay(stack, current)
+        self._build_tree(marked, open_node, tree)
+
+    def _build_tree(self, stack: List[int], open_node: int, tree: ParseTree):
+        """
+        Sigue el análisis de _parse_tree desde la pila que dejó
+        ParseTree.replay, armando los nodos a medida: agrega el nodo de cada
+        no terminal que se expande en una producción no vacía y apila debajo
+        del cuerpo una marca (~nodo) que al sacarse lo cierra. El último
+        símbolo de una lista se apila como continuación (ver
+        tree.production_bodies) y no abre otro. Es el camino de la
+        recuperación de errores, así que no necesita ser tan rápido.
+        """
+        encoded = self.encoded_table
+        terminal_count = encoded.terminal_count
+        table = encoded.table
+        bodies = self.tree_tables.bodies
+        names = encoded.symbol_names
+        continuation = len(names)
+
+        kinds = self._kinds
+        end_of_input = END_OF_INPUT
+        current = self.current
+        kind = self.current_kind
+
+        expressions = self.expression_grammar
+        expression = expressions.expression if expressions is not None else -1
+        expression_starts = expressions.starts if expressions is not None else frozenset()
+
+        defaults = self.default_productions
+        symbols, parents, token_ends, subtree_ends = tree.symbols, tree.parents, tree.token_ends, tree.subtree_ends
+        add_symbol = symbols.append
+        add_parent = parents.append
+        add_first = tree.first_tokens.append
+        add_end = token_ends.append
+        add_subtree_end = subtree_ends.append
+        count = len(symbols)
+
+        pop = stack.pop
+        push = stack.extend
+        append = stack.append
+        recovering = False
+        listed = False  # El no terminal sin producción era la cola de una lista
+
+        try:
+            while stack:
+                symbol = pop()
+
+                if symbol < 0:  # Marca: se terminó la producción de un nodo
+                    node = ~symbol
+                    token_ends[node] = current
+                    subtree_ends[node] = count
+                    open_node = parents[node]
+                    continue
+
+                if kind == end_of_input:
+                    self.current = current
+                    if symbol < terminal_count:
+                        raise SyntaxError(f"Unexpected end of input, expected {names[symbol]}", -1)
+                    raise SyntaxError(f"Unexpected end of input while processing {names[symbol % continuation]}",
+                                      -1)
+
+                if symbol < terminal_count:  # Terminal
+                    if symbol != kind:
+                        if not recovering:
+                            self._report(Diagnostic.MISMATCH, symbol, current)
+                            recovering = True
+                        current, kind = self._recover_terminal(symbol, self._following(stack), current, kind)
+                        if symbol != kind:
+                            continue
+                    current += 1
+                    kind = next(kinds, end_of_input)
+                    recovering = False
+                    continue
+
+                if symbol >= continuation:  # Cola de una lista: sigue en el nodo abierto
+                    symbol -= continuation
+                    production = table[symbol * terminal_count + kind]
+                    if production >= 0:
+                        push(bodies[production])
+                        continue
+                    listed = True  # Si se retoma, sigue en el mismo nodo
+                elif symbol == expression and kind in expression_starts:
+                    add_symbol(symbol)
+                    add_parent(open_node)
+                    add_first(current)
+                    current, kind, pending = self._skip_expression(current, kind)
+                    recovering = False
+                    if pending:  # Lo que falta pasa por la tabla, con sus nodos como hijos
+                        add_end(0)
+                        add_subtree_end(0)
+                        append(~count)
+                        push(pending)
+                        open_node = count
+                        count += 1
+                    else:
+                        count += 1
+                        add_end(current)
+                        add_subtree_end(count)
+                    continue
+                else:
+                    production = table[symbol * terminal_count + kind]
+                    if production >= 0:
+                        body = bodies[production]
+                        if body:
+                            add_symbol(symbol)
+                            add_parent(open_node)
+                            add_first(current)
+                            add_end(0)
+                            add_subtree_end(0)
+                            append(~count)
+                            push(body)
+                            open_node = count
+                            count += 1
+                        continue
+
+                # No hay producción: producción vacía por defecto, o error y sincronización
+                retaken, listed = listed, False
+                if defaults[symbol] >= 0 and self._use_default(symbol, self._following(stack), kind):
+                    continue
+                if not recovering:
+                    self._report(Diagnostic.UNEXPECTED_TOKEN, symbol, current)
+                    recovering = True
+                self.current, self.current_kind = current, kind
+                if not self._synchronize(symbol):
+                    raise SyntaxError("Could not synchronize after error", -1)
+                current, kind = self.current, self.current_kind
+                resumed = self._resume(symbol, kind)
+                if retaken and resumed:
+                    resumed = (resumed[0] + continuation,) + resumed[1:]
+                push(resumed)
+        finally:
+            # Si el análisis se detuvo, cerrar los nodos abiertos hasta donde llegó
+            while open_node >= 0:
+                token_ends[open_node] = current
+                subtree_ends[open_node] = count
+                open_node = parents[open_node]
+
+        self.current, self.current_kind = current, kind
+
+    def _following(self, stack: List[int]) -> Optional[int]:
+        """Símbolo de la pila de _build_tree que sigue, sin marcas ni continuaciones"""
+        continuation = len(self.encoded_table.symbol_names)
+        for symbol in reversed(stack):
+            if symbol >= 0:
+                return symbol - continuation if symbol >= continuation else symbol
+        return None
+
 
 def test_parser():
     lexer = Lexer()
@@ -0,0 +1,318 @@
+"""
+Análisis sintáctico en paralelo de un único programa muy grande.
+
+El parser LL(1) recorre los tokens en orden, así que un programa de varios
+MB ocupa un solo núcleo. Pero en el nivel superior un programa es
+START CODE FINISH y CODE es una lista de sentencias: cada sentencia del
+nivel superior se analiza igual sin importar lo que vino antes. Esto
+permite cortar el programa en partes y analizarlas a la vez:
+
+1. Un recorrido barato sobre los tipos de token busca, cerca de divisiones
+   en partes iguales, límites de sentencias del nivel superior: fuera de
+   llaves, después de un token que cierra una sentencia (":3",
+   "EndDecinter", un comentario o "}" sin "Sinointer" detrás) y antes de
+   uno que puede empezarla. Los paréntesis no hace falta seguirlos: dentro
+   de ellos (la cabecera de un Forinter) a un ":3" o "EndDecinter" siempre
+   le sigue ";" o ")". La profundidad en cada división se cuenta en C con
+   bytes.count; sólo el tramo hasta el límite se recorre en Python.
+2. Los tipos de token se copian una vez a memoria compartida
+   (multiprocessing.shared_memory); cada proceso del pool lee de ahí su
+   parte sin que se serialicen los tokens.
+3. Cada parte se analiza como un programa completo: se le agregan un
+   START y un FINISH sintéticos (salvo a la primera y a la última, que ya
+   los tienen). Los errores vuelven como (código, símbolo, posición) y se
+   trasladan a posiciones del programa entero.
+
+Una parte sin errores que termina justo en su corte deja al parser en el
+mismo estado que el análisis en serie en ese punto (la lista de sentencias
+del nivel superior, sin recuperarse de nada), así que todo hasta la
+primera parte con un error coincide con el análisis en serie. Desde esa
+parte en adelante, la recuperación depende de lo anterior y el límite de
+max_errors de todos los errores: ese tramo se vuelve a analizar en serie
+en este proceso, empezando en el mismo estado. El resultado es siempre
+exactamente el del parser en serie; con errores, sólo se gana tiempo en
+las partes anteriores al primero.
+
+Uso: python parallel.py programa.txt [-j PROCESOS] [--compare]
+"""
+import argparse
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Sequence, Tuple
+
+from main import (DEFAULT_MAX_ERRORS, TOKEN_KINDS, TOKEN_TYPES, Diagnostic, InvalidCharacterError, Lexer,
+                  Parser, SyntaxError, Token, TokenBuffer)
+
+START_KIND = TOKEN_KINDS['START_PROG']
+FINISH_KIND = TOKEN_KINDS['END_PROG']
+ELSE_KIND = TOKEN_KINDS['ELSE']
+OPEN_KIND = TOKEN_KINDS['LBRACE']
+CLOSE_KIND = TOKEN_KINDS['RBRACE']
+
+# Tokens con los que termina una sentencia del nivel superior
+STATEMENT_ENDS = frozenset(TOKEN_KINDS[name] for name in ('END_STMT', 'ENDDEC', 'COMMENT', 'RBRACE'))
+
+# Partes por proceso: más partes que procesos reparten mejor la carga
+# cuando unas partes tardan más que otras
+CHUNKS_PER_WORKER = 4
+
+# Tokens mínimos por parte: por debajo, copiar y coordinar cuesta más de
+# lo que se gana
+MIN_CHUNK_TOKENS = 50_000
+
+# Resultado de una parte: errores (código, símbolo, posición), error que
+# detuvo el análisis (mensaje y posición, o None) y tokens consumidos
+ChunkResult = Tuple[List[Tuple[str, int, int]], Optional[Tuple[str, int]], int]
+
+# Parser del proceso del pool
+_parser: Optional[Parser] = None
+
+
+class _KindBuffer(TokenBuffer):
+    """Tokens de una parte: sólo los tipos, que es lo que usa el parser"""
+    def __init__(self, kinds: array):
+        super().__init__('')
+        self.kinds = kinds
+
+    def __getitem__(self, index: int) -> Token:
+        return Token(TOKEN_TYPES[self.kinds[index]], '', -1)
+
+
+def _init_worker(max_errors: Optional[int] = DEFAULT_MAX_ERRORS):
+    global _parser
+    _parser = Parser(max_errors=max_errors)
+
+
+def _parse_part(parser: Parser, part: array, first: bool, last: bool) -> ChunkResult:
+    """Analiza una parte del programa; las posiciones vuelven relativas a su primer token"""
+    kinds = array('B')
+    if not first:
+        kinds.append(START_KIND)
+    kinds.extend(part)
+    if not last:
+        kinds.append(FINISH_KIND)
+
+    shift = 0 if first else 1
+    Parser.validate(parser, _KindBuffer(kinds))
+    symbol_ids = parser.encoded_table.symbol_ids
+    errors = [(diagnostic.code, symbol_ids[diagnostic.symbol], diagnostic.position - shift)
+              for diagnostic in parser.diagnostics]
+    fatal = None
+    if parser.fatal_error is not None:
+        fatal = (parser.fatal_error.message, parser.current - shift)
+    return errors, fatal, parser.current - shift
+
+
+def _parse_chunk(name: str, start: int, end: int, first: bool, last: bool) -> ChunkResult:
+    """Analiza en un proceso del pool los tokens [start, end) del bloque compartido"""
+    # El proceso principal crea y borra el bloque; aquí sólo se copia la parte
+    memory = SharedMemory(name)
+    try:
+        part = array('B', memory.buf[start:end])
+    finally:
+        memory.close()
+    return _parse_part(_parser, part, first, last)
+
+
+def statement_boundaries(kinds: bytes, count: int, statement_starts: Sequence[bool],
+                         min_length: int = 1) -> List[int]:
+    """
+    Hasta count - 1 posiciones, en orden, de tokens que empiezan una
+    sentencia del nivel superior, cada una en la primera posible a partir
+    de una división en partes iguales de kinds. statement_starts indica,
+    por tipo de token, si puede empezar una sentencia. Las partes tienen
+    al menos min_length tokens; si en una división no se encuentra un
+    límite antes de la siguiente, esa parte se une con la que sigue.
+    """
+    # Después de un FINISH el parser en serie ya no mira los tokens
+    finish = kinds.find(FINISH_KIND)
+    length = len(kinds) if finish < 0 else finish
+    boundaries: List[int] = []
+    depth = 0
+    counted = 0  # Tokens cuya profundidad ya se sumó
+    for part in range(1, count):
+        target = max(len(kinds) * part // count, (boundaries[-1] if boundaries else 0) + min_length)
+        limit = min(len(kinds) * (part + 1) // count, length)
+        if target >= limit:
+            continue
+        depth += kinds.count(OPEN_KIND, counted, target) - kinds.count(CLOSE_KIND, counted, target)
+        position = target
+        while position < limit:
+            kind = kinds[position]
+            if depth == 0 and statement_starts[kind]:
+                previous = kinds[position - 1]
+                if previous in STATEMENT_ENDS and not (previous == CLOSE_KIND and kind == ELSE_KIND):
+                    boundaries.append(position)
+                    position += 1
+                    break
+            if kind == OPEN_KIND:
+                depth += 1
+            elif kind == CLOSE_KIND:
+                depth -= 1
+            position += 1
+        # El token del límite (que empieza una sentencia) no es una llave
+        counted = position
+    return boundaries
+
+
+class ParallelParser(Parser):
+    """
+    Parser que reparte un TokenBuffer grande entre un pool de procesos.
+    El resultado queda donde lo deja Parser.validate (diagnostics,
+    fatal_error, errors). Los programas pequeños, los que no tienen
+    límites de sentencia donde cortar y los pedidos con árbol se analizan
+    en serie en este proceso. El pool se crea en el primer análisis en
+    paralelo y se cierra con close().
+    """
+    def __init__(self, workers: int = 0, max_errors: Optional[int] = DEFAULT_MAX_ERRORS,
+                 min_chunk_tokens: int = MIN_CHUNK_TOKENS):
+        super().__init__(max_errors)
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chunk_tokens = min_chunk_tokens
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.chunks = 1  # Partes del último análisis (1: en serie)
+
+        encoded = self.encoded_table
+        statement = encoded.symbol_ids['Statement']
+        row = encoded.table[statement * encoded.terminal_count:(statement + 1) * encoded.terminal_count]
+        self.statement_starts = [production >= 0 for production in row] + [False] * (256 - len(row))
+
+    def validate(self, tokens, build_tree: bool = False) -> bool:
+        self.chunks = 1
+        if (build_tree or self.profile is not None or not isinstance(tokens, TokenBuffer)
+                or len(tokens) < 2 * self.min_chunk_tokens):
+            return super().validate(tokens, build_tree)
+
+        kinds = tokens.kinds.tobytes()
+        count = min(self.workers * CHUNKS_PER_WORKER, len(kinds) // self.min_chunk_tokens)
+        boundaries = statement_boundaries(kinds, count, self.statement_starts, self.min_chunk_tokens)
+        if not boundaries:
+            return super().validate(tokens)
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.max_errors,))
+        memory = SharedMemory(create=True, size=len(kinds))
+        try:
+            memory.buf[:len(kinds)] = kinds
+            del kinds
+            edges = [0] + boundaries + [len(tokens)]
+            futures = [self.executor.submit(_parse_chunk, memory.name, start, end, index == 0,
+                                            index == len(boundaries))
+                       for index, (start, end) in enumerate(zip(edges, edges[1:]))]
+            results = [future.result() for future in futures]
+        finally:
+            memory.close()
+            memory.unlink()
+
+        # Las partes valen hasta la primera con un error o que no termina
+        # justo en su corte; desde ella hasta el final se analiza aquí de
+        # una vez (la última parte ya se analizó desde el estado correcto)
+        for index, (errors, fatal, consumed) in enumerate(results[:-1]):
+            if errors or fatal is not None or consumed != edges[index + 1] - edges[index] + 1:
+                if index == 0:
+                    return super().validate(tokens)
+                results[index:] = [_parse_part(self, tokens.kinds[edges[index]:], False, True)]
+                edges[index + 1:] = [len(tokens)]
+                break
+
+        self.chunks = len(results)
+        self._merge(tokens, edges, results)
+        return self.fatal_error is None and not self.diagnostics
+
+    def _merge(self, tokens: TokenBuffer, edges: List[int], results: List[ChunkResult]):
+        """
+        Une los errores de las partes en orden, como si vinieran de un solo
+        análisis. Sólo la última parte puede tener errores, así que el
+        límite de max_errors de su parser es el del total.
+        """
+        self.tokens = tokens
+        self.tree = None
+        self.diagnostics = []
+        self.fatal_error = None
+        names = self.encoded_table.symbol_names
+        for start, (errors, fatal, consumed) in zip(edges, results):
+            for code, symbol, position in errors:
+                position += start
+                token = tokens[position]
+                self.diagnostics.append(Diagnostic(code, names[symbol], self.expected_types[symbol],
+                                                   token.type, position, token))
+            if fatal is not None:
+                message, position = fatal
+                if message.startswith("Too many errors"):
+                    self._stop(tokens, start + position)
+                else:
+                    self.current = start + position
+                    self.fatal_error = SyntaxError(message, -1)
+                return
+            self.current = start + consumed
+
+    def _stop(self, tokens: TokenBuffer, position: int):
+        self.current = position
+        self.fatal_error = SyntaxError(f"Too many errors, stopped after {self.max_errors}",
+                                       tokens.line(position))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self) -> 'ParallelParser':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Análisis sintáctico en paralelo de un programa grande")
+    arguments.add_argument('path', help="programa a analizar")
+    arguments.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="procesos a usar")
+    arguments.add_argument('--max-errors', type=int, default=DEFAULT_MAX_ERRORS, metavar='N',
+                           help=f"errores a registrar (por defecto {DEFAULT_MAX_ERRORS}, 0 sin límite)")
+    arguments.add_argument('--compare', action='store_true',
+                           help="analizar también en serie, comparar los resultados y los tiempos")
+    options = arguments.parse_args(argv[1:])
+
+    with open(options.path, encoding='utf-8') as file:
+        source = file.read()
+    try:
+        tokens = Lexer().tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        print(e)
+        return 1
+
+    with ParallelParser(options.jobs, options.max_errors or None) as parser:
+        # El primer análisis en paralelo crea el pool; se mide el segundo
+        parser.validate(tokens)
+        started = time.perf_counter()
+        valid = parser.validate(tokens)
+        elapsed = time.perf_counter() - started
+        errors = parser.errors
+        fatal = parser.fatal_error
+        print(f"{len(tokens)} tokens en {parser.chunks} partes con {parser.workers} procesos: "
+              f"{elapsed * 1000:.1f} ms")
+        for error in errors:
+            print(error)
+        if fatal is not None:
+            print(fatal)
+        print("Programa válido" if valid else f"Programa inválido ({len(errors)} errores)")
+
+        if options.compare:
+            serial = Parser(options.max_errors or None)
+            started = time.perf_counter()
+            serial_valid = serial.validate(tokens)
+            serial_elapsed = time.perf_counter() - started
+            same = (serial_valid == valid and serial.errors == errors
+                    and str(serial.fatal_error) == str(fatal))
+            print(f"En serie: {serial_elapsed * 1000:.1f} ms ({serial_elapsed / elapsed:.2f}x), "
+                  f"{'mismo resultado' if same else 'resultado distinto'}")
+    return 0 if valid else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,348 @@
+"""
+Generador de parsers.
+
+Convierte la tabla LL(1) de la gramática compilada (grammar.py) en un
+módulo de Python independiente, con una función por no terminal y la
+elección de producción escrita como una cadena de if sobre el tipo entero
+del token, sin tabla ni pila de símbolos:
+
+- Los no terminales cuyas producciones terminan en sí mismos (CODE,
+  RestVarList, ExprTail, RestParams, Factor con sus prefijos) son un ciclo
+  while en lugar de recursión.
+- Los demás no terminales (Statement, Conditions, Block, Factor...) se
+  copian en quien los usa: sólo son funciones el inicial y uno por cada
+  ciclo de la gramática (CODE, Expresion), así que cada bloque o paréntesis
+  anidado usa un único nivel de la pila de Python.
+- Los terminales que la elección de producción ya comprobó no se vuelven a
+  comparar, y los terminales seguidos se comparan con un desplazamiento
+  fijo (k[i + 2]) avanzando la posición una sola vez.
+
+El módulo generado sólo reconoce programas válidos: accepts(kinds) devuelve
+dónde terminó el programa, o -1 ante el primer error. GeneratedParser lo usa
+para validar y, si hay errores, vuelve a analizar con Parser, de modo que
+los diagnósticos, la recuperación y el veredicto son exactamente los mismos
+que los de Parser.validate.
+
+Uso: python parsergen.py [-o ARCHIVO]
+"""
+import argparse
+import sys
+from itertools import islice
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from grammar import CompiledGrammar, load_grammar
+from main import DEFAULT_MAX_ERRORS, END_OF_INPUT, Parser, Token, TokenBuffer
+
+# Se incrementa cuando cambia el código generado
+GENERATOR_VERSION = 1
+
+# Tipo que marca el final de los tokens en el módulo generado (ningún token lo usa)
+END_KIND = 255
+
+
+class _Generator:
+    def __init__(self, compiled: CompiledGrammar):
+        encoded = compiled.encoded
+        self.compiled = compiled
+        self.names = encoded.symbol_names
+        self.terminal_count = encoded.terminal_count
+        if self.terminal_count > END_KIND:
+            raise ValueError(f"Too many token types for the generated parser: {self.terminal_count}")
+        self.start = encoded.symbol_ids[compiled.start]
+
+        # Producciones de cada no terminal, en el orden de la gramática, con
+        # los tipos de token que las eligen
+        self.rows: Dict[int, List[Tuple[Tuple[int, ...], FrozenSet[int]]]] = {}
+        for symbol in range(self.terminal_count, len(self.names)):
+            cells = encoded.table[symbol * self.terminal_count:(symbol + 1) * self.terminal_count]
+            kinds: Dict[int, Set[int]] = {}
+            for kind, production in enumerate(cells):
+                if production >= 0:
+                    kinds.setdefault(production, set()).add(kind)
+            # Las producciones codificadas están invertidas
+            self.rows[symbol] = [(tuple(reversed(encoded.productions[production])), frozenset(chosen))
+                                 for production, chosen in sorted(kinds.items())]
+
+        self.nullable: Set[int] = set()
+        changed = True
+        while changed:
+            changed = False
+            for symbol, row in self.rows.items():
+                if symbol not in self.nullable and any(all(used in self.nullable for used in body)
+                                                       for body, _ in row):
+                    self.nullable.add(symbol)
+                    changed = True
+        self.loops = {symbol for symbol, row in self.rows.items()
+                      if any(body and body[-1] == symbol for body, _ in row)}
+        self.functions = self._functions()
+        self.lines: List[str] = []
+
+    def _references(self, symbol: int) -> List[int]:
+        """No terminales que usa un no terminal (sin su llamada final si es un ciclo)"""
+        used = []
+        for body, _ in self.rows[symbol]:
+            if body and body[-1] == symbol:
+                body = body[:-1]
+            used.extend(used_symbol for used_symbol in body if used_symbol >= self.terminal_count)
+        return used
+
+    def _functions(self) -> List[int]:
+        """
+        No terminales que se generan como función; el resto se copia donde
+        se usa. Recorriendo desde el inicial, un no terminal es función sólo
+        si vuelve a sí mismo sin pasar por otra función (CODE, Expresion):
+        así cada ciclo de la gramática tiene una y copiar los demás termina
+        """
+        reachable = [self.start]
+        for symbol in reachable:
+            reachable.extend(used for used in self._references(symbol) if used not in reachable)
+
+        functions = [self.start]
+
+        def in_cycle(symbol: int) -> bool:
+            seen, pending = set(), list(self._references(symbol))
+            while pending:
+                current = pending.pop()
+                if current == symbol:
+                    return True
+                if current not in seen and current not in functions:
+                    seen.add(current)
+                    pending.extend(self._references(current))
+            return False
+
+        for symbol in reachable[1:]:
+            if in_cycle(symbol):
+                functions.append(symbol)
+        return functions
+
+    @staticmethod
+    def _condition(kinds: Iterable[int]) -> str:
+        kinds = sorted(kinds)
+        if len(kinds) == 1:
+            return f"t == {kinds[0]}"
+        return f"t in {{{', '.join(map(str, kinds))}}}"
+
+    def _emit(self, indent: int, text: str):
+        self.lines.append('    ' * indent + text)
+
+    def _flush(self, indent: int, offset: int) -> int:
+        """Avanza la posición por los terminales ya comparados"""
+        if offset:
+            self._emit(indent, f"i += {offset}")
+        return 0
+
+    def _sequence(self, body: Iterable[int], known: Optional[FrozenSet[int]], indent: int, active: Tuple[int, ...]):
+        """
+        Código de una secuencia de símbolos. known son los tipos posibles
+        del token actual, si la elección de producción ya los comprobó
+        """
+        offset = 0
+        emitted = False
+        for symbol in body:
+            emitted = True
+            if symbol < self.terminal_count:
+                if known != frozenset((symbol,)):
+                    index = f"i + {offset}" if offset else "i"
+                    self._emit(indent, f"if k[{index}] != {symbol}:  # {self.names[symbol]}")
+                    self._emit(indent + 1, "raise _ERROR")
+                offset += 1
+            else:
+                offset = self._flush(indent, offset)
+                if symbol in self.functions:
+                    self._emit(indent, f"i = _{self.names[symbol]}(k, i)")
+                else:
+                    self._non_terminal(symbol, known if offset == 0 and known is not None else None,
+                                       indent, active)
+            known = None
+        self._flush(indent, offset)
+        if not emitted:
+            self._emit(indent, "pass")
+
+    def _branches(self, symbol: int, row, known: Optional[FrozenSet[int]], indent: int,
+                  active: Tuple[int, ...]):
+        """
+        Elección entre las producciones de row según el token actual (ya en
+        t). Las producciones que generan el mismo código comparten la rama
+        (los tres operadores de ExprTail), y si known garantiza que el
+        token elige alguna, la última rama es un else
+        """
+        branches: List[Tuple[Set[int], List[str]]] = []
+        for body, kinds in sorted(row, key=lambda production: not production[0]):
+            if known is not None:
+                kinds = kinds & known
+                if not kinds:
+                    continue
+            lines, self.lines = self.lines, []
+            if body and body[-1] == symbol:  # Otra vuelta del ciclo
+                self._sequence(body[:-1], kinds, indent + 1, active)
+            elif symbol in self.loops:
+                if body:
+                    self._sequence(body, kinds, indent + 1, active)
+                self._emit(indent + 1, "break")
+            else:
+                self._sequence(body, kinds, indent + 1, active)
+            lines, self.lines = self.lines, lines
+            for chosen, code in branches:
+                if code == lines:
+                    chosen.update(kinds)
+                    break
+            else:
+                branches.append((set(kinds), lines))
+
+        exhaustive = known is not None and known <= set().union(*(kinds for kinds, _ in branches))
+        if exhaustive and len(branches) == 1:
+            self.lines.extend(line[4:] for line in branches[0][1])
+            return
+        for number, (kinds, code) in enumerate(branches):
+            if exhaustive and number == len(branches) - 1:
+                self._emit(indent, "else:")
+            else:
+                self._emit(indent, f"{'elif' if number else 'if'} {self._condition(kinds)}:")
+            self.lines.extend(code)
+        if not exhaustive:
+            self._emit(indent, "else:")
+            self._emit(indent + 1, "raise _ERROR")
+
+    def _non_terminal(self, symbol: int, known: Optional[FrozenSet[int]], indent: int,
+                      active: Tuple[int, ...] = ()):
+        """Código de un no terminal: la elección de su producción y su cuerpo"""
+        if symbol in active:
+            raise ValueError(f"Cannot inline recursive non-terminal {self.names[symbol]}")
+        active += (symbol,)
+        name = self.names[symbol]
+        row = self.rows[symbol]
+
+        if symbol in self.loops:
+            self._emit(indent, f"while True:  # {name}")
+            self._emit(indent + 1, "t = k[i]")
+            self._branches(symbol, row, None, indent + 1, active)
+            return
+
+        if known is not None:
+            for body, kinds in row:
+                if known <= kinds:
+                    self._sequence(body, known, indent, active)
+                    return
+        if len(row) == 1:
+            body = row[0][0]
+            if not body:
+                return  # Sólo ε: no hay nada que comparar
+            if body[0] not in self.nullable:
+                # El primer símbolo ya compara el token con lo que elige la producción
+                self._sequence(body, known, indent, active)
+                return
+        if known is None:
+            self._emit(indent, f"t = k[i]  # {name}")
+        self._branches(symbol, row, known, indent, active)
+
+    def module(self) -> str:
+        self._emit(0, f'"""Parser generado por parsergen.py a partir de la gramática {self.compiled.grammar_hash[:16]}; no editar"""')
+        self._emit(0, "")
+        self._emit(0, f"GRAMMAR_HASH = {self.compiled.grammar_hash!r}")
+        self._emit(0, f"GENERATOR_VERSION = {GENERATOR_VERSION}")
+        self._emit(0, f"END_KIND = {END_KIND}")
+        self._emit(0, "")
+        self._emit(0, "# Tipos de token")
+        for kind in range(self.terminal_count):
+            self._emit(0, f"# {kind:3d} {self.names[kind]}")
+        self._emit(0, "")
+        self._emit(0, "")
+        self._emit(0, "class ParseError(Exception):")
+        self._emit(1, '"""El programa no es válido (el error lo describe Parser)"""')
+        self._emit(0, "")
+        self._emit(0, "")
+        self._emit(0, "_ERROR = ParseError()")
+        for symbol in self.functions:
+            self._emit(0, "")
+            self._emit(0, "")
+            self._emit(0, f"def _{self.names[symbol]}(k, i):")
+            self._non_terminal(symbol, None, 1)
+            self._emit(1, "return i")
+        self._emit(0, "")
+        self._emit(0, "")
+        self._emit(0, "def accepts(kinds) -> int:")
+        self._emit(1, '"""')
+        self._emit(1, "Recorre los tipos de token (bytes, array('B') o lista de enteros) y")
+        self._emit(1, "devuelve la posición del token donde terminó el programa, o -1 si")
+        self._emit(1, "no es válido o anida más de lo que permite la pila de Python")
+        self._emit(1, '"""')
+        self._emit(1, "k = bytes(kinds) + bytes((END_KIND,))")
+        self._emit(1, "try:")
+        self._emit(2, f"return _{self.names[self.start]}(k, 0)")
+        self._emit(1, "except (ParseError, RecursionError):")
+        self._emit(2, "return -1")
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate_parser(compiled: CompiledGrammar) -> str:
+    """Código fuente del módulo de un parser generado para la gramática"""
+    return _Generator(compiled).module()
+
+
+# Módulos ya generados en este proceso, por hash de la gramática
+_generated: Dict[str, Dict] = {}
+
+
+def load_generated_parser(compiled: CompiledGrammar) -> Dict:
+    """Espacio de nombres del parser generado (se genera una vez por proceso)"""
+    namespace = _generated.get(compiled.grammar_hash)
+    if namespace is None:
+        namespace = {'__name__': 'generated_parser'}
+        exec(compile(generate_parser(compiled), f"<generated parser {compiled.grammar_hash[:16]}>", 'exec'),
+             namespace)
+        _generated[compiled.grammar_hash] = namespace
+    return namespace
+
+
+class GeneratedParser(Parser):
+    """
+    Parser que valida con el módulo generado. Si el programa tiene errores,
+    o si se pide el árbol o hay un perfil, vuelve a Parser.validate: los
+    resultados son siempre los de Parser. Acepta listas de Token y
+    TokenBuffer; otros iteradores van directamente a Parser.
+    """
+    def __init__(self, max_errors: Optional[int] = DEFAULT_MAX_ERRORS):
+        super().__init__(max_errors)
+        self.accepts = load_generated_parser(self.grammar)['accepts']
+
+    def validate(self, tokens: Iterable[Token], build_tree: bool = False) -> bool:
+        if build_tree or self.profile is not None:
+            return super().validate(tokens, build_tree)
+        if isinstance(tokens, TokenBuffer):
+            kinds = tokens.kinds
+        elif isinstance(tokens, list):
+            kinds = bytes(token.kind for token in tokens)
+        else:
+            return super().validate(tokens, build_tree)
+
+        end = self.accepts(kinds)
+        if end < 0:
+            return super().validate(tokens, build_tree)
+        # El mismo estado que deja Parser.validate después de un análisis sin errores
+        self.tokens = tokens
+        _, self._token_at = self._token_source(tokens)
+        self._kinds = islice(kinds, end + 1, None)
+        self.current = end
+        self.current_kind = kinds[end] if end < len(kinds) else END_OF_INPUT
+        self.diagnostics = []
+        self.fatal_error = None
+        self.tree = None
+        return True
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Genera un módulo de Python con el parser de la gramática")
+    arguments.add_argument('-o', '--output', metavar='ARCHIVO', help="archivo de salida (por defecto stdout)")
+    options = arguments.parse_args(argv[1:])
+
+    source = generate_parser(load_grammar())
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            output.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,363 @@
+"""
+Perfilado del parser.
+
+Parser.instrument(profile) reemplaza, sólo en esa instancia, los ciclos de
+análisis por instrumented_parse, una copia instrumentada del ciclo. El
+ciclo normal no tiene ningún chequeo de más, así que un parser sin perfil
+no paga nada.
+
+El perfil acumula, a lo largo de uno o más análisis:
+
+- expansiones de cada no terminal y de cada producción
+- terminales que coincidieron y que no (insertados o con un token descartado)
+- producciones vacías tomadas por defecto ante un error
+- sincronizaciones en modo pánico y tokens descartados por cada una
+- tiempo de cada no terminal: inclusivo (desde que se expande hasta que
+  termina su producción) y propio (sin el de sus hijos), y tiempo propio
+  por producción
+
+Las listas recursivas por la derecha (CODE → Statement CODE) cuentan como
+un solo marco, igual que en el árbol de análisis. El tiempo propio se
+acumula también por pila de no terminales activos, y folded() lo exporta
+como pilas plegadas ("Programa;CODE;Statement 1234", en nanosegundos), el
+formato que leen flamegraph.pl, inferno o speedscope.
+
+Opcionalmente, cada evento se entrega a un sumidero de trazas: una función
+que recibe una tupla (evento, símbolo, posición del token), por ejemplo el
+append de un deque acotado (ver ParseProfile.ring_buffer). Los eventos son
+'expand', 'match', 'mismatch', 'default' y 'sync'.
+
+Uso: python profiler.py [archivo] [--shape FORMA --size TOKENS] [--folded RUTA] [--top N]
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from main import END_OF_INPUT, Diagnostic, InvalidCharacterError, Lexer, Parser, SyntaxError
+from tree import ParseTree
+
+TraceEvent = Tuple[str, str, int]
+
+
+class ParseProfile:
+    def __init__(self, trace: Optional[Callable[[TraceEvent], None]] = None):
+        self.trace = trace  # Sumidero de eventos, o None
+        self.encoded = None  # Tabla codificada del parser, al primer análisis
+        self.reset()
+
+    def reset(self):
+        """Descarta lo acumulado"""
+        size = len(self.encoded.symbol_names) if self.encoded is not None else 0
+        self.parses = 0
+        self.parse_ns = 0
+        self.expansions = [0] * size  # Por símbolo
+        self.inclusive_ns = [0] * size
+        self.self_ns = [0] * size
+        self.matches = [0] * size  # Por terminal
+        self.mismatches = [0] * size
+        self.inserted = 0  # Terminales dados por insertados
+        self.deleted = 0  # Tokens descartados antes de que un terminal coincida
+        self.defaults = [0] * size
+        self.syncs = [0] * size
+        self.skipped = [0] * size  # Tokens descartados al sincronizar
+        self.productions: Dict[Tuple[int, int], int] = {}  # (no terminal, producción) -> expansiones
+        self.production_ns: Dict[Tuple[int, int], int] = {}
+        # Pilas de no terminales activos, como un árbol: (pila padre, no
+        # terminal) -> número de pila, y el tiempo propio de cada una
+        self.stack_ids: Dict[Tuple[int, int], int] = {}
+        self.stack_nodes: List[Tuple[int, int]] = []
+        self.stack_ns: List[int] = []
+
+    def ring_buffer(self, size: int) -> Deque[TraceEvent]:
+        """Guarda los últimos size eventos en un deque (el sumidero de trazas)"""
+        events: Deque[TraceEvent] = deque(maxlen=size)
+        self.trace = events.append
+        return events
+
+    def bind(self, encoded):
+        """Asocia el perfil a la tabla del parser (la primera vez)"""
+        if self.encoded is None:
+            self.encoded = encoded
+            self.reset()
+        elif self.encoded is not encoded:
+            raise ValueError("Profile was recorded with a different grammar")
+
+    def folded(self, max_depth: Optional[int] = None) -> str:
+        """
+        Tiempo propio por pila de no terminales, una línea por pila. Con
+        max_depth, de las pilas más profundas quedan sólo los últimos
+        max_depth marcos, detrás de "…" (con bloques muy anidados, las pilas
+        completas ocupan un espacio cuadrático en la profundidad).
+        """
+        names = self.encoded.symbol_names if self.encoded is not None else ()
+        lines = []
+        for node, ns in enumerate(self.stack_ns):
+            if ns <= 0:
+                continue
+            parts = []
+            while node >= 0 and (max_depth is None or len(parts) < max_depth):
+                node, symbol = self.stack_nodes[node]
+                parts.append(names[symbol])
+            if node >= 0:
+                parts.append('…')
+            parts.reverse()
+            lines.append(f"{';'.join(parts)} {ns}\n")
+        return ''.join(sorted(lines))
+
+    def write_folded(self, path: str, max_depth: Optional[int] = None):
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(self.folded(max_depth))
+
+    def production_name(self, symbol: int, production: int) -> str:
+        names = self.encoded.symbol_names
+        body = ' '.join(names[part] for part in reversed(self.encoded.productions[production]))
+        return f"{names[symbol]} → {body or 'ε'}"
+
+    def report(self, top: int = 15) -> str:
+        if self.encoded is None:
+            return "Sin análisis"
+        names = self.encoded.symbol_names
+        terminal_count = self.encoded.terminal_count
+        lines = [f"{self.parses} análisis en {self.parse_ns / 1e6:.1f} ms (con instrumentación)", "",
+                 f"{'No terminal':<24}{'expansiones':>12}{'inclusivo ms':>14}{'propio ms':>12}"]
+        symbols = sorted(range(terminal_count, len(names)), key=lambda symbol: -self.self_ns[symbol])
+        for symbol in symbols[:top]:
+            if self.expansions[symbol]:
+                lines.append(f"{names[symbol]:<24}{self.expansions[symbol]:>12,}"
+                             f"{self.inclusive_ns[symbol] / 1e6:>14.1f}{self.self_ns[symbol] / 1e6:>12.1f}")
+
+        lines += ["", f"{'Producción':<56}{'expansiones':>12}{'propio ms':>12}"]
+        by_time = sorted(self.productions, key=lambda key: -self.production_ns.get(key, 0))
+        for key in by_time[:top]:
+            lines.append(f"{self.production_name(*key)[:55]:<56}{self.productions[key]:>12,}"
+                         f"{self.production_ns.get(key, 0) / 1e6:>12.1f}")
+
+        lines += ["", f"Terminales: {sum(self.matches):,} coincidencias, {sum(self.mismatches):,} errores "
+                      f"({self.inserted:,} insertados, {self.deleted:,} tokens descartados)"]
+        for symbol in range(terminal_count, len(names)):
+            if self.defaults[symbol] or self.syncs[symbol]:
+                lines.append(f"{names[symbol]}: {self.defaults[symbol]:,} vacías por defecto, "
+                             f"{self.syncs[symbol]:,} sincronizaciones, {self.skipped[symbol]:,} tokens descartados")
+        return '\n'.join(lines)
+
+
+def instrumented_parse(parser: Parser, profile: ParseProfile, non_terminal: str,
+                       tree: Optional[ParseTree] = None):
+    """
+    El ciclo de Parser._parse_non_terminal (o, con tree, el de
+    Parser._build_tree) con contadores, tiempos y trazas. Debajo del cuerpo
+    de cada producción se apila una marca (-1): al sacarla termina el marco
+    del no terminal. Una producción que termina con su propio no terminal lo
+    apila como continuación (id + cantidad de símbolos), que sigue en el
+    mismo marco. Con tree, los marcos de producciones no vacías son sus
+    nodos.
+    """
+    encoded = parser.encoded_table
+    profile.bind(encoded)
+    terminal_count = encoded.terminal_count
+    table = encoded.table
+    bodies = parser.tree_tables.bodies
+    names = encoded.symbol_names
+    continuation = len(names)
+    clock = time.perf_counter_ns
+    trace = profile.trace
+
+    kinds = parser._kinds
+    end_of_input = END_OF_INPUT
+    current = parser.current
+    kind = parser.current_kind
+
+    expressions = parser.expression_grammar
+    expression = expressions.expression if expressions is not None else -1
+    expression_starts = expressions.starts if expressions is not None else frozenset()
+    defaults = parser.default_productions
+
+    expansions, matches = profile.expansions, profile.matches
+    counts, production_ns = profile.productions, profile.production_ns
+    stack_ids, stack_nodes, stack_ns = profile.stack_ids, profile.stack_nodes, profile.stack_ns
+    # Marcos abiertos: [no terminal, producción, inicio, tiempo de los hijos, número de pila, nodo]
+    frames: List[list] = []
+    active = [0] * continuation  # Marcos abiertos de cada no terminal (recursión)
+
+    def open_frame(symbol: int, production: int, empty: bool = False):
+        node = (frames[-1][4] if frames else -1, symbol)
+        key = stack_ids.get(node)
+        if key is None:
+            key = stack_ids[node] = len(stack_nodes)
+            stack_nodes.append(node)
+            stack_ns.append(0)
+        index = -1
+        if tree is not None and not empty:
+            index = len(tree.symbols)
+            tree.symbols.append(symbol)
+            tree.parents.append(frames[-1][5] if frames else -1)
+            tree.first_tokens.append(current)
+            tree.token_ends.append(0)
+            tree.subtree_ends.append(0)
+        frames.append([symbol, production, clock(), 0, key, index])
+        active[symbol] += 1
+
+    def close_frame():
+        symbol, production, start, children, key, index = frames.pop()
+        if index >= 0:
+            tree.token_ends[index] = current
+            tree.subtree_ends[index] = len(tree.symbols)
+        elapsed = clock() - start
+        own = elapsed - children
+        if frames:
+            frames[-1][3] += elapsed
+        active[symbol] -= 1
+        if not active[symbol]:  # Sin contar dos veces la recursión
+            profile.inclusive_ns[symbol] += elapsed
+        profile.self_ns[symbol] += own
+        production_ns[symbol, production] = production_ns.get((symbol, production), 0) + own
+        stack_ns[key] += own
+
+    def following() -> Optional[int]:
+        """Siguiente símbolo de la pila, sin marcas ni continuaciones"""
+        for item in reversed(stack):
+            if item >= 0:
+                return item - continuation if item >= continuation else item
+        return None
+
+    stack = [encoded.symbol_ids[non_terminal]]
+    pop = stack.pop
+    push = stack.extend
+    append = stack.append
+    recovering = False
+    started = clock()
+
+    try:
+        while stack:
+            symbol = pop()
+
+            if symbol < 0:  # Marca: terminó la producción del marco abierto
+                close_frame()
+                continue
+            framed = symbol < continuation
+            if not framed:
+                symbol -= continuation
+
+            if kind == end_of_input:
+                parser.current = current
+                if symbol < terminal_count:
+                    raise SyntaxError(f"Unexpected end of input, expected {names[symbol]}", -1)
+                raise SyntaxError(f"Unexpected end of input while processing {names[symbol]}", -1)
+
+            if symbol < terminal_count:  # Terminal
+                if symbol != kind:
+                    profile.mismatches[symbol] += 1
+                    if trace is not None:
+                        trace(('mismatch', names[symbol], current))
+                    if not recovering:
+                        parser._report(Diagnostic.MISMATCH, symbol, current)
+                        recovering = True
+                    start = current
+                    current, kind = parser._recover_terminal(symbol, following(), current, kind)
+                    if symbol != kind:
+                        profile.inserted += 1
+                        continue
+                    profile.deleted += current - start
+                matches[symbol] += 1
+                if trace is not None:
+                    trace(('match', names[symbol], current))
+                current += 1
+                kind = next(kinds, end_of_input)
+                recovering = False
+                continue
+
+            if symbol == expression and kind in expression_starts:
+                # El recorrido rápido de la expresión cuenta como una sola expansión
+                expansions[symbol] += 1
+                if trace is not None:
+                    trace(('expand', names[symbol], current))
+                if framed:
+                    open_frame(symbol, -1)
+                    append(-1)
+                current, kind, pending = parser._skip_expression(current, kind)
+                push(pending)
+                recovering = False
+                continue
+
+            production = table[symbol * terminal_count + kind]
+            if production >= 0:
+                expansions[symbol] += 1
+                counts[symbol, production] = counts.get((symbol, production), 0) + 1
+                if trace is not None:
+                    trace(('expand', names[symbol], current))
+                body = bodies[production]
+                if framed:
+                    open_frame(symbol, production, not body)
+                    append(-1)
+                push(body)
+                continue
+
+            if defaults[symbol] >= 0 and parser._use_default(symbol, following(), kind):
+                profile.defaults[symbol] += 1
+                if trace is not None:
+                    trace(('default', names[symbol], current))
+                continue
+            if not recovering:
+                parser._report(Diagnostic.UNEXPECTED_TOKEN, symbol, current)
+                recovering = True
+            start = current
+            parser.current, parser.current_kind = current, kind
+            synchronized = parser._synchronize(symbol)
+            current, kind = parser.current, parser.current_kind
+            profile.syncs[symbol] += 1
+            profile.skipped[symbol] += current - start
+            if trace is not None:
+                trace(('sync', names[symbol], current))
+            if not synchronized:
+                raise SyntaxError("Could not synchronize after error", -1)
+            resumed = parser._resume(symbol, kind)
+            if not framed and resumed:  # La lista retomada sigue en el mismo marco
+                resumed = (resumed[0] + continuation,) + resumed[1:]
+            push(resumed)
+
+        parser.current, parser.current_kind = current, kind
+    finally:
+        while frames:
+            close_frame()
+        profile.parses += 1
+        profile.parse_ns += clock() - started
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Perfila el parser sobre un programa")
+    arguments.add_argument('path', nargs='?', help="programa a analizar (por defecto, uno generado)")
+    arguments.add_argument('--shape', default='wide', help="forma del programa generado (ver programs.py)")
+    arguments.add_argument('--size', type=int, default=100000, help="tokens del programa generado")
+    arguments.add_argument('--folded', metavar='RUTA', help="escribir las pilas plegadas para un flame graph")
+    arguments.add_argument('--max-depth', type=int, default=64,
+                           help="marcos de cada pila plegada (0: todos; por defecto 64)")
+    arguments.add_argument('--top', type=int, default=15, help="filas de cada tabla")
+    options = arguments.parse_args(argv[1:])
+
+    if options.path is not None:
+        with open(options.path, encoding='utf-8') as source_file:
+            source = source_file.read()
+    else:
+        from programs import generate
+        source = generate(options.shape, options.size)
+
+    try:
+        tokens = Lexer().tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        print(e)
+        return 1
+    parser = Parser(max_errors=None)
+    profile = parser.instrument(ParseProfile())
+    valid = parser.validate(tokens)
+    print(f"{len(tokens):,} tokens, {'válido' if valid else f'{len(parser.diagnostics)} errores'}\n")
+    print(profile.report(options.top))
+    if options.folded:
+        profile.write_folded(options.folded, options.max_depth or None)
+        print(f"\nPilas plegadas en {options.folded}")
+    return 0 if valid else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
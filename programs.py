@@ -0,0 +1,264 @@
+"""
+Generador de programas sintéticos para los benchmarks.
+
+Cada forma produce un programa válido de aproximadamente la cantidad de
+tokens pedida, con la estructura que se quiere medir:
+
+    wide        una lista larga de sentencias simples
+    nested      Siinter y Mientinter anidados
+    expression  asignaciones con expresiones largas y paréntesis
+    methods     muchas definiciones de Methodinter
+    grammar     derivaciones al azar de Gramatica.ebnf
+
+corrupt convierte un programa válido en uno inválido borrando e
+insertando tokens al azar. Con la misma semilla, el resultado es siempre
+el mismo programa.
+"""
+import random
+from typing import Callable, Dict, List, Tuple
+
+from main import Lexer
+
+# Lexemas de ejemplo de cada tipo de token, para las derivaciones al azar
+SAMPLE_LEXEMES: Dict[str, Tuple[str, ...]] = {
+    'START_PROG': ('= ^ .',),
+    'END_PROG': ('. ^ =',),
+    'DECVAR': ('DECVARinter',),
+    'ENDDEC': ('EndDecinter',),
+    'METHOD': ('Methodinter',),
+    'IF': ('Siinter',),
+    'ELSE': ('Sinointer',),
+    'WHILE': ('Mientinter',),
+    'FOR': ('Forinter',),
+    'ARRAY': ('ARRAYinter',),
+    'PRINT': ('Mostrinter',),
+    'READ': ('LEERinter',),
+    'BREAK': ('BREAKinter',),
+    'CONTINUE': ('CONTINUEinter',),
+    'RETURN': ('Returninter',),
+    'TYPE': ('INTer', 'FLOATer', 'STRINGter', 'BOOLEANter', 'VOIDter'),
+    'BOOLEAN': ('TRUEter', 'FALSEter'),
+    'STRING': ('"texto"', '""', '"hola mundo"'),
+    'NUMBER': ('0', '1', '42', '3.14'),
+    'OP_REL': ('==', '!=', '>', '<', '>=', '<='),
+    'OP_LOG': ('ANDter', 'ORter', 'NOTter'),
+    'OP_ARIT': ('+', '-', '*', '/'),
+    'END_STMT': (':3',),
+    'SEMI': (';',),
+    'COMMA': (',',),
+    'COLON': (':',),
+    'LPAREN': ('(',),
+    'RPAREN': (')',),
+    'LBRACE': ('{',),
+    'RBRACE': ('}',),
+    'LBRACK': ('[',),
+    'RBRACK': (']',),
+    'ASSIGN': ('=',),
+    'COMMENT': ('## comentario',),
+    'ID': ('x', 'y', 'total', 'i', 'numbers', 'valor_1'),
+}
+
+# Después de estos tokens la derivación al azar empieza una línea nueva
+# (después de un comentario es obligatorio)
+_LINE_ENDS = {'END_STMT', 'LBRACE', 'RBRACE', 'ENDDEC', 'COMMENT'}
+
+# Tokens que emite, como mucho, cada sentencia derivada al azar antes de
+# cerrarse por el camino más corto
+STATEMENT_TOKENS = 40
+
+BINARY_OPERATORS = ('+', '-', '*', '/', '==', '!=', '>', '<', '>=', '<=', 'ANDter', 'ORter')
+
+
+def _token_count(code: str) -> int:
+    return len(Lexer().tokenize_buffer(code))
+
+
+def _program(parts: List[str]) -> str:
+    return ''.join(["= ^ .\n", *parts, ". ^ =\n"])
+
+
+def wide(size: int, rng: random.Random) -> str:
+    """Muchas sentencias cortas, una detrás de otra"""
+    units = [
+        lambda n: f"x{n} = y{n} + {n}:3\n",
+        lambda n: f"Mostrinter(x{n}):3\n",
+        lambda n: f"LEERinter(y{n}):3\n",
+        lambda n: f"numbers[i{n}] = x{n} * 2:3\n",
+        lambda n: f"DECVARinter a{n}: INTer, b{n}: FLOATer EndDecinter\n",
+        lambda n: f"ARRAYinter v{n}[10]: INTer:3\n",
+        lambda n: f"## comentario {n}\n",
+        lambda n: f"total = total - \"texto\" / {n}:3\n",
+    ]
+    # Tokens de cada sentencia, para saber cuántas hacen falta
+    costs = [_token_count(_program([unit(0)])) - 2 for unit in units]
+    parts = []
+    tokens = 2
+    while tokens < size:
+        choice = rng.randrange(len(units))
+        parts.append(units[choice](len(parts)))
+        tokens += costs[choice]
+    return _program(parts)
+
+
+def nested(size: int, rng: random.Random) -> str:
+    """Un solo camino de Siinter y Mientinter anidados, sin sangría"""
+    levels = [
+        (lambda n: f"Siinter(x{n} > {n}) {{\nx{n} = x{n} - 1:3\n", "} Sinointer {\nMostrinter(x):3\n}\n"),
+        (lambda n: f"Mientinter(x{n} < {n}) {{\nx{n} = x{n} + 1:3\n", "}\n"),
+    ]
+    costs = [_token_count(_program([open_level(0), close_level])) - 2 for open_level, close_level in levels]
+    opens, closes = [], []
+    tokens = 2
+    while tokens < size:
+        choice = rng.randrange(len(levels))
+        open_level, close_level = levels[choice]
+        opens.append(open_level(len(opens)))
+        closes.append(close_level)
+        tokens += costs[choice]
+    closes.reverse()
+    return _program(opens + closes)
+
+
+def expression(size: int, rng: random.Random, terms: int = 1000) -> str:
+    """Asignaciones de expresiones de hasta terms operandos, con paréntesis y NOTter"""
+    parts = []
+    tokens = 2
+    while tokens < size:
+        pieces = [f"r{len(parts)} ="]
+        depth = 0
+        for term in range(max(1, min(terms, (size - tokens) // 2))):
+            if term:
+                pieces.append(rng.choice(BINARY_OPERATORS))
+            while rng.random() < 0.15:
+                pieces.append(rng.choice(('(', 'NOTter')))
+                depth += pieces[-1] == '('
+            pieces.append(rng.choice(('x', 'y', str(term), '"texto"', 'TRUEter')))
+            while depth and rng.random() < 0.2:
+                pieces.append(')')
+                depth -= 1
+        pieces.extend(')' * depth)
+        pieces.append(':3\n')
+        parts.append(' '.join(pieces))
+        tokens += len(pieces) + 1
+    return _program(parts)
+
+
+def methods(size: int, rng: random.Random) -> str:
+    """Muchas definiciones de métodos con parámetros y cuerpo"""
+    parts = []
+    tokens = 2
+    while tokens < size:
+        n = len(parts)
+        parameters = ', '.join(f"{rng.choice(SAMPLE_LEXEMES['TYPE'])} p{index}"
+                               for index in range(rng.randrange(4)))
+        parts.append(f"Methodinter metodo{n}({parameters}) {{\n"
+                     f"    DECVARinter t: INTer EndDecinter\n"
+                     f"    t = t * {n} + 1:3\n"
+                     f"    Siinter(t > {n}) {{\n"
+                     f"        Returninter t:3\n"
+                     f"    }}\n"
+                     f"    Returninter 0:3\n"
+                     f"}}\n")
+        tokens += _token_count(parts[-1])
+    return _program(parts)
+
+
+def grammar(size: int, rng: random.Random) -> str:
+    """
+    Sentencias (Statement) derivadas por la izquierda de la gramática,
+    eligiendo producciones al azar. Cuando una sentencia ya emitió
+    STATEMENT_TOKENS tokens, cada no terminal toma la producción de menor
+    altura, así que la derivación termina pronto.
+    """
+    from grammar import load_grammar
+    productions = load_grammar().productions
+    heights = _derivation_heights(productions)
+
+    def height(body: List[str]) -> int:
+        return max((heights.get(symbol, 0) for symbol in body), default=0)
+
+    shortest = {non_terminal: min(bodies, key=height) for non_terminal, bodies in productions.items()}
+
+    pieces: List[str] = []
+    tokens = 2
+    while tokens < size:
+        emitted = 0
+        stack = ['Statement']
+        while stack:
+            symbol = stack.pop()
+            if symbol in productions:
+                body = rng.choice(productions[symbol]) if emitted < STATEMENT_TOKENS else shortest[symbol]
+                stack.extend(reversed([part for part in body if part != 'ε']))
+                continue
+            pieces.append(rng.choice(SAMPLE_LEXEMES[symbol]))
+            pieces.append('\n' if symbol in _LINE_ENDS else ' ')
+            emitted += 1
+        tokens += emitted
+    return _program(pieces)
+
+
+def _derivation_heights(productions: Dict[str, List[List[str]]]) -> Dict[str, int]:
+    """Altura del árbol de derivación más bajo de cada no terminal (terminales: 0)"""
+    heights: Dict[str, int] = {}
+    changed = True
+    while changed:
+        changed = False
+        for non_terminal, bodies in productions.items():
+            for body in bodies:
+                parts = [heights.get(symbol, 0 if symbol not in productions else None) for symbol in body]
+                if None in parts:
+                    continue
+                candidate = 1 + max(parts, default=0)
+                if candidate < heights.get(non_terminal, candidate + 1):
+                    heights[non_terminal] = candidate
+                    changed = True
+    return heights
+
+
+SHAPES: Dict[str, Callable[[int, random.Random], str]] = {
+    'wide': wide,
+    'nested': nested,
+    'expression': expression,
+    'methods': methods,
+    'grammar': grammar,
+}
+
+
+def generate(shape: str, size: int, seed: int = 0) -> str:
+    """Programa válido de la forma indicada con unos size tokens"""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown program shape: {shape}")
+    return SHAPES[shape](size, random.Random(seed))
+
+
+def corrupt(source: str, rate: float = 0.01, seed: int = 0) -> str:
+    """
+    Copia del programa en la que cada token (salvo el primero y el último)
+    se borra o se le agrega detrás otro token del programa con probabilidad
+    rate. Al menos un token se borra, para que el programa no quede igual.
+    """
+    rng = random.Random(seed)
+    tokens = Lexer().tokenize_buffer(source)
+    count = len(tokens)
+    pieces = []
+    previous = 0
+    mutated = False
+    for index in range(1, count - 1):
+        start, end = tokens.starts[index], tokens.ends[index]
+        chance = rng.random()
+        if chance >= rate:
+            continue
+        pieces.append(source[previous:start])
+        if chance < rate / 2:  # Borrar
+            previous = end
+        else:  # Insertar otro token después
+            pieces.append(source[start:end])
+            pieces.append(' ' + tokens.value(rng.randrange(1, count - 1)))
+            previous = end
+        mutated = True
+    if not mutated and count > 2:
+        index = rng.randrange(1, count - 1)
+        pieces.append(source[previous:tokens.starts[index]])
+        previous = tokens.ends[index]
+    pieces.append(source[previous:])
+    return ''.join(pieces)
@@ -0,0 +1,139 @@
+"""
+Benchmark de ejecución: el compilador (compiler.py) contra el intérprete
+de referencia (interpreter.py) y contra el mismo programa escrito a mano en
+Python.
+
+El programa recorre un bucle de --iterations vueltas con aritmética
+entera y real, condiciones, un Forinter con CONTINUEinter y BREAKinter, un
+array y salida con Mostrinter. Antes de medir verifica que las tres
+versiones escriban lo mismo.
+
+Uso: python runbench.py [--iterations N] [--repeat N]
+"""
+import argparse
+import io
+import sys
+import time
+from typing import Callable, List
+
+from compiler import compile_program
+from interpreter import Interpreter
+from main import Lexer, Parser
+from runtime import ProgramIO, divide
+
+PROGRAM = """= ^ .
+DECVARinter i: INTer, total: INTer, media: FLOATer, par: BOOLEANter EndDecinter
+ARRAYinter cuadrados[{iterations}]: INTer:3
+Mientinter(i < {iterations}) {{
+    cuadrados[i] = i * i:3
+    total = total + i * i - i / 3:3
+    par = i - i / 2 * 2 == 0:3
+    Siinter(par ANDter i > 10) {{
+        media = total / (i + 1.0):3
+    }} Sinointer {{
+        media = media + 0.5:3
+    }}
+    Forinter(DECVARinter j: INTer EndDecinter; j < 6; j = j + 1:3) {{
+        Siinter(j == 2) {{
+            CONTINUEinter:3
+        }}
+        Siinter(j == 5 ANDter NOTter par) {{
+            BREAKinter:3
+        }}
+        total = total + j:3
+    }}
+    Siinter(i - i / 1000 * 1000 == 0) {{
+        Mostrinter(total):3
+        Mostrinter(media):3
+    }}
+    i = i + 1:3
+}}
+Mostrinter(total):3
+. ^ =
+"""
+
+
+def native(iterations: int, output: ProgramIO):
+    """El mismo programa escrito a mano en Python"""
+    total, media = 0, 0.0
+    cuadrados = [0] * iterations
+    i = 0
+    while i < iterations:
+        cuadrados[i] = i * i
+        total = total + i * i - divide(i, 3)
+        par = i - divide(i, 2) * 2 == 0
+        if par and i > 10:
+            media = total / (i + 1.0)
+        else:
+            media = media + 0.5
+        j = 0
+        while j < 6:
+            if j == 2:
+                j += 1
+                continue
+            if j == 5 and not par:
+                break
+            total = total + j
+            j += 1
+        if i - divide(i, 1000) * 1000 == 0:
+            output.write_line(str(total))
+            output.write_line(str(media))
+        i += 1
+    output.write_line(str(total))
+    output.flush()
+
+
+def _best(function: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Compara el compilador con el intérprete de referencia")
+    arguments.add_argument('--iterations', type=int, default=20000, help="vueltas del bucle principal")
+    arguments.add_argument('--repeat', type=int, default=3, help="corridas de cada versión (se toma la mejor)")
+    options = arguments.parse_args(argv[1:])
+
+    source = PROGRAM.format(iterations=options.iterations)
+    tokens = Lexer().tokenize_buffer(source)
+    parser = Parser()
+    if not parser.validate(tokens, build_tree=True):
+        print('\n'.join(parser.errors), file=sys.stderr)
+        return 1
+    tree = parser.tree
+
+    start = time.perf_counter()
+    program = compile_program(tree, tokens)
+    compile_seconds = time.perf_counter() - start
+
+    def output() -> ProgramIO:
+        return ProgramIO(io.StringIO(), io.StringIO())
+
+    runs = {
+        'intérprete': lambda target: Interpreter(tree, tokens, target).run(),
+        'compilado': lambda target: program.run(target),
+        'Python': lambda target: native(options.iterations, target),
+    }
+    outputs = {}
+    for name, run in runs.items():
+        target = output()
+        run(target)
+        outputs[name] = target.output.getvalue()
+    if len(set(outputs.values())) != 1:
+        print("Las versiones escriben resultados distintos", file=sys.stderr)
+        return 1
+
+    print(f"{options.iterations:,} vueltas, mejor de {options.repeat}; compilación: {compile_seconds * 1000:.1f} ms")
+    times = {name: _best(lambda: run(output()), options.repeat) for name, run in runs.items()}
+    for name, seconds in times.items():
+        print(f"{name:>12}: {seconds:8.3f} s  {times['intérprete'] / seconds:6.1f}x el intérprete  "
+              f"{seconds / times['Python']:5.2f}x Python")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,110 @@
+"""
+Soporte de ejecución de programas, común al compilador (compiler.py) y al
+intérprete de referencia (interpreter.py).
+
+Define los valores por defecto de cada tipo, la división entera, cómo se
+muestran y se leen los valores, los arrays (con el módulo array para los
+tipos numéricos) y la entrada y salida de Mostrinter y LEERinter.
+
+La entrada y salida es intercambiable: cualquier objeto con write_line,
+read_line y flush sirve. ProgramIO lee y escribe archivos de texto y junta
+las líneas de salida en un búfer, que se vacía al llenarse, antes de cada
+lectura (para que se vea lo que se pidió) y al terminar el programa.
+"""
+import sys
+from array import array
+from typing import List, Optional, TextIO
+
+# Valor inicial de una variable según su tipo
+DEFAULT_VALUES = {'INTer': 0, 'FLOATer': 0.0, 'STRINGter': '', 'BOOLEANter': False, 'VOIDter': None}
+
+# Tipo de los elementos de los arrays numéricos; los de STRINGter y VOIDter son listas
+ARRAY_TYPECODES = {'INTer': 'q', 'FLOATer': 'd', 'BOOLEANter': 'b'}
+
+BOOLEAN_LEXEMES = {'TRUEter': True, 'FALSEter': False}
+
+
+class ProgramError(Exception):
+    """Error durante la ejecución de un programa"""
+
+
+class ProgramIO:
+    """Entrada y salida de un programa, con la salida en un búfer"""
+
+    def __init__(self, input: Optional[TextIO] = None, output: Optional[TextIO] = None,
+                 buffer_lines: int = 1024):
+        self.input = input if input is not None else sys.stdin
+        self.output = output if output is not None else sys.stdout
+        self.buffer_lines = buffer_lines  # Líneas de salida que se juntan antes de escribir
+        self.pending: List[str] = []
+
+    def write_line(self, text: str):
+        pending = self.pending
+        pending.append(text)
+        if len(pending) >= self.buffer_lines:
+            self.flush()
+
+    def read_line(self) -> Optional[str]:
+        """Próxima línea de la entrada, sin el fin de línea; None al final"""
+        self.flush()
+        line = self.input.readline()
+        return line.rstrip('\r\n') if line else None
+
+    def flush(self):
+        if self.pending:
+            self.pending.append('')
+            self.output.write('\n'.join(self.pending))
+            self.pending.clear()
+        if hasattr(self.output, 'flush'):
+            self.output.flush()
+
+
+def divide(left: int, right: int) -> int:
+    """División de dos INTer: trunca hacia cero, como en C"""
+    quotient = left // right
+    if quotient < 0 and quotient * right != left:
+        quotient += 1
+    return quotient
+
+
+def format_value(value) -> str:
+    """Texto que muestra Mostrinter"""
+    if value is True:
+        return 'TRUEter'
+    if value is False:
+        return 'FALSEter'
+    if value is None:
+        return 'VOIDter'
+    return str(value)
+
+
+def read_value(io, type: str, name: str, location: str):
+    """Lee una línea para LEERinter y la convierte al tipo de la variable"""
+    line = io.read_line()
+    if line is None:
+        raise ProgramError(f"Unexpected end of input reading {name} at {location}")
+    try:
+        if type == 'INTer':
+            return int(line)
+        if type == 'FLOATer':
+            return float(line)
+        if type == 'STRINGter':
+            return line
+        if type == 'BOOLEANter':
+            return BOOLEAN_LEXEMES[line.strip()]
+    except (ValueError, KeyError):
+        pass
+    raise ProgramError(f"Invalid {type} value {line!r} for {name} at {location}")
+
+
+def new_array(type: str, size: int, name: str, location: str):
+    if size < 0:
+        raise ProgramError(f"Negative size {size} for array {name} at {location}")
+    typecode = ARRAY_TYPECODES.get(type)
+    if typecode is None:
+        return [DEFAULT_VALUES[type]] * size
+    return array(typecode, bytes(array(typecode).itemsize * size))
+
+
+def index_error(index: int, name: str, size: int, location: str):
+    raise ProgramError(f"Index {index} out of range for array {name} of size {size} at {location}")
@@ -0,0 +1,424 @@
+"""
+Análisis semántico.
+
+Recorre una vez el árbol de análisis (ver tree.py) de un programa
+sintácticamente válido y verifica:
+
+- que cada identificador esté declarado antes de usarse y que no se
+  declare dos veces en el mismo ámbito
+- los tipos de las expresiones, de las asignaciones y de las condiciones
+- que los tamaños e índices de los arrays sean enteros y que sólo se
+  indexen arrays
+- que Returninter esté dentro de un método, y BREAKinter y CONTINUEinter
+  dentro de un bucle
+
+Cada Block, Method y bucle abre un ámbito: un diccionario con los nombres
+que declara. Para que buscar un nombre no recorra la cadena de ámbitos, un
+índice hash guarda el símbolo visible de cada nombre, y al cerrar un
+ámbito se restauran los que sus declaraciones ocultaban. Así el análisis es
+lineal en la cantidad de tokens aun con bloques muy anidados.
+
+Tipos de las expresiones:
+
+    NUMBER             INTer, o FLOATer si tiene punto decimal
+    STRING, BOOLEAN    STRINGter, BOOLEANter
+    + - * /            números: FLOATer si alguno lo es, si no INTer
+                       (+ también concatena dos STRINGter)
+    > < >= <=          números: BOOLEANter
+    == !=              del mismo tipo (o números): BOOLEANter
+    ANDter ORter       BOOLEANter: BOOLEANter
+    NOTter (prefijo)   BOOLEANter: BOOLEANter
+
+NOTter entre dos operandos es válido para la gramática pero no tiene
+significado (ver expressions.py): se reporta como malformed-expression.
+
+Se puede asignar un INTer a un FLOATer. Un identificador no declarado se
+reporta una vez y después tiene tipo desconocido, que no produce más
+errores.
+
+La gramática no tiene sintaxis para llamar a un método (MethodCall no es
+alcanzable desde Programa), así que no hay cantidad de argumentos que
+verificar: cada método queda en la tabla con sus parámetros.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from expressions import ExpressionError, ExpressionTree, parse_expression
+from main import TokenBuffer
+
+INTEGER, FLOAT, STRING, BOOLEAN = 'INTer', 'FLOATer', 'STRINGter', 'BOOLEANter'
+NUMERIC = {INTEGER, FLOAT}
+
+ARITHMETIC_OPERATORS = {'+', '-', '*', '/'}
+ORDERING_OPERATORS = {'>', '<', '>=', '<='}
+EQUALITY_OPERATORS = {'==', '!='}
+LOGICAL_OPERATORS = {'ANDter', 'ORter'}
+
+
+class Symbol:
+    __slots__ = ('name', 'kind', 'type', 'position', 'parameters')
+
+    VARIABLE = 'variable'
+    ARRAY = 'array'
+    METHOD = 'method'
+
+    def __init__(self, name: str, kind: str, type: Optional[str], position: int,
+                 parameters: Tuple[Tuple[str, str], ...] = ()):
+        self.name = name
+        self.kind = kind
+        self.type = type  # Tipo de la variable o de los elementos; None si se desconoce
+        self.position = position  # Token de la declaración
+        self.parameters = parameters  # (tipo, nombre) de cada parámetro de un método
+
+    @property
+    def arity(self) -> int:
+        return len(self.parameters)
+
+
+class SemanticDiagnostic:
+    """Error semántico; como Diagnostic, se formatea al pedirlo"""
+    __slots__ = ('code', 'message', 'position', 'token')
+
+    UNDECLARED = 'undeclared'
+    REDECLARED = 'redeclared'
+    TYPE_MISMATCH = 'type-mismatch'
+    WRONG_KIND = 'wrong-kind'  # Un array o método usado como variable, o al revés
+    MISPLACED = 'misplaced'  # Returninter fuera de un método, BREAKinter fuera de un bucle
+    MALFORMED_EXPRESSION = 'malformed-expression'  # Sin árbol con precedencia (p. ej. NOTter binario)
+
+    def __init__(self, code: str, message: str, position: int, token=None):
+        self.code = code
+        self.message = message
+        self.position = position  # Posición del token en el flujo
+        self.token = token
+
+    def to_dict(self) -> Dict:
+        return {
+            'code': self.code,
+            'message': self.message,
+            'offset': self.token.start if self.token is not None else -1,
+            'line': self.token.line if self.token is not None else -1,
+            'column': self.token.column if self.token is not None else None,
+        }
+
+    def __str__(self):
+        if self.token is None:
+            return f"Error: {self.message}"
+        return f"Error en {self.token.location()}: {self.message}"
+
+
+class _Scope:
+    __slots__ = ('end', 'declared', 'undeclared', 'method', 'loops')
+
+    def __init__(self, end: int, method: bool, loops: int):
+        self.end = end  # Nodo donde termina el ámbito
+        # Nombres declarados aquí -> símbolo que ocultaban (o None)
+        self.declared: Dict[str, Optional[Symbol]] = {}
+        # Nombres no declarados que se reportaron aquí (no son símbolos)
+        self.undeclared: Set[str] = set()
+        self.method = method  # Dentro de un método
+        self.loops = loops  # Bucles abiertos (se reinicia en cada método)
+
+
+class SemanticChecker:
+    def __init__(self, tree, tokens: Sequence, record: bool = False):
+        self.tree = tree
+        self.tokens = tokens
+        if isinstance(tokens, TokenBuffer):
+            self._type: Callable[[int], str] = tokens.type
+            self._value: Callable[[int], str] = tokens.value
+        else:
+            self._type = lambda position: tokens[position].type
+            self._value = lambda position: tokens[position].value
+        self.diagnostics: List[SemanticDiagnostic] = []
+        self.visible: Dict[str, Symbol] = {}  # Índice hash: nombre -> símbolo visible
+        self.undeclared: Set[str] = set()  # Nombres no declarados ya reportados en los ámbitos abiertos
+        self.scopes: List[_Scope] = []
+        self.methods: List[Symbol] = []  # Métodos declarados, en orden
+        # Con record, lo que necesita un compilador (ver compiler.py): el
+        # símbolo de cada identificador (posición del token -> símbolo) y el
+        # árbol y los tipos de cada nodo Expresion (nodo -> (árbol, tipos))
+        self.resolutions: Optional[Dict[int, Symbol]] = {} if record else None
+        self.expressions: Optional[Dict[int, Tuple[ExpressionTree, List[Optional[str]]]]] = \
+            {} if record else None
+
+    def check(self) -> List[SemanticDiagnostic]:
+        tree = self.tree
+        symbol_ids = tree.encoded.symbol_ids
+        handlers = {symbol_ids[name]: handler for name, handler in (
+            ('Block', self._block),
+            ('Loops', self._loop),
+            ('Method', self._method),
+            ('VarDec', self._var_dec),
+            ('Array_Dec', self._array_dec),
+            ('ExpressionStatement', self._expression_statement),
+            ('Input', self._input),
+            ('Condition', self._condition),
+            ('Return', self._return),
+            ('Break', self._break),
+            ('Continue', self._break),
+            ('Expresion', self._expression_node),
+        ) if name in symbol_ids}
+
+        symbols = tree.symbols
+        count = len(symbols)
+        self._open_scope(count, method=False, loops=0)
+        index = 0
+        while index < count:
+            while self.scopes[-1].end <= index:
+                self._close_scope()
+            handler = handlers.get(symbols[index])
+            # Cada manejador devuelve el próximo nodo: el siguiente para
+            # bajar a los hijos o el final del subárbol para saltearlos
+            index = handler(index) if handler is not None else index + 1
+        while self.scopes:
+            self._close_scope()
+        return self.diagnostics
+
+    # Ámbitos
+
+    def _open_scope(self, end: int, method: bool, loops: int):
+        self.scopes.append(_Scope(end, method, loops))
+
+    def _close_scope(self):
+        scope = self.scopes.pop()
+        for name, hidden in scope.declared.items():
+            if hidden is None:
+                del self.visible[name]
+            else:
+                self.visible[name] = hidden
+        self.undeclared -= scope.undeclared
+
+    def _declare(self, symbol: Symbol):
+        scope = self.scopes[-1]
+        if symbol.name in scope.declared:
+            self._error(SemanticDiagnostic.REDECLARED,
+                        f"{symbol.name} is already declared in this scope", symbol.position)
+            return
+        scope.declared[symbol.name] = self.visible.get(symbol.name)
+        self.visible[symbol.name] = symbol
+        if self.resolutions is not None:
+            self.resolutions[symbol.position] = symbol
+
+    def _lookup(self, position: int) -> Optional[Symbol]:
+        """
+        Símbolo del identificador; si no está declarado se reporta (una vez
+        mientras siga abierto el ámbito donde se usó) y se devuelve None
+        """
+        name = self._value(position)
+        symbol = self.visible.get(name)
+        if symbol is None:
+            if name not in self.undeclared:
+                self._error(SemanticDiagnostic.UNDECLARED, f"Undeclared identifier {name}", position)
+                self.undeclared.add(name)
+                self.scopes[-1].undeclared.add(name)
+            return None
+        if self.resolutions is not None:
+            self.resolutions[position] = symbol
+        return symbol
+
+    def _variable_type(self, position: int) -> Optional[str]:
+        """Tipo de un identificador usado como valor"""
+        symbol = self._lookup(position)
+        if symbol is None:
+            return None
+        if symbol.kind != Symbol.VARIABLE:
+            self._error(SemanticDiagnostic.WRONG_KIND,
+                        f"{symbol.name} is {'an array' if symbol.kind == Symbol.ARRAY else 'a method'}, "
+                        f"not a variable", position)
+            return None
+        return symbol.type
+
+    def _error(self, code: str, message: str, position: int):
+        self.diagnostics.append(SemanticDiagnostic(code, message, position, self.tokens[position]))
+
+    # Nodos del árbol
+
+    def _block(self, index: int) -> int:
+        scope = self.scopes[-1]
+        self._open_scope(self.tree.subtree_ends[index], scope.method, scope.loops)
+        return index + 1
+
+    def _loop(self, index: int) -> int:
+        # Un ámbito propio para la declaración del Forinter
+        scope = self.scopes[-1]
+        self._open_scope(self.tree.subtree_ends[index], scope.method, scope.loops + 1)
+        return index + 1
+
+    def _method(self, index: int) -> int:
+        # Methodinter ID ( TYPE ID , TYPE ID ... ) Block
+        first = self.tree.first_tokens[index]
+        parameters = []
+        position = first + 3
+        while self._type(position) == 'TYPE':
+            parameters.append((self._value(position), position + 1))
+            position += 3 if self._type(position + 2) == 'COMMA' else 2
+        name = self._value(first + 1)
+        method = Symbol(name, Symbol.METHOD, None, first + 1,
+                        tuple((type, self._value(position)) for type, position in parameters))
+        self._declare(method)
+        self.methods.append(method)
+
+        self._open_scope(self.tree.subtree_ends[index], method=True, loops=0)
+        for type, position in parameters:
+            parameter = self._value(position)
+            if parameter in self.scopes[-1].declared:
+                self._error(SemanticDiagnostic.REDECLARED, f"Duplicate parameter {parameter}", position)
+            else:
+                self._declare(Symbol(parameter, Symbol.VARIABLE, type, position))
+        return index + 1
+
+    def _var_dec(self, index: int) -> int:
+        # DECVARinter ID : TYPE , ID : TYPE ... EndDecinter
+        position = self.tree.first_tokens[index] + 1
+        end = self.tree.token_ends[index]
+        while position + 2 < end:
+            self._declare(Symbol(self._value(position), Symbol.VARIABLE, self._value(position + 2), position))
+            position += 4
+        return self.tree.subtree_ends[index]
+
+    def _array_dec(self, index: int) -> int:
+        # ARRAYinter ID [ tamaño ] : TYPE :3
+        first = self.tree.first_tokens[index]
+        size = first + 3
+        if self._type(size) == 'ID':
+            self._expect(self._variable_type(size), INTEGER, "Array size", size)
+        elif '.' in self._value(size):
+            self._expect(FLOAT, INTEGER, "Array size", size)
+        self._declare(Symbol(self._value(first + 1), Symbol.ARRAY, self._value(first + 6), first + 1))
+        return self.tree.subtree_ends[index]
+
+    def _expression_statement(self, index: int) -> int:
+        # ID = Expresion :3  |  ID [ Expresion ] = Expresion :3
+        tree = self.tree
+        target = tree.first_tokens[index]
+        expressions = [child for child in tree.children(index + 1) if tree.name(child) == 'Expresion']
+        symbol = self._lookup(target)
+        if self._type(target + 1) == 'LBRACK':
+            self._expect(self._expression(expressions[0]), INTEGER, "Array index",
+                         tree.first_tokens[expressions[0]])
+            value = self._expression(expressions[1])
+            if symbol is not None and symbol.kind != Symbol.ARRAY:
+                self._error(SemanticDiagnostic.WRONG_KIND, f"{symbol.name} is not an array", target)
+                symbol = None
+        else:
+            value = self._expression(expressions[0])
+            if symbol is not None and symbol.kind != Symbol.VARIABLE:
+                self._error(SemanticDiagnostic.WRONG_KIND, f"Cannot assign to {symbol.kind} {symbol.name}", target)
+                symbol = None
+        if symbol is not None and not _assignable(symbol.type, value):
+            self._error(SemanticDiagnostic.TYPE_MISMATCH,
+                        f"Cannot assign {value} to {symbol.name} of type {symbol.type}", target)
+        return tree.subtree_ends[index]
+
+    def _input(self, index: int) -> int:
+        # LEERinter ( ID ) :3
+        self._variable_type(self.tree.first_tokens[index] + 2)
+        return self.tree.subtree_ends[index]
+
+    def _condition(self, index: int) -> int:
+        self._expect(self._expression(index + 1), BOOLEAN, "Condition", self.tree.first_tokens[index])
+        return self.tree.subtree_ends[index]
+
+    def _return(self, index: int) -> int:
+        first = self.tree.first_tokens[index]
+        if not self.scopes[-1].method:
+            self._error(SemanticDiagnostic.MISPLACED, "Returninter outside of a method", first)
+        self._expression(index + 1)
+        return self.tree.subtree_ends[index]
+
+    def _break(self, index: int) -> int:
+        first = self.tree.first_tokens[index]
+        if not self.scopes[-1].loops:
+            self._error(SemanticDiagnostic.MISPLACED, f"{self._value(first)} outside of a loop", first)
+        return self.tree.subtree_ends[index]
+
+    def _expression_node(self, index: int) -> int:
+        self._expression(index)
+        return self.tree.subtree_ends[index]
+
+    # Expresiones
+
+    def _expect(self, actual: Optional[str], expected: str, what: str, position: int):
+        if actual is not None and actual != expected:
+            self._error(SemanticDiagnostic.TYPE_MISMATCH, f"{what} must be {expected}, got {actual}", position)
+
+    def _expression(self, index: int) -> Optional[str]:
+        """Tipo de un nodo Expresion (None si se desconoce o tiene errores)"""
+        tree = self.tree
+        try:
+            expression = parse_expression(self.tokens, tree.first_tokens[index], tree.token_ends[index])
+        except ExpressionError as e:
+            self._error(SemanticDiagnostic.MALFORMED_EXPRESSION, e.message, e.position)
+            return None
+        token_indexes, lefts, rights = expression.token_indexes, expression.lefts, expression.rights
+        types: List[Optional[str]] = []
+        for node in range(len(expression)):
+            position = token_indexes[node]
+            left, right = lefts[node], rights[node]
+            if right < 0:
+                types.append(self._atom_type(position))
+            elif left < 0:
+                types.append(self._prefix_type(position, types[right]))
+            else:
+                types.append(self._binary_type(position, types[left], types[right]))
+        if self.expressions is not None:
+            self.expressions[index] = (expression, types)
+        return types[-1] if types else None
+
+    def _atom_type(self, position: int) -> Optional[str]:
+        token_type = self._type(position)
+        if token_type == 'ID':
+            return self._variable_type(position)
+        if token_type == 'NUMBER':
+            return FLOAT if '.' in self._value(position) else INTEGER
+        return STRING if token_type == 'STRING' else BOOLEAN
+
+    def _prefix_type(self, position: int, operand: Optional[str]) -> Optional[str]:
+        operator = self._value(position)
+        if operator != 'NOTter':
+            self._error(SemanticDiagnostic.TYPE_MISMATCH, f"{operator} is not a prefix operator", position)
+            return None
+        if operand is None:
+            return None
+        if operand != BOOLEAN:
+            self._error(SemanticDiagnostic.TYPE_MISMATCH, f"Operator {operator} does not apply to {operand}",
+                        position)
+            return None
+        return BOOLEAN
+
+    def _binary_type(self, position: int, left: Optional[str], right: Optional[str]) -> Optional[str]:
+        operator = self._value(position)
+        if left is None or right is None:
+            # Con un operando desconocido sólo se sabe el tipo de las comparaciones
+            return None if operator in ARITHMETIC_OPERATORS else BOOLEAN
+        if operator in ARITHMETIC_OPERATORS:
+            if left in NUMERIC and right in NUMERIC:
+                return FLOAT if FLOAT in (left, right) else INTEGER
+            if operator == '+' and left == right == STRING:
+                return STRING
+        elif operator in ORDERING_OPERATORS:
+            if left in NUMERIC and right in NUMERIC:
+                return BOOLEAN
+        elif operator in EQUALITY_OPERATORS:
+            if left == right or (left in NUMERIC and right in NUMERIC):
+                return BOOLEAN
+        elif operator in LOGICAL_OPERATORS:
+            if left == right == BOOLEAN:
+                return BOOLEAN
+        self._error(SemanticDiagnostic.TYPE_MISMATCH,
+                    f"Operator {operator} does not apply to {left} and {right}", position)
+        return None
+
+
+def _assignable(target: Optional[str], value: Optional[str]) -> bool:
+    if target is None or value is None or target == value:
+        return True
+    return target == FLOAT and value == INTEGER
+
+
+def check(tree, tokens: Sequence) -> List[SemanticDiagnostic]:
+    """
+    Errores semánticos de un programa, a partir de su árbol de análisis
+    (Parser.validate(tokens, build_tree=True)) y de sus tokens
+    """
+    return SemanticChecker(tree, tokens).check()
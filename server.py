@@ -0,0 +1,298 @@
+"""
+Servidor de validación para integraciones con editores.
+
+Un proceso de larga duración con asyncio que mantiene el Lexer y el Parser
+ya construidos (la tabla, las expresiones regulares y los conjuntos de
+sincronización se arman una sola vez), así que un pedido no paga el
+arranque del intérprete ni la construcción del parser.
+
+Protocolo: JSON Lines sobre un socket Unix (--unix) o TCP local (--port).
+Cada línea es un pedido y cada respuesta es una línea, en el mismo orden:
+
+    {"id": 1, "op": "validate", "source": "= ^ . ... . ^ =", "semantic": false}
+    {"id": 1, "ok": true, "result": {"valid": true, "tokens": 57, "errors": [], "error": null}}
+
+op es lex (tokens: [tipo, inicio, fin]), validate (el resultado de
+batch.py, con semantic opcional) o parse (validate más el árbol en
+arreglos paralelos). Un pedido puede ser también una lista de pedidos, que
+se responde con una lista. Los pedidos se pueden enviar sin esperar las
+respuestas (pipelining).
+
+Con --http PUERTO atiende además HTTP/1.1 en localhost: POST /lex,
+/validate o /parse con el mismo JSON (sin op) en el cuerpo, con
+keep-alive.
+
+Los programas pequeños (hasta --inline-limit bytes) se analizan en el
+mismo proceso, sin pasar por otro hilo: con los tamaños de Ejemplos/ la
+respuesta tarda bastante menos de un milisegundo. Los más grandes se
+mandan a un pool de --workers procesos, cada uno con su Lexer y su Parser,
+para no frenar el ciclo de eventos. Como mucho --max-pending pedidos se
+procesan a la vez; mientras tanto no se leen más pedidos de la conexión,
+así que el cliente que envía demasiado rápido queda frenado por el
+control de flujo del socket.
+
+Uso: python server.py [--unix RUTA | --port PUERTO] [--http PUERTO] [--workers N]
+                      [--inline-limit BYTES] [--max-pending N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from batch import validate_source
+from main import DEFAULT_MAX_ERRORS, InvalidCharacterError, Lexer, Parser
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'validation.sock')
+
+# Tamaño máximo de un pedido (una línea de JSON o el cuerpo de un POST)
+MAX_REQUEST_BYTES = 64 << 20
+
+OPERATIONS = ('lex', 'validate', 'parse')
+
+# Lexer y Parser del proceso (del servidor o de un proceso del pool)
+_lexer: Optional[Lexer] = None
+_parser: Optional[Parser] = None
+
+
+def _init_worker(max_errors: Optional[int] = DEFAULT_MAX_ERRORS):
+    global _lexer, _parser
+    _lexer = Lexer()
+    _parser = Parser(max_errors=max_errors)
+
+
+def handle(operation: str, source: str, semantic: bool = False) -> Dict:
+    """Resultado de una operación sobre un programa, con el Lexer y el Parser del proceso"""
+    if operation == 'lex':
+        try:
+            tokens = _lexer.tokenize_buffer(source)
+        except InvalidCharacterError as e:
+            return {'tokens': [], 'error': str(e)}
+        return {'tokens': [[tokens.type(index), tokens.starts[index], tokens.ends[index]]
+                           for index in range(len(tokens))], 'error': None}
+
+    result = validate_source(source, _lexer, _parser, semantic=semantic, build_tree=operation == 'parse')
+    if operation == 'parse':
+        # Sin tokens, el análisis no llegó a hacerse
+        tree = _parser.tree if result['tokens'] else None
+        result['tree'] = None if tree is None else {
+            'names': [tree.symbol_names[symbol] for symbol in tree.symbols],
+            'parents': tree.parents.tolist(),
+            'first_tokens': tree.first_tokens.tolist(),
+            'token_ends': tree.token_ends.tolist(),
+        }
+    return result
+
+
+class ValidationServer:
+    def __init__(self, workers: int = 0, inline_limit: int = 64 << 10, max_pending: int = 64,
+                 max_errors: Optional[int] = DEFAULT_MAX_ERRORS):
+        _init_worker(max_errors)
+        self.inline_limit = inline_limit
+        self.pending = asyncio.Semaphore(max_pending)
+        self.executor = (ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             initargs=(max_errors,)) if workers > 0 else None)
+
+    async def run_request(self, request) -> Dict:
+        """Respuesta a un pedido ya decodificado"""
+        if isinstance(request, list):
+            return [await self.run_request(item) for item in request]
+        if not isinstance(request, dict):
+            return {'id': None, 'ok': False, 'error': "Request must be a JSON object"}
+        identifier = request.get('id')
+        operation = request.get('op', 'validate')
+        source = request.get('source')
+        if operation not in OPERATIONS:
+            return {'id': identifier, 'ok': False, 'error': f"Unknown operation: {operation}"}
+        if not isinstance(source, str):
+            return {'id': identifier, 'ok': False, 'error': "Missing source"}
+        semantic = bool(request.get('semantic', False))
+
+        if self.executor is None or len(source) <= self.inline_limit:
+            result = handle(operation, source, semantic)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, handle, operation, source, semantic)
+        return {'id': identifier, 'ok': True, 'result': result}
+
+    async def _respond(self, line: Optional[bytes]) -> bytes:
+        """Respuesta codificada a una línea (None si era demasiado larga)"""
+        if line is None:
+            response = {'id': None, 'ok': False, 'error': "Request too large"}
+        else:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'error': f"Invalid JSON: {e}"}
+            else:
+                response = await self.run_request(request)
+        return json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    async def serve_lines(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Una conexión de JSON Lines: las respuestas salen en el orden de los pedidos"""
+        responses: asyncio.Queue = asyncio.Queue()
+
+        async def write_responses():
+            # Un pedido ocupa su lugar hasta que su respuesta se escribió: un
+            # cliente que no lee las respuestas también queda frenado
+            connected = True
+            while True:
+                task = await responses.get()
+                if task is None:
+                    break
+                try:
+                    response = await task
+                    if connected:
+                        writer.write(response)
+                        await writer.drain()
+                except ConnectionError:
+                    connected = False
+                finally:
+                    self.pending.release()
+
+        writer_task = asyncio.create_task(write_responses())
+        try:
+            while True:
+                # Sin lugar para otro pedido no se lee más de la conexión
+                await self.pending.acquire()
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    responses.put_nowait(asyncio.create_task(self._respond(None)))
+                    break
+                except ConnectionError:
+                    self.pending.release()
+                    break
+                if not line.strip():
+                    self.pending.release()
+                    if not line:
+                        break
+                    continue
+                responses.put_nowait(asyncio.create_task(self._respond(line)))
+        except ConnectionError:
+            pass
+        finally:
+            responses.put_nowait(None)
+            try:
+                await writer_task
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """HTTP/1.1 mínimo: POST /lex, /validate o /parse con keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = (request_line.decode('latin-1').split(' ', 2) + ['', ''])[:3]
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    # Sin una longitud válida no se sabe dónde acaba el cuerpo: se cierra la conexión
+                    await self._http_reply(writer, 400, {'ok': False, 'error': f"Invalid Content-Length: {length}"},
+                                           close=True)
+                    break
+                length = int(length)
+                if length > MAX_REQUEST_BYTES:
+                    await self._http_reply(writer, 413, {'ok': False, 'error': "Request too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                operation = path.strip('/').split('?')[0]
+                if method != 'POST' or operation not in OPERATIONS:
+                    await self._http_reply(writer, 404, {'ok': False, 'error': f"Unknown endpoint: {method} {path}"},
+                                           close=not keep_alive)
+                else:
+                    await self.pending.acquire()
+                    try:
+                        request = json.loads(body)
+                        if isinstance(request, dict):
+                            request['op'] = operation
+                        response = await self.run_request(request)
+                        status = 200
+                    except ValueError as e:
+                        response, status = {'ok': False, 'error': f"Invalid JSON: {e}"}, 400
+                    finally:
+                        self.pending.release()
+                    await self._http_reply(writer, status, response, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _http_reply(writer: asyncio.StreamWriter, status: int, body, close: bool = False):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large'}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n"
+                     .encode('latin-1') + payload)
+        await writer.drain()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+async def serve(options) -> None:
+    server = ValidationServer(options.workers, options.inline_limit, options.max_pending,
+                              options.max_errors or None)
+    listeners = []
+    if options.port is not None:
+        listeners.append(await asyncio.start_server(server.serve_lines, '127.0.0.1', options.port,
+                                                    limit=MAX_REQUEST_BYTES))
+        print(f"JSON Lines en 127.0.0.1:{options.port}", file=sys.stderr)
+    else:
+        path = options.unix or DEFAULT_SOCKET_PATH
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)
+        listeners.append(await asyncio.start_unix_server(server.serve_lines, path, limit=MAX_REQUEST_BYTES))
+        print(f"JSON Lines en {path}", file=sys.stderr)
+    if options.http is not None:
+        listeners.append(await asyncio.start_server(server.serve_http, '127.0.0.1', options.http,
+                                                    limit=MAX_REQUEST_BYTES))
+        print(f"HTTP en http://127.0.0.1:{options.http}/", file=sys.stderr)
+    try:
+        await asyncio.gather(*(listener.serve_forever() for listener in listeners))
+    finally:
+        server.close()
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Servidor de validación (JSON Lines y HTTP)")
+    address = arguments.add_mutually_exclusive_group()
+    address.add_argument('--unix', metavar='RUTA', help=f"socket Unix (por defecto {DEFAULT_SOCKET_PATH})")
+    address.add_argument('--port', type=int, help="atender JSON Lines en TCP 127.0.0.1 en lugar de un socket Unix")
+    arguments.add_argument('--http', type=int, metavar='PUERTO', help="atender también HTTP en 127.0.0.1")
+    arguments.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                           help="procesos para los programas grandes (0: todo en el servidor)")
+    arguments.add_argument('--inline-limit', type=int, default=64 << 10, metavar='BYTES',
+                           help="programas hasta este tamaño se analizan sin pasar al pool")
+    arguments.add_argument('--max-pending', type=int, default=64, help="pedidos en proceso a la vez")
+    arguments.add_argument('--max-errors', type=int, default=DEFAULT_MAX_ERRORS, metavar='N',
+                           help=f"errores a registrar por programa (por defecto {DEFAULT_MAX_ERRORS}, 0 sin límite)")
+    options = arguments.parse_args(argv[1:])
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
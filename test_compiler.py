@@ -0,0 +1,78 @@
+"""
+Regresiones de expressions.py, semantics.py y compiler.py.
+
+Uso: python -m pytest test_compiler.py (o python -m unittest test_compiler)
+"""
+import unittest
+
+from compiler import CompileError, compile_source
+from expressions import ExpressionError, parse_expression
+from main import Lexer, Parser
+from semantics import SemanticDiagnostic, check
+
+DECLARATIONS = "DECVARinter a : BOOLEANter, b : BOOLEANter, c : BOOLEANter EndDecinter\n"
+
+
+def _program(statements: str) -> str:
+    return "= ^ .\n" + DECLARATIONS + statements + "\n. ^ ="
+
+
+class BinaryNotTest(unittest.TestCase):
+    """NOTter entre dos operandos: lo acepta la gramática, no tiene significado"""
+    source = _program("c = a NOTter b:3")
+
+    def test_grammar_accepts_it(self):
+        self.assertTrue(Parser().validate(Lexer().tokenize_buffer(self.source)))
+
+    def test_expression_error_at_operator(self):
+        tokens = Lexer().tokenize_buffer("a NOTter b")
+        with self.assertRaises(ExpressionError) as raised:
+            parse_expression(tokens)
+        self.assertEqual(raised.exception.position, 1)
+
+    def test_semantic_diagnostic(self):
+        tokens = Lexer().tokenize_buffer(self.source)
+        parser = Parser()
+        parser.validate(tokens, build_tree=True)
+        diagnostics = check(parser.tree, tokens)
+        self.assertEqual([diagnostic.code for diagnostic in diagnostics],
+                         [SemanticDiagnostic.MALFORMED_EXPRESSION])
+        self.assertEqual(tokens.value(diagnostics[0].position), 'NOTter')
+
+    def test_compile_error_instead_of_crash(self):
+        with self.assertRaises(CompileError) as raised:
+            compile_source(self.source)
+        self.assertEqual([diagnostic.code for diagnostic in raised.exception.diagnostics],
+                         [SemanticDiagnostic.MALFORMED_EXPRESSION])
+
+
+class UndeclaredTest(unittest.TestCase):
+    def _codes(self, statements: str):
+        tokens = Lexer().tokenize_buffer("= ^ .\n" + statements + "\n. ^ =")
+        parser = Parser()
+        self.assertTrue(parser.validate(tokens, build_tree=True))
+        return [diagnostic.code for diagnostic in check(parser.tree, tokens)]
+
+    def test_later_declaration_is_not_redeclared(self):
+        self.assertEqual(self._codes("x = 1:3\nDECVARinter x: INTer EndDecinter"),
+                         [SemanticDiagnostic.UNDECLARED])
+
+    def test_reported_once(self):
+        self.assertEqual(self._codes("x = 1:3\ny = x:3"),
+                         [SemanticDiagnostic.UNDECLARED, SemanticDiagnostic.UNDECLARED])
+
+
+class PrefixTest(unittest.TestCase):
+    def test_only_op_log_is_a_prefix(self):
+        with self.assertRaises(ExpressionError):
+            parse_expression(Lexer().tokenize_buffer("- a"))
+        tree = parse_expression(Lexer().tokenize_buffer("NOTter a ANDter b"))
+        self.assertEqual(tree.format(), "((NOTter a) ANDter b)")
+
+    def test_prefix_not_compiles(self):
+        program = compile_source(_program("a = TRUEter:3\nb = FALSEter:3\nc = NOTter a ORter b:3"))
+        self.assertIn("not", program.source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+El análisis en paralelo (parallel.py) da exactamente el resultado del
+parser en serie, también con errores y con el límite de max_errors.
+
+Uso: python -m pytest test_parallel.py (o python -m unittest test_parallel)
+"""
+import unittest
+
+import programs
+from main import InvalidCharacterError, Lexer, Parser
+from parallel import ParallelParser
+
+RATES = (0.0005, 0.002, 0.01, 0.05)
+
+
+def _inputs():
+    """Programas generados de cada forma, sin errores y con errores en varias proporciones"""
+    lexer = Lexer()
+    for shape in programs.SHAPES:
+        for seed in range(3):
+            source = programs.generate(shape, 3000, seed)
+            yield shape, seed, 0.0, lexer.tokenize_buffer(source)
+            for rate in RATES:
+                try:
+                    tokens = lexer.tokenize_buffer(programs.corrupt(source, rate, seed))
+                except InvalidCharacterError:
+                    continue
+                yield shape, seed, rate, tokens
+
+
+class SerialEquivalenceTest(unittest.TestCase):
+    def _compare(self, max_errors):
+        serial = Parser(max_errors)
+        split = 0
+        with ParallelParser(2, max_errors, min_chunk_tokens=200) as parallel:
+            for shape, seed, rate, tokens in _inputs():
+                with self.subTest(shape=shape, seed=seed, rate=rate):
+                    valid = serial.validate(tokens)
+                    self.assertEqual(parallel.validate(tokens), valid)
+                    self.assertEqual(parallel.errors, serial.errors)
+                    self.assertEqual(str(parallel.fatal_error), str(serial.fatal_error))
+                    split += parallel.chunks > 1
+        self.assertGreater(split, 0)
+
+    def test_without_limit(self):
+        self._compare(None)
+
+    def test_default_limit(self):
+        self._compare(100)
+
+    def test_small_limit(self):
+        self._compare(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
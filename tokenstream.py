@@ -0,0 +1,234 @@
+"""
+Formato binario para guardar o pasar entre procesos los tokens de un
+programa.
+
+Hacer pickle de una lista de Token serializa miles de objetos pequeños, y
+cargarla los vuelve a crear uno por uno: suele costar más que volver a
+tokenizar. Este formato guarda las columnas de un TokenBuffer tal como
+están en memoria, así que cargar es mapear el archivo (o tomar los bytes
+recibidos) y ver cada columna con un memoryview, sin copiar ni crear
+objetos. El Parser las recorre directamente; los Token sólo se crean al
+indexar, por ejemplo para los mensajes de error.
+
+Disposición (little-endian, cada sección alineada a 4 bytes):
+
+    cabecera   magic "TKST", versión, flags, hash de los tipos de token,
+               cantidad de tokens, de líneas, de cadenas y bytes de cadenas
+    kinds      tipo de cada token (1 byte)
+    starts     desplazamiento de inicio de cada token (uint32)
+    ends       desplazamiento de fin de cada token (uint32)
+    lines      línea de cada token (int32, -1 si se desconoce)
+    values     índice del valor de cada token en la tabla de cadenas (uint32)
+    line_starts  inicio de cada línea del código, para las columnas (uint32)
+    offsets    inicio de cada cadena en los datos, más el final (uint32)
+    strings    valores distintos, en UTF-8
+
+El hash de TOKEN_TYPES va en la cabecera: un archivo escrito con otros
+tipos de token (otros números) no se carga.
+
+Uso: python tokenstream.py programa.txt [-o programa.tks]
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from functools import partial
+from itertools import accumulate
+from typing import Iterable, List, Sequence, Union
+
+from main import TOKEN_TYPES, InvalidCharacterError, Lexer, LineIndex, Token, TokenBuffer
+
+MAGIC = b'TKST'
+VERSION = 1
+
+# Flags de la cabecera
+HAS_LINE_INDEX = 1  # Los tokens tenían un LineIndex (se conocen las columnas)
+HAS_OFFSETS = 2  # Los tokens tenían desplazamientos (si no, start es -1)
+
+HEADER = struct.Struct('<4sHH8sIIII')
+
+# Identifica la numeración de los tipos de token con la que se escribió
+KINDS_HASH = hashlib.blake2b('\n'.join(TOKEN_TYPES).encode(), digest_size=8).digest()
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % 4)
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def dump_tokens(tokens: Union[TokenBuffer, List[Token]]) -> bytes:
+    """Serializa un TokenBuffer o la lista de Lexer.tokenize"""
+    if isinstance(tokens, TokenBuffer):
+        kinds = array('B', tokens.kinds)
+        starts = array('I', tokens.starts)
+        ends = array('I', tokens.ends)
+        values: Iterable[str] = map(tokens.value, range(len(tokens)))
+        index = tokens.index
+        # Unos tokens cargados sin desplazamientos siguen sin tenerlos
+        flags = tokens.flags & HAS_OFFSETS if isinstance(tokens, PackedTokenBuffer) else HAS_OFFSETS
+    else:
+        kinds = array('B', [token.kind for token in tokens])
+        values = [token.value for token in tokens]
+        index = tokens[0]._index if tokens else None
+        flags = 0
+        if all(token.start >= 0 for token in tokens):
+            flags = HAS_OFFSETS
+            starts = array('I', [token.start for token in tokens])
+            ends = array('I', [token.end for token in tokens])
+        else:
+            starts = ends = array('I', bytes(4 * len(tokens)))
+
+    if index is not None and flags & HAS_OFFSETS:
+        flags |= HAS_LINE_INDEX
+        line_starts = array('I', index.starts())
+        lines = array('i', map(partial(bisect_right, line_starts), starts))
+    else:
+        line_starts = array('I')
+        lines = array('i', [token.line for token in tokens])
+
+    # Tabla de cadenas: cada valor distinto una sola vez
+    table = {}
+    value_ids = array('I', [table.setdefault(value, len(table)) for value in values])
+    encoded = [value.encode('utf-8') for value in table]
+    offsets = array('I', accumulate(map(len, encoded), initial=0))
+    strings = b''.join(encoded)
+
+    header = HEADER.pack(MAGIC, VERSION, flags, KINDS_HASH, len(kinds), len(line_starts), len(table), len(strings))
+    return b''.join((header, kinds.tobytes(), _padding(len(kinds)), _little_endian(starts), _little_endian(ends),
+                     _little_endian(lines), _little_endian(value_ids), _little_endian(line_starts),
+                     _little_endian(offsets), strings))
+
+
+def write_tokens(path: Union[str, os.PathLike], tokens: Union[TokenBuffer, List[Token]]):
+    with open(path, 'wb') as file:
+        file.write(dump_tokens(tokens))
+
+
+class PackedTokenBuffer(TokenBuffer):
+    """
+    TokenBuffer de sólo lectura sobre datos en el formato binario. Las
+    columnas son memoryview de los datos (sin copia en máquinas
+    little-endian) y los valores se decodifican de la tabla de cadenas
+    sólo cuando se piden. Si los datos son un archivo mapeado, queda
+    mapeado hasta close().
+    """
+    def __init__(self, data: Buffer):
+        view = memoryview(data)
+        if len(view) < HEADER.size:
+            raise ValueError("Truncated token stream")
+        magic, version, flags, kinds_hash, count, line_count, string_count, string_bytes = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a token stream")
+        if version != VERSION:
+            raise ValueError(f"Unsupported token stream version {version} (expected {VERSION})")
+        if kinds_hash != KINDS_HASH:
+            raise ValueError("Token stream was written with different token types")
+
+        sizes = [count + len(_padding(count)), 4 * count, 4 * count, 4 * count, 4 * count,
+                 4 * line_count, 4 * (string_count + 1), string_bytes]
+        if len(view) < HEADER.size + sum(sizes):
+            raise ValueError("Truncated token stream")
+        sections = []
+        position = HEADER.size
+        for size in sizes:
+            sections.append(view[position:position + size])
+            position += size
+        kinds, starts, ends, lines, values, line_starts, offsets, strings = sections
+
+        self.data = data
+        self.source = None
+        self.kinds = kinds[:count]
+        self.starts, self.ends, self.value_ids, line_starts, self.offsets = (
+            self._column(section, 'I') for section in (starts, ends, values, line_starts, offsets))
+        self.lines = self._column(lines, 'i')
+        self.strings = strings
+        self.flags = flags
+        self.index = LineIndex.from_starts(line_starts) if flags & HAS_LINE_INDEX else None
+
+    @staticmethod
+    def _column(section: memoryview, typecode: str) -> Sequence[int]:
+        if sys.byteorder == 'little':
+            return section.cast(typecode)
+        column = array(typecode, section.tobytes())
+        column.byteswap()
+        return column
+
+    def __getitem__(self, index: int) -> Token:
+        start = self.starts[index] if self.flags & HAS_OFFSETS else -1
+        return Token(TOKEN_TYPES[self.kinds[index]], self.value(index), self.lines[index], start, self.index)
+
+    def truncate(self, length: int):
+        raise TypeError("PackedTokenBuffer is read-only")
+
+    def value(self, index: int) -> str:
+        string = self.value_ids[index]
+        return str(self.strings[self.offsets[string]:self.offsets[string + 1]], 'utf-8')
+
+    def line(self, index: int) -> int:
+        return self.lines[index]
+
+    def close(self):
+        """Libera las vistas y, si los datos son un archivo mapeado, lo cierra"""
+        for column in (self.kinds, self.starts, self.ends, self.lines, self.value_ids, self.offsets,
+                       self.strings):
+            if isinstance(column, memoryview):
+                column.release()
+        if self.index is not None and isinstance(self.index.starts(), memoryview):
+            self.index.starts().release()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> 'PackedTokenBuffer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_tokens(data: Buffer) -> PackedTokenBuffer:
+    """Tokens de datos en el formato binario (bytes recibidos, un mmap, ...), sin copiarlos"""
+    return PackedTokenBuffer(data)
+
+
+def open_tokens(path: Union[str, os.PathLike]) -> PackedTokenBuffer:
+    """Tokens de un archivo escrito con write_tokens, mapeado en memoria"""
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return PackedTokenBuffer(data)
+
+
+def main(argv: List[str]) -> int:
+    arguments = argparse.ArgumentParser(description="Guarda los tokens de un programa en el formato binario")
+    arguments.add_argument('path', help="programa a tokenizar")
+    arguments.add_argument('-o', '--output', metavar='ARCHIVO', help="archivo de salida (por defecto RUTA.tks)")
+    options = arguments.parse_args(argv[1:])
+
+    with open(options.path, encoding='utf-8') as file:
+        source = file.read()
+    try:
+        tokens = Lexer().tokenize_buffer(source)
+    except InvalidCharacterError as e:
+        print(e)
+        return 1
+    output = options.output or os.path.splitext(options.path)[0] + '.tks'
+    write_tokens(output, tokens)
+    print(f"{len(tokens)} tokens, {len(source.encode('utf-8'))} bytes de código, "
+          f"{os.path.getsize(output)} bytes en {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
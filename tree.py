@@ -0,0 +1,339 @@
+"""
+Árbol de análisis compacto.
+
+Con build_tree, el parser sólo registra cada expansión no vacía de un no
+terminal que tiene otra opción: la celda de la tabla (no terminal y
+token) y el token donde empieza; los que tienen una sola producción se
+expanden siempre igual (ver TreeTables). Los nodos se arman con ese
+registro la primera vez que se pide una columna (ver ParseTree.replay):
+se repiten las expansiones sobre una pila, sin tokens, y debajo de cada
+cuerpo va una marca (~nodo, un entero negativo) que al sacarse cierra el
+nodo. Desde el primer error el parser arma lo registrado y sigue con las
+marcas él mismo (Parser._build_tree); si el análisis se detiene, los
+nodos abiertos se cierran donde llegó.
+
+Los nodos se guardan en arreglos paralelos, en preorden: para cada nodo,
+su símbolo (no terminal), su padre, el rango de tokens que cubre y el
+final de su subárbol. Los hijos de un nodo son los nodos entre él y el
+final de su subárbol, así que recorrer el árbol no necesita listas de hijos
+ni recursión. Node es una vista liviana (con __slots__) sobre una posición.
+
+Sólo hay nodos para no terminales que se expandieron en una producción no
+vacía; los terminales son los tokens del rango del nodo. Las listas
+recursivas por la derecha (CODE → Statement CODE, RestVarList → ","
+VarDecItem RestVarList, ...) se aplanan en un solo nodo con todos los
+elementos como hijos. Las expresiones se recorren con el ciclo rápido del
+parser y cada Expresion queda como una hoja: su estructura con
+precedencia la da expression(). Si una expresión tiene un error, lo que
+falta recorrer pasa por la tabla y sus Factor y ExprTail quedan como
+hijos.
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from expressions import ExpressionTree, parse_expression
+
+# Columnas del árbol, armadas a partir del registro del análisis al pedirlas
+COLUMNS = ('symbols', 'parents', 'first_tokens', 'token_ends', 'subtree_ends')
+
+
+class Node:
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: 'ParseTree', index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.tree.name(self.index)
+
+    @property
+    def parent(self) -> Optional['Node']:
+        parent = self.tree.parents[self.index]
+        return Node(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def children(self) -> List['Node']:
+        return [Node(self.tree, child) for child in self.tree.children(self.index)]
+
+    @property
+    def tokens(self) -> range:
+        """Posiciones de los tokens que cubre el nodo"""
+        return self.tree.tokens(self.index)
+
+    def __repr__(self):
+        tokens = self.tokens
+        return f"Node({self.name}, tokens={tokens.start}:{tokens.stop})"
+
+
+class ParseTree:
+    """
+    Columnas (en preorden, ver COLUMNS): symbols, el símbolo (id de la tabla
+    codificada) de cada nodo; parents, su padre o -1 para la raíz;
+    first_tokens y token_ends, el primer token cubierto y uno después del
+    último; subtree_ends, uno después de su último descendiente.
+    """
+    def __init__(self, encoded, start: str, tables: Optional['TreeTables'] = None):
+        self.encoded = encoded  # EncodedTable de la gramática
+        self.symbol_names: Sequence[str] = encoded.symbol_names
+        self.start = start
+        self.tables = tables if tables is not None else TreeTables(encoded)
+        # Registro del análisis (ver Parser._parse_tree), hasta que se arman las columnas
+        self.cells = array('i')  # Celda de la tabla de cada expansión, o ~Expresion si fue por el ciclo rápido
+        self.firsts = array('I')  # Token donde empezó cada expansión
+        self.expression_ends = array('I')  # Fin de cada Expresion recorrida por el ciclo rápido
+        self.pending: Dict[int, Tuple[int, ...]] = {}  # Lo que dejó para la tabla una Expresion con error
+
+    def __getattr__(self, name: str):
+        # Sólo se llama si el atributo no existe: las columnas todavía no se armaron
+        if name not in COLUMNS:
+            raise AttributeError(name)
+        self.replay()
+        return self.__dict__[name]
+
+    def replay(self, parser_stack: Optional[List[int]] = None, current: int = -1) -> Tuple[List[int], int]:
+        """
+        Arma las columnas repitiendo las expansiones registradas sobre una
+        pila con los cuerpos de production_bodies: cada terminal avanza un
+        token, un no terminal con una sola producción se expande sin mirar
+        el registro y otro sin registro en ese token se expandió a ε. Con la
+        pila del parser y su token al encontrar un error se detiene en ese
+        mismo punto y devuelve su pila, con las marcas, y el nodo abierto
+        para que el parser siga desde ahí; si no, lo repite entero.
+        """
+        encoded = self.encoded
+        terminal_count = encoded.terminal_count
+        table = encoded.table
+        continuation = len(self.symbol_names)
+        bodies, forced = self.tables.bodies, self.tables.forced
+        cells, firsts, expression_ends, pending = self.cells, self.firsts, self.expression_ends, self.pending
+
+        # Columnas nuevas, en preorden
+        symbols, parents, first_tokens, token_ends, subtree_ends = (array('H'), array('i'), array('I'),
+                                                                     array('I'), array('I'))
+        add_symbol = symbols.append
+        add_parent = parents.append
+        add_first = first_tokens.append
+        add_end = token_ends.append
+        add_subtree_end = subtree_ends.append
+        count = 0
+        open_node = -1
+
+        # Registro en listas, con un centinela al final que no coincide con ningún token
+        cells = cells.tolist() + [0]
+        firsts = firsts.tolist() + [-1]
+        record = expression = position = 0
+        stack = [encoded.symbol_ids[self.start]]
+        pop = stack.pop
+        push = stack.extend
+        append = stack.append
+
+        # Próxima expansión registrada: dónde empieza, su celda y su no terminal
+        first, cell = firsts[0], cells[0]
+        head = cell // terminal_count if cell >= 0 else ~cell
+        while stack:
+            if position == current and _unmarked(stack, continuation) == parser_stack:
+                break  # Donde el parser encontró el error
+            symbol = pop()
+
+            if symbol < terminal_count:
+                if symbol < 0:  # Marca: se terminó la producción de un nodo
+                    node = ~symbol
+                    token_ends[node] = position
+                    subtree_ends[node] = count
+                    open_node = parents[node]
+                else:
+                    position += 1
+                continue
+
+            if symbol >= continuation:  # Cola de una lista: sigue en el nodo abierto
+                if position != first or head != symbol - continuation:
+                    continue  # ε
+                push(bodies[table[cell]])
+            elif position != first or head != symbol:
+                body = forced[symbol]
+                if body is None:
+                    continue  # ε; lo registrado es de un símbolo que sigue
+                # Una sola producción posible: el parser no la registró
+                add_symbol(symbol)
+                add_parent(open_node)
+                add_first(position)
+                add_end(0)
+                add_subtree_end(0)
+                append(~count)
+                push(body)
+                open_node = count
+                count += 1
+                continue
+            elif cell < 0:  # Expresion por el ciclo rápido
+                add_symbol(symbol)
+                add_parent(open_node)
+                add_first(position)
+                position = expression_ends[expression]
+                expression += 1
+                body = pending.get(record)
+                if body is None:
+                    count += 1
+                    add_end(position)
+                    add_subtree_end(count)
+                else:  # Lo que falta pasa por la tabla, con sus nodos como hijos
+                    add_end(0)
+                    add_subtree_end(0)
+                    append(~count)
+                    push(body)
+                    open_node = count
+                    count += 1
+            else:
+                add_symbol(symbol)
+                add_parent(open_node)
+                add_first(position)
+                add_end(0)
+                add_subtree_end(0)
+                append(~count)
+                push(bodies[table[cell]])
+                open_node = count
+                count += 1
+
+            record += 1
+            first, cell = firsts[record], cells[record]
+            head = cell // terminal_count if cell >= 0 else ~cell
+
+        self.symbols, self.parents, self.first_tokens = symbols, parents, first_tokens
+        self.token_ends, self.subtree_ends = token_ends, subtree_ends
+        self.cells, self.firsts, self.expression_ends, self.pending = array('i'), array('I'), array('I'), {}
+        return stack, open_node
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def root(self) -> Optional[Node]:
+        return Node(self, 0) if self.symbols else None
+
+    def node(self, index: int) -> Node:
+        return Node(self, index)
+
+    def name(self, index: int) -> str:
+        return self.symbol_names[self.symbols[index]]
+
+    def tokens(self, index: int) -> range:
+        return range(self.first_tokens[index], self.token_ends[index])
+
+    def children(self, index: int) -> Iterator[int]:
+        child = index + 1
+        end = self.subtree_ends[index]
+        while child < end:
+            yield child
+            child = self.subtree_ends[child]
+
+    def depth(self, index: int) -> int:
+        depth = 0
+        while self.parents[index] >= 0:
+            index = self.parents[index]
+            depth += 1
+        return depth
+
+    def find_all(self, name: str) -> Iterator[Node]:
+        """Nodos de un no terminal, en orden de aparición"""
+        for index, symbol in enumerate(self.symbols):
+            if self.symbol_names[symbol] == name:
+                yield Node(self, index)
+
+    def expression(self, index: int, tokens: Sequence) -> ExpressionTree:
+        """
+        Árbol con precedencia de un nodo Expresion: el árbol de análisis
+        guarda la cadena plana de la gramática (Factor ExprTail)
+        """
+        return parse_expression(tokens, self.first_tokens[index], self.token_ends[index])
+
+    def format(self, tokens: Optional[Sequence] = None) -> str:
+        """
+        Representación indentada del árbol. Con la lista de tokens, cada
+        nodo muestra también los valores que cubre.
+        """
+        lines = []
+        depths = {-1: -1}
+        for index in range(len(self.symbols)):
+            depth = depths[self.parents[index]] + 1
+            depths[index] = depth
+            line = '  ' * depth + self.name(index)
+            if tokens is not None:
+                covered = self.tokens(index)
+                line += ': ' + ' '.join(tokens[position].value for position in covered)
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def _unmarked(stack: List[int], continuation: int) -> List[int]:
+    """Pila de ParseTree.replay como la tiene el parser: sin marcas y sin continuaciones"""
+    return [symbol - continuation if symbol >= continuation else symbol for symbol in stack if symbol >= 0]
+
+
+def production_bodies(encoded) -> List[Tuple[int, ...]]:
+    """
+    Cuerpos de las producciones (invertidos, como en la tabla) para armar el
+    árbol: si la producción termina con su propio no terminal, éste pasa a
+    ser una continuación (id + cantidad de símbolos), que al expandirse
+    agrega sus elementos al mismo nodo en lugar de anidar uno nuevo. La
+    tabla comparte los cuerpos iguales entre no terminales; un cuerpo
+    compartido nunca es continuación (quedan nodos anidados).
+    """
+    terminal_count = encoded.terminal_count
+    continuation = len(encoded.symbol_names)
+    heads: Dict[int, Set[int]] = {}
+    for symbol in range(terminal_count, continuation):
+        for production in encoded.table[symbol * terminal_count:(symbol + 1) * terminal_count]:
+            if production >= 0:
+                heads.setdefault(production, set()).add(symbol)
+
+    bodies = []
+    for number, body in enumerate(encoded.productions):
+        if body and heads.get(number) == {body[0]}:
+            body = (body[0] + continuation,) + tuple(body[1:])
+        bodies.append(tuple(body))
+    return bodies
+
+
+class TreeTables:
+    """
+    Lo que se deriva de la tabla para armar árboles. bodies son los cuerpos
+    de production_bodies. forced tiene, para cada no terminal con una sola
+    producción y no vacía, su cuerpo: siempre se expande igual, así que el
+    parser no registra esas expansiones. table es la tabla que usa el parser
+    al registrar: cada celda es un índice en productions, o -1; los menores
+    que recorded se registran, los menores que expanded se apilan sin
+    registrarse y expanded es ε.
+    """
+    def __init__(self, encoded):
+        terminal_count = encoded.terminal_count
+        productions = encoded.productions
+        self.bodies = production_bodies(encoded)
+
+        self.forced: List[Optional[Tuple[int, ...]]] = [None] * len(encoded.symbol_names)
+        for symbol in range(terminal_count, len(encoded.symbol_names)):
+            row = set(encoded.table[symbol * terminal_count:(symbol + 1) * terminal_count]) - {-1}
+            if len(row) == 1 and productions[min(row)]:
+                self.forced[symbol] = self.bodies[min(row)]
+
+        recorded: Dict[int, int] = {}
+        expanded: Dict[int, int] = {}
+        for cell, production in enumerate(encoded.table):
+            if production >= 0 and productions[production]:
+                chosen = expanded if self.forced[cell // terminal_count] is not None else recorded
+                chosen.setdefault(production, len(chosen))
+        self.recorded = len(recorded)
+        self.expanded = len(recorded) + len(expanded)
+        self.productions = ([productions[production] for production in recorded] +
+                            [productions[production] for production in expanded])
+
+        self.table = array('h', [-1]) * len(encoded.table)
+        for cell, production in enumerate(encoded.table):
+            if production < 0:
+                continue
+            if not productions[production]:
+                self.table[cell] = self.expanded
+            elif self.forced[cell // terminal_count] is not None:
+                self.table[cell] = self.recorded + expanded[production]
+            else:
+                self.table[cell] = recorded[production]